@@ -129,8 +129,9 @@ class ComprasPublicasPipeline:
         txt_dir = self.base_dir / 'data' / 'processed' / 'txt'
         
         if pdf_dir.exists() and any(pdf_dir.glob('*.pdf')):
+            # Solo se reextraen los PDFs (y páginas) que cambiaron desde la última conversión
             self.log("Convirtiendo PDFs a texto...")
-            if not self.run_command(f"{self.python_exe} src/data/pdf_converter.py"):
+            if not self.run_command(f"{self.python_exe} src/data/pdf_converter.py {pdf_dir} --output-dir {txt_dir}"):
                 self.log("⚠️ Error convirtiendo PDFs, continuando...", "WARNING")
         
         # Verificar documentos de texto
@@ -146,12 +147,14 @@ class ComprasPublicasPipeline:
         """Preparar datos de entrenamiento"""
         self.log("🔧 Preparando datos de entrenamiento...")
         
-        if not self.run_command(f"{self.python_exe} src/data/data_preparer.py"):
+        # Solo se reprocesan los documentos que cambiaron (caché en data/training/.training_cache)
+        txt_dir = self.base_dir / 'data' / 'processed' / 'txt'
+        dataset_path = self.base_dir / 'data' / 'training' / 'compras_publicas_dataset'
+        if not self.run_command(f"{self.python_exe} src/data/data_preparer.py {txt_dir} --output {dataset_path}"):
             self.log("⚠️ Error preparando datos de entrenamiento, continuando...", "WARNING")
         
         # Verificar dataset
-        dataset_path = self.base_dir / 'data' / 'training' / 'compras_publicas_dataset.json'
-        if dataset_path.exists():
+        if (dataset_path / 'index.json').exists():
             self.log("✅ Dataset de entrenamiento preparado")
             return True
         else:
@@ -0,0 +1,80 @@
+"""Benchmark the PDF extraction strategies on the PDFs in data/raw/pdfs.
+
+Compares throughput (pages/s) of pypdf2, pdfplumber and adaptive, the pages
+the adaptive strategy sends to pdfplumber, and how much each output differs
+from pdfplumber's (word-level similarity).
+
+Usage:
+    python scripts/benchmark_pdf_extraction.py [directorio_pdfs] [--repeat N]
+"""
+import argparse
+import difflib
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from src.data.pdf_converter import iter_pages, iter_pages_adaptive
+
+
+def run_strategy(pdf_path, strategy, repeat):
+    """Extract every page, keeping the best time of ``repeat`` runs."""
+    best = None
+    for _ in range(repeat):
+        reasons = {}
+        start = time.perf_counter()
+        if strategy == 'adaptive':
+            pages = dict(iter_pages_adaptive(str(pdf_path), reasons=reasons))
+        else:
+            pages = dict(iter_pages(str(pdf_path), strategy=strategy))
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, pages, reasons)
+    return best
+
+
+def similarity(pages, reference):
+    """Mean word-level similarity of two page dictionaries (1.0 = identical)."""
+    ratios = []
+    for page_num, text in reference.items():
+        matcher = difflib.SequenceMatcher(None, pages.get(page_num, "").split(), text.split(), autojunk=False)
+        ratios.append(matcher.ratio())
+    return sum(ratios) / len(ratios) if ratios else 1.0
+
+
+def benchmark(directory, repeat=1):
+    pdf_files = sorted(Path(directory).glob("*.pdf"))
+    if not pdf_files:
+        print(f"No se encontraron archivos PDF en {directory}")
+        return
+
+    totals = {strategy: [0, 0.0] for strategy in ('pypdf2', 'pdfplumber', 'adaptive')}
+    print(f"{'Archivo':45} {'Estrategia':11} {'Págs':>5} {'Seg':>7} {'Págs/s':>8} {'Similitud':>9}")
+    print("-" * 90)
+    for pdf_file in pdf_files:
+        results = {strategy: run_strategy(pdf_file, strategy, repeat) for strategy in totals}
+        reference = results['pdfplumber'][1]
+        for strategy, (elapsed, pages, reasons) in results.items():
+            totals[strategy][0] += len(pages)
+            totals[strategy][1] += elapsed
+            print(f"{pdf_file.name[:45]:45} {strategy:11} {len(pages):5d} {elapsed:7.2f} "
+                  f"{len(pages) / elapsed:8.1f} {similarity(pages, reference):9.3f}")
+        reasons = results['adaptive'][2]
+        if reasons:
+            detail = ", ".join(f"p{page_num + 1}: {reason}" for page_num, reason in sorted(reasons.items()))
+            print(f"{'':45} → pdfplumber en {len(reasons)} páginas ({detail})")
+        print()
+
+    print("Total")
+    for strategy, (pages, elapsed) in totals.items():
+        print(f"  {strategy:11} {pages:5d} páginas en {elapsed:6.2f}s ({pages / elapsed:.1f} páginas/s)")
+    speedup = totals['pdfplumber'][1] / totals['adaptive'][1]
+    print(f"  adaptive es {speedup:.1f}x más rápido que pdfplumber")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparar estrategias de extracción de PDF")
+    parser.add_argument('directory', nargs='?', default="data/raw/pdfs")
+    parser.add_argument('--repeat', type=int, default=1, help="Repeticiones por estrategia (se usa la mejor)")
+    args = parser.parse_args()
+    benchmark(args.directory, args.repeat)
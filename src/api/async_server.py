@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Servidor ASGI (asyncio) para consultas concurrentes al sistema RAG
+
+Misma API que src/api/server.py, pero cada generación en espera es una
+corrutina en vez de un hilo del sistema operativo. La recuperación (CPU)
+se ejecuta en un pool de hilos acotado.
+
+Uso:
+    python src/api/async_server.py
+    uvicorn src.api.async_server:app --port 5001
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.core.async_ollama_client import AsyncOllamaBackend
+from src.core.http_client import CircuitOpenError
+from src.core.ollama_client import OllamaClient
+from src.core.scheduler import AsyncGenerationScheduler, SchedulerRejected
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+# Índice y recuperación (síncronos) + backend HTTP asíncrono
+ollama_client = OllamaClient(
+    base_url=os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'),
+    retriever=os.getenv('RAG_RETRIEVER', 'tfidf'),
+    prompt_budget=int(os.getenv('RAG_PROMPT_TOKENS', str(OllamaClient.PROMPT_TOKEN_BUDGET))),
+    compress_context=os.getenv('RAG_COMPRESS_CONTEXT', 'false').lower() in ('1', 'true', 'yes')
+)
+backend = AsyncOllamaBackend(
+    base_url=ollama_client.base_url,
+    model=ollama_client.model,
+    connect_timeout=float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('OLLAMA_READ_TIMEOUT', '120')),
+    max_connections=int(os.getenv('OLLAMA_POOL_SIZE', '64'))
+)
+scheduler = AsyncGenerationScheduler(
+    max_in_flight=int(os.getenv('GENERATION_MAX_IN_FLIGHT', '2')),
+    max_queue=int(os.getenv('GENERATION_MAX_QUEUE', '32')),
+    wait_timeout=float(os.getenv('GENERATION_QUEUE_TIMEOUT', '30'))
+)
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('RETRIEVAL_WORKERS', '4')),
+    thread_name_prefix='retrieval'
+)
+
+
+async def run_in_executor(func, *args):
+    """Ejecutar trabajo de CPU fuera del event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(retrieval_executor, func, *args)
+
+
+async def index(request: Request):
+    """Servir la página HTML"""
+    try:
+        with open('web/templates/index.html', 'r', encoding='utf-8') as f:
+            return HTMLResponse(f.read())
+    except FileNotFoundError:
+        return HTMLResponse("""
+        <h1>Error</h1>
+        <p>No se encontró el archivo web/templates/index.html</p>
+        """)
+
+
+async def status(request: Request):
+    """Verificar estado del sistema"""
+    try:
+        ollama_connected = await backend.test_connection()
+        documents_loaded = len(ollama_client.documents) > 0
+
+        return JSONResponse({
+            'ollama_connected': ollama_connected,
+            'documents_loaded': documents_loaded,
+            'document_count': len(ollama_client.documents),
+            'cache': ollama_client.cache_stats(),
+            'backend': backend.stats(),
+            'scheduler': scheduler.stats(),
+            'status': 'ready' if ollama_connected and documents_loaded else 'not_ready'
+        })
+    except Exception as e:
+        logger.error(f"Error checking status: {e}")
+        return JSONResponse({
+            'ollama_connected': False,
+            'documents_loaded': False,
+            'document_count': 0,
+            'status': 'error',
+            'error': str(e)
+        }, status_code=500)
+
+
+async def _read_question(request: Request):
+    """Validar la pregunta; devuelve (pregunta, prioridad, respuesta de error)"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    data = data or {}
+    question = data.get('question', '').strip()
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        priority = 0
+
+    if not question:
+        return None, priority, JSONResponse({'error': 'No question provided'}, status_code=400)
+
+    if len(ollama_client.documents) == 0:
+        return None, priority, JSONResponse({'error': 'No documents loaded'}, status_code=503)
+
+    # La conexión a Ollama la vigila el circuit breaker, sin sondear /api/tags
+    try:
+        backend.circuit_breaker.raise_if_open()
+    except CircuitOpenError as e:
+        return None, priority, _rejected_response(e)
+
+    return question, priority, None
+
+
+def _rejected_response(error) -> JSONResponse:
+    """Respuesta 429/503 con Retry-After: cola llena, espera agotada u Ollama caído (circuit breaker)"""
+    logger.warning(f"Query rejected: {error}")
+    return JSONResponse(
+        {'error': str(error), 'retry_after': error.retry_after},
+        status_code=error.status_code,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+
+async def query(request: Request):
+    """Procesar pregunta del usuario"""
+    try:
+        question, priority, error = await _read_question(request)
+        if error:
+            return error
+
+        logger.info(f"Processing question: {question}")
+
+        prepared = await run_in_executor(ollama_client.prepare_query, question, 3)
+        timings = prepared['timings']
+
+        with await scheduler.acquire(priority) as slot:
+            timings['queue_wait'] = slot.wait_ms
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            answer = await backend.generate(prepared['prompt'])
+        timings['generate'] = round((loop.time() - start) * 1000, 3)
+        timings['total'] = round(sum(timings.values()), 3)
+        logger.info(f"Query timings (ms): {timings}")
+
+        return JSONResponse({
+            'response': answer,
+            'sources': [
+                {'source': doc['source'], 'article': doc.get('article'), 'similarity': doc['similarity']}
+                for doc in prepared['chunks']
+            ],
+            'question': question,
+            'prompt_chars': prepared['prompt_chars'],
+            'prompt_tokens': prepared['prompt_tokens'],
+            'cache_hit': prepared['cache_hit'],
+            'timings': timings
+        })
+
+    except (SchedulerRejected, CircuitOpenError) as e:
+        return _rejected_response(e)
+    except Exception as e:
+        logger.error(f"Error processing query: {e}")
+        return JSONResponse({'error': f'Error processing query: {str(e)}'}, status_code=500)
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Formatear un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def query_stream(request: Request):
+    """Procesar pregunta enviando primero las fuentes y luego los tokens (SSE)"""
+    question, priority, error = await _read_question(request)
+    if error:
+        return error
+
+    # Admisión antes de abrir el stream para poder responder 429/503
+    try:
+        slot = await scheduler.acquire(priority)
+    except SchedulerRejected as e:
+        return _rejected_response(e)
+
+    logger.info(f"Processing streaming question: {question}")
+
+    async def events():
+        try:
+            prepared = await run_in_executor(ollama_client.prepare_query, question, 3)
+            yield _sse_event('sources', OllamaClient.sources_event(prepared))
+
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            first_token = None
+            async for token in backend.generate_stream(prepared['prompt']):
+                if first_token is None:
+                    first_token = round((loop.time() - start) * 1000, 3)
+                yield _sse_event('token', {'type': 'token', 'token': token})
+
+            prepared['timings']['queue_wait'] = slot.wait_ms
+            prepared['timings']['first_token'] = first_token or 0.0
+            prepared['timings']['generate'] = round((loop.time() - start) * 1000, 3)
+            yield _sse_event('done', OllamaClient.done_event(prepared))
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            yield _sse_event('error', {'type': 'error', 'error': f'Error processing query: {str(e)}'})
+        finally:
+            slot.release()
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        # Liberar el slot aunque el stream no llegue a iniciarse
+        background=BackgroundTask(slot.release)
+    )
+
+
+async def reload_documents(request: Request):
+    """Recargar documentos (solo reindexa los archivos que cambiaron)"""
+    try:
+        changes = await run_in_executor(ollama_client.reload_documents)
+        return JSONResponse({
+            'success': True,
+            'message': f'Loaded {len(ollama_client.documents)} documents',
+            'document_count': len(ollama_client.documents),
+            'changes': changes
+        })
+    except Exception as e:
+        logger.error(f"Error reloading documents: {e}")
+        return JSONResponse({'error': f'Error reloading documents: {str(e)}'}, status_code=500)
+
+
+async def list_documents(request: Request):
+    """Listar documentos cargados"""
+    try:
+        documents = [
+            {'filename': doc['filename'], 'path': doc['path'], 'size': len(doc['content'])}
+            for doc in ollama_client.documents
+        ]
+        return JSONResponse({'documents': documents, 'count': len(documents)})
+    except Exception as e:
+        logger.error(f"Error listing documents: {e}")
+        return JSONResponse({'error': f'Error listing documents: {str(e)}'}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Inicializar el sistema al arrancar y liberar conexiones al terminar"""
+    await startup()
+    try:
+        yield
+    finally:
+        await backend.aclose()
+        retrieval_executor.shutdown(wait=False)
+
+
+async def startup():
+    """Inicializar el sistema al arrancar"""
+    logger.info("Initializing async Ollama RAG system...")
+    if not await backend.test_connection():
+        logger.warning("Ollama not connected. Make sure it's running with: brew services start ollama")
+    else:
+        logger.info("✅ Ollama connected successfully")
+
+    try:
+        await run_in_executor(ollama_client.load_documents)
+        logger.info(f"✅ Loaded {len(ollama_client.documents)} documents")
+    except Exception as e:
+        logger.error(f"Error initializing system: {e}")
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/status', status),
+        Route('/query', query, methods=['POST']),
+        Route('/query/stream', query_stream, methods=['POST']),
+        Route('/reload_documents', reload_documents),
+        Route('/documents', list_documents),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Iniciando servidor Ollama RAG (asyncio)...")
+    print("🌐 Servidor disponible en: http://localhost:5001")
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('FLASK_PORT', '5001')))
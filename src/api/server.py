@@ -3,12 +3,15 @@
 Servidor Flask para la interfaz web de Ollama con RAG
 """
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, render_template_string, stream_with_context
 from flask_cors import CORS
+import json
 import os
 import sys
 sys.path.append('/Users/edomax/Documents/GitHub/compras_publicas')
+from src.core.http_client import CircuitOpenError
 from src.core.ollama_client import OllamaClient
+from src.core.scheduler import GenerationScheduler, SchedulerRejected
 import logging
 
 # Configurar logging
@@ -18,8 +21,38 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)  # Permitir CORS para requests desde el navegador
 
-# Inicializar cliente Ollama
-ollama_client = OllamaClient()
+# Inicializar cliente Ollama (RAG_RETRIEVER=bm25 usa el índice invertido)
+ollama_client = OllamaClient(
+    base_url=os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'),
+    retriever=os.getenv('RAG_RETRIEVER', 'tfidf'),
+    connect_timeout=float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('OLLAMA_READ_TIMEOUT', '120')),
+    pool_maxsize=int(os.getenv('OLLAMA_POOL_SIZE', '16')),
+    prompt_budget=int(os.getenv('RAG_PROMPT_TOKENS', str(OllamaClient.PROMPT_TOKEN_BUDGET))),
+    compress_context=os.getenv('RAG_COMPRESS_CONTEXT', 'false').lower() in ('1', 'true', 'yes')
+)
+
+# Limitar generaciones simultáneas en Ollama; el resto espera en una cola acotada
+ollama_client.scheduler = GenerationScheduler(
+    max_in_flight=int(os.getenv('GENERATION_MAX_IN_FLIGHT', '2')),
+    max_queue=int(os.getenv('GENERATION_MAX_QUEUE', '32')),
+    wait_timeout=float(os.getenv('GENERATION_QUEUE_TIMEOUT', '30'))
+)
+
+def _request_priority(data: dict) -> int:
+    """Prioridad opcional de la petición (menor = antes)"""
+    try:
+        return int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return 0
+
+def _rejected_response(error):
+    """Respuesta 429/503 con Retry-After: cola llena, espera agotada u Ollama caído (circuit breaker)"""
+    logger.warning(f"Query rejected: {error}")
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.status_code = error.status_code
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
 
 @app.route('/')
 def index():
@@ -49,6 +82,9 @@ def status():
             'ollama_connected': ollama_connected,
             'documents_loaded': documents_loaded,
             'document_count': document_count,
+            'cache': ollama_client.cache_stats(),
+            'backend': ollama_client.backend_stats(),
+            'scheduler': ollama_client.scheduler.stats(),
             'status': 'ready' if ollama_connected and documents_loaded else 'not_ready'
         })
     except Exception as e:
@@ -71,48 +107,99 @@ def query():
         if not question:
             return jsonify({'error': 'No question provided'}), 400
         
-        # Verificar que el sistema esté listo
-        if not ollama_client.test_connection():
-            return jsonify({'error': 'Ollama not connected'}), 503
-        
+        # Verificar que el sistema esté listo; la conexión a Ollama la vigila el
+        # circuit breaker, sin sondear /api/tags en cada petición
         if len(ollama_client.documents) == 0:
             return jsonify({'error': 'No documents loaded'}), 503
+        ollama_client.circuit_breaker.raise_if_open()
         
         logger.info(f"Processing question: {question}")
         
-        # Buscar documentos relevantes
-        relevant_docs = ollama_client.search_documents(question, top_k=3)
-        
-        # Generar respuesta con contexto
-        response = ollama_client.query_with_context(question)
+        # Buscar documentos y generar respuesta en una sola pasada
+        result = ollama_client.answer_query(question, top_k=3, priority=_request_priority(data))
+        logger.info(f"Query timings (ms): {result['timings']}")
         
         # Preparar información de fuentes
         sources = []
-        for doc in relevant_docs:
+        for doc in result['chunks']:
             sources.append({
                 'source': doc['source'],
+                'article': doc.get('article'),
                 'similarity': doc['similarity']
             })
         
         return jsonify({
-            'response': response,
+            'response': result['answer'],
             'sources': sources,
-            'question': question
+            'question': question,
+            'prompt_chars': result['prompt_chars'],
+            'prompt_tokens': result['prompt_tokens'],
+            'cache_hit': result['cache_hit'],
+            'timings': result['timings']
         })
         
+    except (SchedulerRejected, CircuitOpenError) as e:
+        return _rejected_response(e)
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         return jsonify({'error': f'Error processing query: {str(e)}'}), 500
 
+def _sse_event(event: str, data: dict) -> str:
+    """Formatear un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """Procesar pregunta enviando primero las fuentes y luego los tokens (SSE)"""
+    data = request.get_json() or {}
+    question = data.get('question', '').strip()
+    
+    if not question:
+        return jsonify({'error': 'No question provided'}), 400
+    
+    if len(ollama_client.documents) == 0:
+        return jsonify({'error': 'No documents loaded'}), 503
+    
+    # Breaker y admisión antes de abrir el stream para poder responder 429/503
+    try:
+        ollama_client.circuit_breaker.raise_if_open()
+        slot = ollama_client.scheduler.acquire(_request_priority(data))
+    except (SchedulerRejected, CircuitOpenError) as e:
+        return _rejected_response(e)
+    
+    logger.info(f"Processing streaming question: {question}")
+    
+    def events():
+        try:
+            for event in ollama_client.query_with_context_stream(question):
+                if event['type'] == 'done':
+                    event['timings']['queue_wait'] = slot.wait_ms
+                yield _sse_event(event['type'], event)
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            yield _sse_event('error', {'type': 'error', 'error': f'Error processing query: {str(e)}'})
+        finally:
+            slot.release()
+    
+    response = Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Liberar el slot aunque el stream no llegue a iniciarse
+    response.call_on_close(slot.release)
+    return response
+
 @app.route('/reload_documents')
 def reload_documents():
-    """Recargar documentos"""
+    """Recargar documentos (solo reindexa los archivos que cambiaron)"""
     try:
-        ollama_client.load_documents()
+        changes = ollama_client.reload_documents()
         return jsonify({
             'success': True,
             'message': f'Loaded {len(ollama_client.documents)} documents',
-            'document_count': len(ollama_client.documents)
+            'document_count': len(ollama_client.documents),
+            'changes': changes
         })
     except Exception as e:
         logger.error(f"Error reloading documents: {e}")
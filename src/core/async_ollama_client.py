@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cliente asíncrono de Ollama para el servidor ASGI
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict
+
+import httpx
+
+from .http_client import CircuitBreaker, CircuitOpenError
+
+
+class AsyncOllamaBackend:
+    """httpx-based Ollama client: waiting generations cost coroutines, not threads"""
+
+    def __init__(self, base_url: str = "http://localhost:11434",
+                 model: str = "compras-publicas-chile",
+                 connect_timeout: float = 3.05, read_timeout: float = 120.0,
+                 max_connections: int = 64,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.base_url = base_url
+        self.model = model
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            # Reintenta solo si no se pudo establecer la conexión
+            transport=httpx.AsyncHTTPTransport(retries=2)
+        )
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    async def test_connection(self) -> bool:
+        """Test connection to Ollama server"""
+        try:
+            response = await self._request("GET", "/api/tags", timeout=5.0)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request guarded by the circuit breaker"""
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError(self.circuit_breaker.retry_after())
+
+        # Registrar el resultado pase lo que pase (también si se cancela la corrutina)
+        failed = True
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            failed = response.status_code >= 500
+        finally:
+            if failed:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+        return response
+
+    async def generate(self, prompt: str) -> str:
+        """Generate a full response (CircuitOpenError propagates)"""
+        data = {"model": self.model, "prompt": prompt, "stream": False}
+        try:
+            response = await self._request("POST", "/api/generate", json=data)
+            if response.status_code == 200:
+                return response.json().get("response", "")
+            return f"Error: {response.status_code}"
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield response tokens as Ollama sends its NDJSON chunks"""
+        data = {"model": self.model, "prompt": prompt, "stream": True}
+
+        if not self.circuit_breaker.allow_request():
+            yield f"Error: Ollama no disponible, reintentando en {self.circuit_breaker.retry_after():.0f}s"
+            return
+
+        # Sin respuesta (error de conexión, cancelación...) el sondeo cuenta como fallo
+        recorded = False
+        try:
+            async with self.client.stream("POST", "/api/generate", json=data) as response:
+                recorded = True
+                if response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                if response.status_code != 200:
+                    yield f"Error: {response.status_code}"
+                    return
+
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        yield f"Error: {chunk['error']}"
+                        return
+                    token = chunk.get("response", "")
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        return
+        except httpx.HTTPError as e:
+            recorded = True
+            self.circuit_breaker.record_failure()
+            yield f"Error: {str(e)}"
+        except Exception as e:
+            yield f"Error: {str(e)}"
+        finally:
+            if not recorded:
+                self.circuit_breaker.record_failure()
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection settings and circuit breaker state"""
+        return {
+            'base_url': self.base_url,
+            'circuit_breaker': self.circuit_breaker.stats()
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
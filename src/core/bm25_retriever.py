@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Recuperador BM25 sobre índice invertido con poda MaxScore
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+class BM25Retriever:
+    """BM25 over array-backed posting lists with MaxScore early termination.
+
+    Posting lists are stored CSC-style: ``offsets[t]:offsets[t + 1]`` slices
+    ``doc_ids``, ``term_freqs`` and the precomputed per-posting BM25
+    ``impacts`` of term ``t``. Document ids are sorted inside each list, so
+    membership of a candidate set can be resolved with a binary search
+    instead of a scan.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        self.analyzer = None
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.term_freqs = np.empty(0, dtype=np.int32)
+        self.impacts = np.empty(0, dtype=np.float32)
+        self.max_impacts = np.empty(0, dtype=np.float32)
+        self.doc_lengths = np.empty(0, dtype=np.int32)
+        self.n_docs = 0
+
+    def build(self, texts: List[str]) -> None:
+        """Build the inverted index for a list of texts"""
+        self.n_docs = len(texts)
+        if not texts:
+            self.__init__(self.k1, self.b)
+            return
+
+        counter = CountVectorizer(lowercase=True, dtype=np.int32)
+        try:
+            counts = counter.fit_transform(texts)
+        except ValueError:
+            # Solo textos vacíos o sin tokens
+            self.__init__(self.k1, self.b)
+            self.n_docs = len(texts)
+            return
+        self.vocabulary = counter.vocabulary_
+        self.analyzer = counter.build_analyzer()
+
+        self.doc_lengths = np.asarray(counts.sum(axis=1), dtype=np.int32).ravel()
+        avg_length = max(float(self.doc_lengths.mean()), 1.0)
+
+        postings = counts.tocsc()
+        postings.sort_indices()
+        self.offsets = postings.indptr.astype(np.int64)
+        self.doc_ids = postings.indices.astype(np.int32)
+        self.term_freqs = postings.data.astype(np.int32)
+
+        doc_freqs = np.diff(self.offsets)
+        idf = np.log1p((self.n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+        tf = self.term_freqs.astype(np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[self.doc_ids] / avg_length)
+        term_of_posting = np.repeat(np.arange(len(doc_freqs)), doc_freqs)
+        self.impacts = (idf[term_of_posting] * tf * (self.k1 + 1.0) / (tf + norm)).astype(np.float32)
+        # Cota superior por término: la base de la poda MaxScore
+        self.max_impacts = np.maximum.reduceat(self.impacts, self.offsets[:-1]).astype(np.float32)
+
+    def _query_terms(self, query: str) -> np.ndarray:
+        """Unique vocabulary ids of the query terms"""
+        if self.analyzer is None:
+            return np.empty(0, dtype=np.int64)
+        ids = {self.vocabulary[token] for token in self.analyzer(query) if token in self.vocabulary}
+        return np.fromiter(ids, dtype=np.int64, count=len(ids))
+
+    def upper_bound(self, query: str) -> float:
+        """Highest score any document could get for the query"""
+        return float(self.max_impacts[self._query_terms(query)].sum())
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Return (doc_id, score) pairs of the top_k documents.
+
+        Terms are processed by decreasing upper bound. While the candidate
+        set is open, each term's posting list is merged in full. Once the
+        k-th best score reaches the sum of the bounds of the remaining
+        terms, no unseen document can enter the top-k: the remaining (low
+        impact, usually long) posting lists are only probed for the current
+        candidates, and candidates that can no longer reach the threshold
+        are dropped.
+        """
+        terms = self._query_terms(query)
+        if top_k <= 0 or len(terms) == 0:
+            return []
+
+        bounds = self.max_impacts[terms]
+        order = np.argsort(-bounds, kind='stable')
+        terms, bounds = terms[order], bounds[order]
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1][1:], [0.0]])
+
+        cand_docs = np.empty(0, dtype=np.int32)
+        cand_scores = np.empty(0, dtype=np.float64)
+        closed = False
+
+        for i, term in enumerate(terms):
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.doc_ids[start:end]
+            impacts = self.impacts[start:end]
+
+            if not closed:
+                merged_docs = np.concatenate([cand_docs, docs])
+                merged_scores = np.concatenate([cand_scores, impacts])
+                cand_docs, inverse = np.unique(merged_docs, return_inverse=True)
+                cand_scores = np.bincount(inverse, weights=merged_scores)
+            elif len(cand_docs):
+                positions = np.minimum(np.searchsorted(docs, cand_docs), len(docs) - 1)
+                hits = docs[positions] == cand_docs
+                cand_scores[hits] += impacts[positions[hits]]
+
+            if len(cand_docs) >= top_k:
+                threshold = np.partition(cand_scores, len(cand_scores) - top_k)[len(cand_scores) - top_k]
+                if not closed and threshold >= remaining[i]:
+                    closed = True
+                if closed:
+                    alive = cand_scores + remaining[i] >= threshold
+                    cand_docs, cand_scores = cand_docs[alive], cand_scores[alive]
+
+        if len(cand_docs) > top_k:
+            best = np.argpartition(-cand_scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(cand_docs))
+        best = best[np.argsort(-cand_scores[best], kind='stable')]
+        return [(int(cand_docs[i]), float(cand_scores[i])) for i in best]
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Chunker consciente de la estructura de leyes y reglamentos chilenos
+
+Corta en los límites de CAPITULO, PARRAFO y Artículo Nº, guarda el
+identificador del artículo como metadato de cada chunk y subdivide los
+artículos largos según un presupuesto de tokens. Los documentos sin
+estructura (presentaciones, texto libre) se dividen por presupuesto.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for Spanish BPE vocabularies)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+class LegalDocumentChunker:
+    """Split legal texts on their own structure.
+
+    Every chunk carries ``chapter``, ``section`` (PARRAFO) and ``article``
+    metadata (None when not applicable), ``part``/``parts`` when an article
+    had to be sub-split, and a ``tokens`` estimate computed once at index time.
+    """
+
+    CHAPTER_PATTERN = re.compile(r'^"?\s*(CAP[IÍ]TULO\s+(?:[IVXLC]+|\d+|[ÚU]NICO))\b')
+    SECTION_PATTERN = re.compile(r'^"?\s*((?:P[AÁ]RRAFO|P[aá]rrafo)\s+\d+\s*[º°]?)')
+    TRANSITORY_PATTERN = re.compile(r'^"?\s*(?:DISPOSICIONES|ART[IÍ]CULOS|Disposiciones|Art[ií]culos)\s+'
+                                    r'(?:TRANSITORI[AO]S|[Tt]ransitori[ao]s)\s*$')
+    # Sin comillas: un "Artículo ..." citado es texto de la ley que se modifica
+    ARTICLE_PATTERN = re.compile(
+        r'^(?:ART[IÍ]CULO|Art[ií]culo)\s+'
+        r'(\d+\s*[º°]?(?:\s+(?:bis|ter|qu[áa]ter|quinquies|sexies|septies|octies|nonies|decies))?'
+        r'|[ÚU]NICO|[ÚúUu]nico|FINAL|[Ff]inal)'
+        r'\s*\.?\s*[-–]'
+    )
+    # Cabeceras y notas de margen que el conversor de PDF deja como líneas sueltas
+    FURNITURE_PATTERNS = [
+        re.compile(r'^Biblioteca del Congreso Nacional de Chile\b.*$'),
+        re.compile(r'^Ley \d{4,5}$'),
+        re.compile(r'^D\.O\. \d{2}\.\d{2}\.\d{4}$'),
+        re.compile(r'^Art\. (?:\d+|[úu]nico)\b.{0,30}$'),
+    ]
+    SENTENCE_SPLIT = re.compile(r'(?<=[.;:!?])\s+')
+    # Subir al cambiar las reglas de corte para invalidar los snapshots
+    VERSION = 2
+
+    def __init__(self, max_tokens: int = 256, min_tokens: int = 32):
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+
+    def config(self) -> Dict[str, Any]:
+        """Settings that change the produced chunks (part of the index key)"""
+        return {
+            'strategy': 'legal',
+            'version': self.VERSION,
+            'max_tokens': self.max_tokens,
+            'min_tokens': self.min_tokens
+        }
+
+    def chunk(self, doc: Dict) -> List[Dict]:
+        """Split one document into structure-aware chunks"""
+        sections = self._split_structure(doc['content'])
+        if not any(section['article'] for section in sections):
+            # Sin artículos: dividir todo el texto por presupuesto de tokens
+            lines = [line for section in sections for line in section['lines']]
+            sections = [{'chapter': None, 'section': None, 'article': None, 'lines': lines}]
+
+        chunks = []
+        for section in sections:
+            pieces = self._split_by_budget(section['lines'])
+            for part, text in enumerate(pieces, 1):
+                chunk = {
+                    'text': text,
+                    'source': doc['filename'],
+                    'path': doc['path'],
+                    'chapter': section['chapter'],
+                    'section': section['section'],
+                    'article': section['article'],
+                    'tokens': estimate_tokens(text)
+                }
+                if len(pieces) > 1:
+                    chunk['part'] = part
+                    chunk['parts'] = len(pieces)
+                chunks.append(chunk)
+        return chunks
+
+    def _split_structure(self, content: str) -> List[Dict]:
+        """Group lines into sections that start at each article heading"""
+        chapter = section = None
+        transitory = False
+        current = {'chapter': None, 'section': None, 'article': None, 'lines': []}
+        sections = [current]
+        pending_title = None  # Encabezado cuyo título está en la línea siguiente
+
+        for raw_line in content.splitlines():
+            line = raw_line.strip()
+            if not line or self._is_furniture(line):
+                continue
+
+            if pending_title:
+                if not (self.CHAPTER_PATTERN.match(line) or self.SECTION_PATTERN.match(line)
+                        or self.ARTICLE_PATTERN.match(line)):
+                    if pending_title == 'chapter':
+                        chapter = f"{chapter} - {line}"
+                    else:
+                        section = f"{section} - {line}"
+                    pending_title = None
+                    continue
+                pending_title = None
+
+            match = self.CHAPTER_PATTERN.match(line)
+            if match:
+                chapter, section, transitory = match.group(1), None, False
+                pending_title = 'chapter'
+                continue
+            match = self.SECTION_PATTERN.match(line)
+            if match:
+                section = match.group(1)
+                pending_title = 'section'
+                continue
+            if self.TRANSITORY_PATTERN.match(line):
+                chapter, section, transitory = line.strip('"'), None, True
+                continue
+
+            match = self.ARTICLE_PATTERN.match(line)
+            if match:
+                article = re.sub(r'\s+', ' ', match.group(1))
+                if transitory:
+                    article = f"{article} transitorio"
+                current = {'chapter': chapter, 'section': section, 'article': article, 'lines': []}
+                sections.append(current)
+
+            current['lines'].append(line)
+
+        return [section for section in sections if section['lines']]
+
+    def _is_furniture(self, line: str) -> bool:
+        return any(pattern.match(line) for pattern in self.FURNITURE_PATTERNS)
+
+    def _split_by_budget(self, lines: List[str]) -> List[str]:
+        """Pack lines into pieces of at most max_tokens, cutting at sentence ends"""
+        text = '\n'.join(lines)
+        if estimate_tokens(text) <= self.max_tokens:
+            return [text]
+
+        pieces = []
+        current = []
+        current_tokens = 0
+        for sentence in self._sentences(text):
+            tokens = estimate_tokens(sentence)
+            if current and current_tokens + tokens > self.max_tokens:
+                pieces.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(sentence)
+            current_tokens += tokens
+        if current:
+            tail = ' '.join(current)
+            # Unir una cola muy corta al trozo anterior en vez de dejarla sola
+            if pieces and current_tokens < self.min_tokens:
+                pieces[-1] = f"{pieces[-1]} {tail}"
+            else:
+                pieces.append(tail)
+        return pieces
+
+    def _sentences(self, text: str) -> List[str]:
+        """Sentences no longer than max_tokens (overlong ones are cut by words)"""
+        sentences = []
+        for sentence in self.SENTENCE_SPLIT.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if estimate_tokens(sentence) <= self.max_tokens:
+                sentences.append(sentence)
+                continue
+            max_chars = self.max_tokens * 4  # Inverso de estimate_tokens
+            current, length = [], 0
+            for word in sentence.split():
+                if current and length + 1 + len(word) > max_chars:
+                    sentences.append(' '.join(current))
+                    current, length = [], 0
+                length += len(word) + (1 if current else 0)
+                current.append(word)
+            if current:
+                sentences.append(' '.join(current))
+        return sentences
+
+    @staticmethod
+    def article_label(chunk: Dict) -> Optional[str]:
+        """Human-readable reference for a chunk, e.g. 'Artículo 5º (parte 2/3)'"""
+        if not chunk.get('article'):
+            return None
+        label = f"Artículo {chunk['article']}"
+        if chunk.get('parts'):
+            label += f" (parte {chunk['part']}/{chunk['parts']})"
+        return label
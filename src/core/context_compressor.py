@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compresión extractiva del contexto: conservar solo las frases relevantes
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .chunker import estimate_tokens
+
+
+class SentenceCompressor:
+    """Keep the sentences of each retrieved chunk that best match the query.
+
+    All sentences of all chunks are vectorized in a single ``transform``
+    call with the index's fitted TF-IDF vectorizer and scored with one
+    sparse product against the query vector. For every chunk the
+    ``top_sentences`` best sentences and ``window`` neighbours on each side
+    are kept in their original order; gaps are marked with ``[...]``.
+    """
+
+    GAP_MARKER = '[...]'
+    # Fin de frase, salvo abreviaturas frecuentes en los textos legales ("Art. 11")
+    SENTENCE_SPLIT = re.compile(r'(?<=[.;:!?])(?<!\bArt\.)(?<!\bart\.)(?<!\bInc\.)(?<!\binc\.)\s+')
+
+    def __init__(self, top_sentences: int = 1, window: int = 1, max_sentence_tokens: int = 48):
+        self.top_sentences = top_sentences
+        self.window = window
+        self.max_sentence_tokens = max_sentence_tokens
+
+    def compress(self, vectorizer, query: str, chunks: List[Dict]) -> Dict[str, Any]:
+        """Return compressed copies of ``chunks`` and the token counts before/after"""
+        split = [self._sentences(chunk['text']) for chunk in chunks]
+        sentences = [sentence for parts in split for sentence in parts]
+        tokens_before = sum(chunk.get('tokens') or estimate_tokens(chunk['text']) for chunk in chunks)
+        if not sentences:
+            return {'chunks': chunks, 'tokens_before': tokens_before, 'tokens_after': tokens_before}
+
+        # Una sola pasada: todas las frases contra la consulta (filas L2-normalizadas)
+        query_vector = vectorizer.transform([query])
+        scores = (vectorizer.transform(sentences) @ query_vector.T).toarray().ravel()
+
+        compressed = []
+        offset = 0
+        for chunk, parts in zip(chunks, split):
+            chunk_scores = scores[offset:offset + len(parts)]
+            offset += len(parts)
+            text = self._select(parts, chunk_scores)
+
+            chunk = chunk.copy()
+            if text is not None:
+                chunk['text'] = text
+                chunk['tokens'] = estimate_tokens(text)
+            compressed.append(chunk)
+
+        tokens_after = sum(chunk.get('tokens') or estimate_tokens(chunk['text']) for chunk in compressed)
+        return {'chunks': compressed, 'tokens_before': tokens_before, 'tokens_after': tokens_after}
+
+    def _sentences(self, text: str) -> List[str]:
+        """Sentences, with long unpunctuated runs (slides, tables) cut at line breaks"""
+        sentences = []
+        for sentence in self.SENTENCE_SPLIT.split(text.strip()):
+            if estimate_tokens(sentence) <= self.max_sentence_tokens:
+                sentences.append(sentence)
+                continue
+            current = []
+            for line in sentence.split('\n'):
+                if current and estimate_tokens('\n'.join(current + [line])) > self.max_sentence_tokens:
+                    sentences.append('\n'.join(current))
+                    current = []
+                current.append(line)
+            if current:
+                sentences.append('\n'.join(current))
+        return sentences
+
+    def _select(self, sentences: List[str], scores: np.ndarray) -> Optional[str]:
+        """Top sentences plus neighbours, in document order (None if all are kept)"""
+        best = np.argsort(-scores, kind='stable')[:self.top_sentences]
+        keep = set()
+        for index in best:
+            keep.update(range(max(index - self.window, 0), min(index + self.window + 1, len(sentences))))
+        if len(keep) == len(sentences):
+            return None
+
+        pieces = []
+        previous = -1
+        for index in sorted(keep):
+            if index > previous + 1:
+                pieces.append(self.GAP_MARKER)
+            pieces.append(sentences[index])
+            previous = index
+        if previous < len(sentences) - 1:
+            pieces.append(self.GAP_MARKER)
+        return ' '.join(pieces)
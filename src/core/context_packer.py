@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Empaquetado del contexto del prompt según un presupuesto de tokens
+"""
+
+import re
+from typing import Any, Dict, List
+
+from .chunker import LegalDocumentChunker, estimate_tokens
+
+
+class ContextPacker:
+    """Fill a token budget with retrieved chunks in score order.
+
+    Chunks are taken whole while they fit, using the ``tokens`` estimate
+    cached at index time. Sentences already sent by a higher-scored chunk
+    (the same article appears in several converted files) are dropped, and
+    the first chunk that does not fit is cut at a sentence boundary instead
+    of at a fixed character offset.
+    """
+
+    # Frases más cortas (incisos "a)", títulos) no se deduplican
+    MIN_DEDUP_CHARS = 40
+    # No vale la pena incluir un trozo final con menos tokens que esto
+    MIN_PARTIAL_TOKENS = 48
+
+    def __init__(self, max_tokens: int = 1200):
+        self.max_tokens = max_tokens
+
+    @staticmethod
+    def header(chunk: Dict) -> str:
+        """Source line shown above each chunk in the prompt"""
+        label = LegalDocumentChunker.article_label(chunk)
+        return f"Documento: {chunk['source']}" + (f" ({label})" if label else "")
+
+    @staticmethod
+    def _normalize(sentence: str) -> str:
+        return re.sub(r'\s+', ' ', sentence).strip().lower()
+
+    def pack(self, chunks: List[Dict], reserved_tokens: int = 0) -> Dict[str, Any]:
+        """Select context blocks for ``chunks`` (best first).
+
+        ``reserved_tokens`` is the part of the budget already taken by the
+        prompt template and the question. Returns the formatted blocks, the
+        tokens they use and how many chunks were deduplicated, truncated or
+        left out.
+        """
+        budget = self.max_tokens - reserved_tokens
+        seen = set()
+        blocks = []
+        used = 0
+        stats = {'deduplicated': 0, 'truncated': 0, 'dropped': 0}
+
+        for position, chunk in enumerate(chunks):
+            text = chunk['text']
+            tokens = chunk.get('tokens') or estimate_tokens(text)
+            sentences = LegalDocumentChunker.SENTENCE_SPLIT.split(text)
+            keys = [self._normalize(sentence) for sentence in sentences]
+
+            fresh = [
+                sentence for sentence, key in zip(sentences, keys)
+                if len(key) < self.MIN_DEDUP_CHARS or key not in seen
+            ]
+            if len(fresh) < len(sentences):
+                stats['deduplicated'] += 1
+                if not any(len(self._normalize(s)) >= self.MIN_DEDUP_CHARS for s in fresh):
+                    continue  # Todo su contenido ya está en el prompt
+                text = ' '.join(fresh)
+                tokens = estimate_tokens(text)
+
+            header = self.header(chunk)
+            cost = estimate_tokens(header) + tokens + 1
+            remaining = budget - used
+            if cost > remaining:
+                text = self._truncate(fresh, remaining - estimate_tokens(header) - 1)
+                if not text:
+                    stats['dropped'] += len(chunks) - position
+                    break
+                stats['truncated'] += 1
+                tokens = estimate_tokens(text)
+                cost = estimate_tokens(header) + tokens + 1
+
+            blocks.append({'chunk': chunk, 'text': f"{header}\n{text}", 'tokens': cost})
+            used += cost
+            seen.update(key for key in keys if len(key) >= self.MIN_DEDUP_CHARS)
+
+        return {'blocks': blocks, 'tokens': used, **stats}
+
+    def _truncate(self, sentences: List[str], max_tokens: int) -> str:
+        """Leading sentences that fit in max_tokens ('' if too little room)"""
+        if max_tokens < self.MIN_PARTIAL_TOKENS:
+            return ''
+        kept = []
+        used = 0
+        for sentence in sentences:
+            tokens = estimate_tokens(sentence) + 1
+            if used + tokens > max_tokens:
+                break
+            kept.append(sentence)
+            used += tokens
+        return ' '.join(kept) if used >= self.MIN_PARTIAL_TOKENS else ''
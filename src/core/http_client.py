@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Sesión HTTP con pool de conexiones, reintentos y circuit breaker para Ollama
+"""
+
+import math
+import threading
+import time
+from typing import Any, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(Exception):
+    """Raised when the backend is considered down and calls fail fast; carries a Retry-After hint"""
+
+    status_code = 503
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Ollama no disponible, reintentando en {retry_after:.0f}s")
+        self.retry_after = max(math.ceil(retry_after), 1)
+
+
+class CircuitBreaker:
+    """Open after consecutive failures, probe again after a cool-down.
+
+    closed    -> requests pass; ``failure_threshold`` consecutive failures open it
+    open      -> requests fail fast until ``reset_timeout`` seconds have passed
+    half_open -> a single probe request is let through; success closes the
+                 circuit, failure opens it again
+
+    Every request admitted by ``allow_request`` must end in exactly one
+    ``record_success`` or ``record_failure``, whatever happens to it
+    (callers record in a ``finally``), or a half-open circuit would wait
+    for its probe forever.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent to the backend now"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.probing:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def raise_if_open(self) -> None:
+        """Fail fast with CircuitOpenError while open, without using up the half-open probe"""
+        if self.state == 'open':
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError(self.retry_after())
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed"""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'rejected': self.rejected,
+            'retry_after': round(self.retry_after(), 1)
+        }
+
+
+def create_session(pool_connections: int = 4, pool_maxsize: int = 16,
+                   max_retries: int = 2, backoff_factor: float = 0.3) -> requests.Session:
+    """Session with a keep-alive connection pool and bounded retries.
+
+    Status and read-error retries only apply to idempotent methods (GET,
+    HEAD); a POST to /api/generate is retried only when the connection could
+    not be established, i.e. when nothing reached the backend.
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
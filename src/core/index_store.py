@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Snapshots en disco del índice TF-IDF usado por OllamaClient
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Incrementar cuando cambie el formato de los archivos o la forma de chunkear
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class IndexSnapshotStore:
+    """Persist the fitted vectorizer, CSR matrix and chunk metadata of a corpus"""
+
+    def __init__(self, directory: str = "data/index", keep: int = 2):
+        self.directory = Path(directory)
+        self.keep = keep
+
+    @staticmethod
+    def file_hash(content: str) -> str:
+        """SHA-256 of a document's text"""
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def corpus_hash(documents: List[Dict], config: Dict[str, Any]) -> str:
+        """Content hash of the corpus plus the indexing configuration"""
+        digest = hashlib.sha256()
+        digest.update(f"v{SNAPSHOT_FORMAT_VERSION}".encode('utf-8'))
+        digest.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+        for doc in sorted(documents, key=lambda d: d['filename']):
+            digest.update(doc['filename'].encode('utf-8'))
+            file_hash = doc.get('sha256') or IndexSnapshotStore.file_hash(doc['content'])
+            digest.update(file_hash.encode('utf-8'))
+        return digest.hexdigest()
+
+    def save(self, corpus_hash: str, vectorizer: TfidfVectorizer,
+             document_vectors: sparse.spmatrix, chunks: List[Dict],
+             extra: Optional[Dict[str, Any]] = None) -> Path:
+        """Write a snapshot atomically and prune old ones"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        target = self.directory / corpus_hash
+        tmp = self.directory / f".{corpus_hash}.tmp-{os.getpid()}"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir()
+
+        matrix = sparse.csr_matrix(document_vectors)
+        terms = [None] * len(vectorizer.vocabulary_)
+        for term, idx in vectorizer.vocabulary_.items():
+            terms[idx] = term
+
+        np.save(tmp / "idf.npy", np.asarray(vectorizer.idf_, dtype=np.float64))
+        np.save(tmp / "data.npy", matrix.data)
+        np.save(tmp / "indices.npy", matrix.indices)
+        np.save(tmp / "indptr.npy", matrix.indptr)
+        with open(tmp / "vocabulary.json", 'w', encoding='utf-8') as f:
+            json.dump(terms, f, ensure_ascii=False)
+        with open(tmp / "chunks.json", 'w', encoding='utf-8') as f:
+            json.dump(chunks, f, ensure_ascii=False)
+
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'corpus_hash': corpus_hash,
+            'shape': list(matrix.shape),
+            'nnz': int(matrix.nnz),
+            'chunk_count': len(chunks),
+        }
+        if extra:
+            manifest.update(extra)
+        # El manifiesto se escribe al final: su presencia marca el snapshot como completo
+        with open(tmp / "manifest.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+
+        latest_tmp = self.directory / f".LATEST.tmp-{os.getpid()}"
+        latest_tmp.write_text(corpus_hash, encoding='utf-8')
+        os.replace(latest_tmp, self.directory / "LATEST")
+
+        self._prune(keep_name=corpus_hash)
+        return target
+
+    def latest_hash(self) -> Optional[str]:
+        """Corpus hash of the most recently saved snapshot"""
+        latest = self.directory / "LATEST"
+        if not latest.exists():
+            return None
+        return latest.read_text(encoding='utf-8').strip() or None
+
+    def load(self, corpus_hash: str,
+             vectorizer_params: Dict[str, Any]) -> Optional[Tuple[TfidfVectorizer, sparse.csr_matrix, List[Dict], Dict]]:
+        """Load a snapshot with memory-mapped arrays, or None if missing/stale"""
+        manifest = self.read_manifest(corpus_hash)
+        if manifest is None:
+            return None
+
+        path = self.directory / corpus_hash
+        try:
+            with open(path / "vocabulary.json", 'r', encoding='utf-8') as f:
+                terms = json.load(f)
+            with open(path / "chunks.json", 'r', encoding='utf-8') as f:
+                chunks = json.load(f)
+
+            idf = np.load(path / "idf.npy")
+            data = np.load(path / "data.npy", mmap_mode='r')
+            indices = np.load(path / "indices.npy", mmap_mode='r')
+            indptr = np.load(path / "indptr.npy", mmap_mode='r')
+            matrix = sparse.csr_matrix((data, indices, indptr),
+                                       shape=tuple(manifest['shape']), copy=False)
+
+            vectorizer = TfidfVectorizer(
+                vocabulary={term: idx for idx, term in enumerate(terms)},
+                **vectorizer_params
+            )
+            vectorizer.idf_ = idf
+        except Exception as e:
+            print(f"✗ Snapshot de índice inválido ({corpus_hash[:12]}): {e}")
+            return None
+
+        if matrix.shape[0] != len(chunks):
+            return None
+        return vectorizer, matrix, chunks, manifest
+
+    def read_manifest(self, corpus_hash: str) -> Optional[Dict[str, Any]]:
+        """Read a snapshot manifest if it exists and matches the current format"""
+        manifest_path = self.directory / corpus_hash / "manifest.json"
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def _prune(self, keep_name: str) -> None:
+        """Remove all but the most recent snapshots"""
+        others = [
+            p for p in self.directory.iterdir()
+            if p.is_dir() and p.name != keep_name and not p.name.startswith('.')
+        ]
+        others.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        for snapshot in others[max(self.keep - 1, 0):]:
+            shutil.rmtree(snapshot, ignore_errors=True)
+
+
+def scan_corpus(directory: str, previous: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Detect added, modified and removed TXT files against previous file states.
+
+    Files whose mtime and size are unchanged are not read. Files whose stat
+    changed are re-read and hashed; they only count as modified when the
+    content hash differs.
+    """
+    states = {}
+    added, modified, unchanged = [], [], []
+
+    for txt_file in sorted(Path(directory).glob("*.txt")):
+        path = str(txt_file)
+        try:
+            stat = txt_file.stat()
+        except OSError as e:
+            print(f"✗ Error leyendo {txt_file.name}: {e}")
+            continue
+
+        old = previous.get(path)
+        if old and old['mtime_ns'] == stat.st_mtime_ns and old['size'] == stat.st_size:
+            states[path] = old
+            unchanged.append(path)
+            continue
+
+        try:
+            with open(txt_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            print(f"✗ Error cargando {txt_file.name}: {e}")
+            continue
+
+        sha256 = IndexSnapshotStore.file_hash(content)
+        states[path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256}
+        doc = {'filename': txt_file.name, 'content': content, 'path': path, 'sha256': sha256}
+
+        if old is None:
+            added.append(doc)
+        elif old['sha256'] != sha256:
+            modified.append(doc)
+        else:
+            unchanged.append(path)
+
+    removed = [path for path in previous if path not in states]
+    return {
+        'states': states,
+        'added': added,
+        'modified': modified,
+        'removed': removed,
+        'unchanged': unchanged
+    }
@@ -7,160 +7,757 @@ import requests
 import json
 import os
 import re
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, NamedTuple, Optional, Tuple, Union
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from .bm25_retriever import BM25Retriever
+from .chunker import LegalDocumentChunker, estimate_tokens
+from .context_compressor import SentenceCompressor
+from .context_packer import ContextPacker
+from .http_client import CircuitBreaker, CircuitOpenError, create_session
+from .index_store import IndexSnapshotStore, scan_corpus
+from .query_cache import QueryCache
+
+def _elapsed_ms(start: float) -> float:
+    """Milliseconds since a time.perf_counter() mark"""
+    return round((time.perf_counter() - start) * 1000, 3)
+
+class IndexState(NamedTuple):
+    """One consistent version of the search index.
+    
+    Re-indexing builds a new state and publishes it with a single attribute
+    assignment, so a search that reads ``client.index`` once sees chunks,
+    vectors and BM25 postings of the same version while another thread
+    reloads the documents.
+    """
+    vectorizer: Optional[TfidfVectorizer]
+    vectors: Optional[sparse.csr_matrix]
+    chunks: Tuple[Dict, ...]
+    bm25: Optional[BM25Retriever]
+    version: int
+
+EMPTY_INDEX = IndexState(None, None, (), None, 0)
 
 class OllamaClient:
-    def __init__(self, base_url: str = "http://localhost:11434"):
+    # Parámetros del vectorizador; forman parte de la clave del snapshot
+    VECTORIZER_PARAMS = {
+        'max_features': 5000,
+        'stop_words': None,  # Keep Spanish stopwords for now
+        'ngram_range': (1, 2)
+    }
+    # Presupuesto de tokens por chunk (los artículos más largos se subdividen)
+    CHUNK_MAX_TOKENS = 256
+    # Política de reindexado incremental: reajustar vocabulario/IDF desde cero
+    # cuando cambió más de esta fracción de chunks desde el último ajuste, o
+    # cuando los textos nuevos superan la tasa base de términos fuera del
+    # vocabulario por este margen
+    REFIT_CHANGE_RATIO = 0.25
+    REFIT_OOV_MARGIN = 0.15
+    MIN_SIMILARITY = 0.1
+    # num_ctx 2048 del Modelfile, menos ~300 tokens del SYSTEM y ~512
+    # reservados para la respuesta
+    PROMPT_TOKEN_BUDGET = 1200
+
+    RETRIEVERS = ('tfidf', 'bm25')
+
+    def __init__(self, base_url: str = "http://localhost:11434", index_dir: str = "data/index",
+                 retriever: str = "tfidf", cache_size: int = 1024, cache_ttl: float = 300.0,
+                 connect_timeout: float = 3.05, read_timeout: float = 120.0,
+                 pool_maxsize: int = 16, max_retries: int = 2,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 prompt_budget: int = None, compress_context: bool = False):
+        if retriever not in self.RETRIEVERS:
+            raise ValueError(f"Unknown retriever '{retriever}', expected one of {self.RETRIEVERS}")
         self.base_url = base_url
         self.model = "compras-publicas-chile"
+        # Conexiones keep-alive reutilizadas, timeouts y corte rápido si Ollama cae
+        self.session = create_session(pool_maxsize=pool_maxsize, max_retries=max_retries)
+        self.timeout = (connect_timeout, read_timeout)
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # Control de admisión opcional (GenerationScheduler) para answer_query
+        self.scheduler = None
         self.documents = []
-        self.document_chunks = []
-        self.vectorizer = None
-        self.document_vectors = None
+        self.chunker = LegalDocumentChunker(max_tokens=self.CHUNK_MAX_TOKENS)
+        # Tokens máximos del prompt (plantilla + pregunta + contexto)
+        self.context_packer = ContextPacker(prompt_budget or self.PROMPT_TOKEN_BUDGET)
+        # Compresión extractiva opcional: solo las frases más cercanas a la pregunta
+        self.compressor = SentenceCompressor() if compress_context else None
+        # Índice vigente (IndexState); cada búsqueda lo lee una sola vez y los
+        # reindexados, serializados por el lock, publican uno nuevo de una vez
+        self.index = EMPTY_INDEX
+        self._reindex_lock = threading.RLock()
+        # Snapshot en disco del índice (None desactiva la persistencia)
+        self.index_store = IndexSnapshotStore(index_dir) if index_dir else None
+        self.corpus_hash = None
+        # Estado por archivo (mtime, tamaño, hash) para el reindexado incremental
+        self.documents_dir = None
+        self.file_states = {}
+        self.fit_stats = {}
+        # Recuperador alternativo: índice invertido BM25 sobre los mismos chunks
+        self.retriever = retriever
+        # Caché de resultados; la versión del índice forma parte de la clave
+        self.query_cache = QueryCache(cache_size, cache_ttl) if cache_size > 0 else None
         
     def test_connection(self) -> bool:
         """Test connection to Ollama server"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            response = self._request("GET", "/api/tags", timeout=(self.timeout[0], 5))
             return response.status_code == 200
         except:
             return False
     
-    def generate(self, prompt: str, stream: bool = False) -> str:
-        """Generate response using Ollama"""
-        url = f"{self.base_url}/api/generate"
+    def _request(self, method: str, path: str, timeout=None, **kwargs) -> requests.Response:
+        """Send a request through the pooled session, guarded by the circuit breaker"""
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError(self.circuit_breaker.retry_after())
+        
+        # Cualquier salida (también excepciones ajenas a requests) cierra la
+        # petición en el breaker, para que un sondeo half-open no quede abierto
+        failed = True
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{path}", timeout=timeout or self.timeout, **kwargs
+            )
+            failed = response.status_code >= 500
+        finally:
+            if failed:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+        return response
+    
+    def generate(self, prompt: str, stream: bool = False) -> Union[str, Iterator[str]]:
+        """Generate response using Ollama (an iterator of tokens when stream=True).
+        
+        CircuitOpenError propagates so the caller can answer 503 with Retry-After.
+        """
+        if stream:
+            return self.generate_stream(prompt)
+        
         data = {
             "model": self.model,
             "prompt": prompt,
-            "stream": stream
+            "stream": False
         }
         
         try:
-            response = requests.post(url, json=data)
+            response = self._request("POST", "/api/generate", json=data)
             if response.status_code == 200:
                 result = response.json()
                 return result.get("response", "")
             else:
                 return f"Error: {response.status_code}"
+        except CircuitOpenError:
+            raise
         except Exception as e:
             return f"Error: {str(e)}"
     
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """Yield response tokens as Ollama sends its NDJSON chunks"""
+        data = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True
+        }
+        
+        try:
+            with self._request("POST", "/api/generate", json=data, stream=True) as response:
+                if response.status_code != 200:
+                    yield f"Error: {response.status_code}"
+                    return
+                
+                # El timeout de lectura se aplica entre chunks
+                try:
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            yield f"Error: {chunk['error']}"
+                            return
+                        token = chunk.get("response", "")
+                        if token:
+                            yield token
+                        if chunk.get("done"):
+                            return
+                except requests.RequestException:
+                    self.circuit_breaker.record_failure()
+                    raise
+        except Exception as e:
+            yield f"Error: {str(e)}"
+    
+    def backend_stats(self) -> Dict[str, Any]:
+        """Connection settings and circuit breaker state"""
+        return {
+            'base_url': self.base_url,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'circuit_breaker': self.circuit_breaker.stats()
+        }
+    
     def load_documents(self, directory: str = "data/processed/txt") -> None:
         """Load all TXT files from directory"""
-        txt_files = list(Path(directory).glob("*.txt"))
-        print(f"Cargando {len(txt_files)} archivos TXT...")
+        with self._reindex_lock:
+            txt_files = list(Path(directory).glob("*.txt"))
+            print(f"Cargando {len(txt_files)} archivos TXT...")
+            
+            self.documents = []
+            self.file_states = {}
+            for txt_file in txt_files:
+                try:
+                    stat = txt_file.stat()
+                    with open(txt_file, 'r', encoding='utf-8') as f:
+                        content = f.read()
+                        sha256 = IndexSnapshotStore.file_hash(content)
+                        self.documents.append({
+                            'filename': txt_file.name,
+                            'content': content,
+                            'path': str(txt_file),
+                            'sha256': sha256
+                        })
+                        self.file_states[str(txt_file)] = {
+                            'mtime_ns': stat.st_mtime_ns,
+                            'size': stat.st_size,
+                            'sha256': sha256
+                        }
+                    print(f"✓ Cargado: {txt_file.name}")
+                except Exception as e:
+                    print(f"✗ Error cargando {txt_file.name}: {e}")
+            self.documents_dir = directory
+            
+            # Reutilizar el índice persistido si el corpus no cambió
+            self.corpus_hash = self._compute_corpus_hash()
+            if self._load_index_snapshot():
+                return
+            # Si cambió, partir del último snapshot y reindexar solo lo modificado
+            if self._update_from_latest_snapshot():
+                return
+            
+            # Crear chunks, vectorizarlos y publicar el índice
+            self._rebuild_index()
+            # Persistir índice para el próximo arranque
+            self._save_index_snapshot()
+    
+    def reload_documents(self, directory: str = None) -> Dict[str, Any]:
+        """Re-index only the TXT files that were added, modified or removed"""
+        with self._reindex_lock:
+            directory = directory or self.documents_dir or "data/processed/txt"
+            if self.index.vectorizer is None or directory != self.documents_dir:
+                self.load_documents(directory)
+                return {
+                    'mode': 'full',
+                    'documents': len(self.documents),
+                    'chunks': len(self.index.chunks)
+                }
+            
+            changes = scan_corpus(directory, self.file_states)
+            self.file_states = changes['states']
+            added, modified, removed = changes['added'], changes['modified'], changes['removed']
+            summary = {
+                'mode': 'unchanged',
+                'added': len(added),
+                'modified': len(modified),
+                'removed': len(removed)
+            }
+            
+            if added or modified or removed:
+                stale = set(removed) | {doc['path'] for doc in modified}
+                self.documents = [doc for doc in self.documents if doc['path'] not in stale] + added + modified
+                result = self._apply_document_changes(added + modified, stale)
+                summary.update(result)
+                summary['mode'] = 'full' if result['full_refit'] else 'incremental'
+                mode = 'completo' if result['full_refit'] else 'incremental'
+                print(f"✓ Reindexado {mode}: +{len(added)} ~{len(modified)} -{len(removed)} archivos")
+            
+            summary['documents'] = len(self.documents)
+            summary['chunks'] = len(self.index.chunks)
+            return summary
+    
+    def _index_config(self) -> Dict[str, Any]:
+        """Configuration that invalidates the snapshot when changed"""
+        return {
+            'vectorizer': self.VECTORIZER_PARAMS,
+            'chunker': self.chunker.config()
+        }
+    
+    def _compute_corpus_hash(self) -> str:
+        """Content hash of the loaded documents and index configuration"""
+        return IndexSnapshotStore.corpus_hash(self.documents, self._index_config())
+    
+    def _load_index_snapshot(self) -> bool:
+        """Load chunks, vectorizer and vectors from disk if the corpus is unchanged"""
+        if not self.index_store or not self.documents:
+            return False
         
-        self.documents = []
-        for txt_file in txt_files:
-            try:
-                with open(txt_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    self.documents.append({
-                        'filename': txt_file.name,
-                        'content': content,
-                        'path': str(txt_file)
-                    })
-                print(f"✓ Cargado: {txt_file.name}")
-            except Exception as e:
-                print(f"✗ Error cargando {txt_file.name}: {e}")
-        
-        # Crear chunks de documentos
-        self._create_document_chunks()
-        # Vectorizar documentos
-        self._vectorize_documents()
-    
-    def _create_document_chunks(self, chunk_size: int = 1000) -> None:
+        snapshot = self.index_store.load(self.corpus_hash, self.VECTORIZER_PARAMS)
+        if snapshot is None:
+            return False
+        
+        vectorizer, vectors, chunks, manifest = snapshot
+        self.fit_stats = manifest.get('fit_stats', {})
+        self._publish_index(vectorizer, vectors, chunks)
+        print(f"✓ Índice cargado desde snapshot ({len(chunks)} chunks, {self.corpus_hash[:12]})")
+        return True
+    
+    def _update_from_latest_snapshot(self) -> bool:
+        """Start from the latest snapshot and re-index only the files that changed"""
+        if not self.index_store or not self.documents:
+            return False
+        
+        latest = self.index_store.latest_hash()
+        if not latest or latest == self.corpus_hash:
+            return False
+        
+        manifest = self.index_store.read_manifest(latest)
+        if (manifest is None or 'files' not in manifest
+                or json.dumps(manifest.get('config'), sort_keys=True)
+                != json.dumps(self._index_config(), sort_keys=True)):
+            return False
+        
+        snapshot = self.index_store.load(latest, self.VECTORIZER_PARAMS)
+        if snapshot is None:
+            return False
+        
+        vectorizer, vectors, chunks, _ = snapshot
+        base = IndexState(vectorizer, vectors, tuple(chunks), None, self.index.version)
+        self.fit_stats = manifest.get('fit_stats', {})
+        print(f"✓ Índice base cargado desde snapshot ({latest[:12]})")
+        
+        previous = {path: state['sha256'] for path, state in manifest['files'].items()}
+        current = {doc['path']: doc for doc in self.documents}
+        changed_docs = [
+            doc for path, doc in current.items()
+            if previous.get(path) != doc['sha256']
+        ]
+        removed = [path for path in previous if path not in current]
+        stale = set(removed) | {doc['path'] for doc in changed_docs if doc['path'] in previous}
+        
+        result = self._apply_document_changes(changed_docs, stale, base)
+        mode = 'completo' if result['full_refit'] else 'incremental'
+        print(f"✓ Reindexado {mode}: {len(changed_docs)} archivos nuevos o modificados, {len(removed)} eliminados")
+        return True
+    
+    def _apply_document_changes(self, new_docs: List[Dict], stale_paths,
+                                base: IndexState = None) -> Dict[str, Any]:
+        """Drop rows of stale files and append rows for new/modified documents (base: current index)"""
+        base = base or self.index
+        stale_paths = set(stale_paths)
+        keep = [i for i, chunk in enumerate(base.chunks) if chunk['path'] not in stale_paths]
+        chunks_removed = len(base.chunks) - len(keep)
+        new_chunks = [chunk for doc in new_docs for chunk in self._chunk_document(doc)]
+        
+        reason = self._refit_reason(base, chunks_removed + len(new_chunks), new_chunks)
+        if reason or not keep:
+            self._rebuild_index()
+        else:
+            chunks = [base.chunks[i] for i in keep]
+            vectors = base.vectors[keep]
+            if new_chunks:
+                new_vectors = base.vectorizer.transform([chunk['text'] for chunk in new_chunks])
+                vectors = sparse.vstack([vectors, new_vectors], format='csr')
+                chunks.extend(new_chunks)
+            self.fit_stats['changed_chunks'] = (
+                self.fit_stats.get('changed_chunks', 0) + chunks_removed + len(new_chunks)
+            )
+            self._publish_index(base.vectorizer, vectors, chunks)
+        
+        self.corpus_hash = self._compute_corpus_hash()
+        self._save_index_snapshot()
+        return {
+            'chunks_added': len(new_chunks),
+            'chunks_removed': chunks_removed,
+            'full_refit': bool(reason or not keep),
+            'refit_reason': reason
+        }
+    
+    def _refit_reason(self, base: IndexState, changed_chunks: int, new_chunks: List[Dict]) -> str:
+        """Decide whether IDF drift requires refitting the vectorizer from scratch"""
+        if base.vectorizer is None or base.vectors is None:
+            return 'no_index'
+        
+        fitted = max(self.fit_stats.get('chunk_count', 0), 1)
+        drift = (self.fit_stats.get('changed_chunks', 0) + changed_chunks) / fitted
+        if drift > self.REFIT_CHANGE_RATIO:
+            return 'corpus_drift'
+        
+        if new_chunks:
+            oov = self._oov_ratio(base.vectorizer, [chunk['text'] for chunk in new_chunks])
+            if oov > self.fit_stats.get('oov_ratio', 0.0) + self.REFIT_OOV_MARGIN:
+                return 'vocabulary_drift'
+        
+        return None
+    
+    @staticmethod
+    def _oov_ratio(vectorizer: TfidfVectorizer, texts: List[str], max_texts: int = 200) -> float:
+        """Fraction of unigram tokens not in the fitted vocabulary"""
+        if not texts:
+            return 0.0
+        
+        step = max(len(texts) // max_texts, 1)
+        analyzer = vectorizer.build_analyzer()
+        vocabulary = vectorizer.vocabulary_
+        total = missing = 0
+        for text in texts[::step]:
+            for token in analyzer(text):
+                if ' ' in token:
+                    continue
+                total += 1
+                missing += token not in vocabulary
+        return missing / total if total else 0.0
+    
+    def _save_index_snapshot(self) -> None:
+        """Persist the current index keyed by corpus hash"""
+        index = self.index
+        if not self.index_store or index.vectorizer is None or index.vectors is None:
+            return
+        
+        try:
+            path = self.index_store.save(
+                self.corpus_hash, index.vectorizer, index.vectors, list(index.chunks),
+                extra={
+                    'config': self._index_config(),
+                    'files': self.file_states,
+                    'fit_stats': self.fit_stats
+                }
+            )
+            print(f"✓ Snapshot de índice guardado en: {path}")
+        except Exception as e:
+            print(f"✗ Error guardando snapshot de índice: {e}")
+    
+    def _rebuild_index(self) -> None:
+        """Chunk and vectorize every document from scratch and publish the result"""
+        chunks = self._create_document_chunks()
+        vectorizer, vectors = self._vectorize_documents(chunks)
+        self._publish_index(vectorizer, vectors, chunks)
+    
+    def _create_document_chunks(self) -> List[Dict]:
         """Create chunks from documents for better search"""
-        self.document_chunks = []
+        chunks = []
         
         for doc in self.documents:
-            content = doc['content']
-            # Split by paragraphs first, then by sentences
-            paragraphs = content.split('\n\n')
-            
-            current_chunk = ""
-            for paragraph in paragraphs:
-                if len(current_chunk) + len(paragraph) < chunk_size:
-                    current_chunk += paragraph + "\n\n"
-                else:
-                    if current_chunk.strip():
-                        self.document_chunks.append({
-                            'text': current_chunk.strip(),
-                            'source': doc['filename'],
-                            'path': doc['path']
-                        })
-                    current_chunk = paragraph + "\n\n"
-            
-            # Add final chunk
-            if current_chunk.strip():
-                self.document_chunks.append({
-                    'text': current_chunk.strip(),
-                    'source': doc['filename'],
-                    'path': doc['path']
-                })
+            chunks.extend(self._chunk_document(doc))
         
-        print(f"✓ Creados {len(self.document_chunks)} chunks de documentos")
+        print(f"✓ Creados {len(chunks)} chunks de documentos")
+        return chunks
     
-    def _vectorize_documents(self) -> None:
+    def _chunk_document(self, doc: Dict) -> List[Dict]:
+        """Split one document into chunks along its CAPITULO/PARRAFO/Artículo structure"""
+        return self.chunker.chunk(doc)
+    
+    def _vectorize_documents(self, chunks: List[Dict]) -> Tuple[Optional[TfidfVectorizer], Optional[sparse.csr_matrix]]:
         """Create TF-IDF vectors for document search"""
-        if not self.document_chunks:
-            return
+        if not chunks:
+            return None, None
         
-        texts = [chunk['text'] for chunk in self.document_chunks]
-        self.vectorizer = TfidfVectorizer(
-            max_features=5000,
-            stop_words=None,  # Keep Spanish stopwords for now
-            ngram_range=(1, 2)
-        )
+        texts = [chunk['text'] for chunk in chunks]
+        vectorizer = TfidfVectorizer(**self.VECTORIZER_PARAMS)
         
-        self.document_vectors = self.vectorizer.fit_transform(texts)
+        vectors = vectorizer.fit_transform(texts)
+        self.fit_stats = {
+            'chunk_count': len(texts),
+            'changed_chunks': 0,
+            'oov_ratio': self._oov_ratio(vectorizer, texts)
+        }
         print(f"✓ Vectorizados {len(texts)} chunks de documentos")
+        return vectorizer, vectors
+    
+    def _publish_index(self, vectorizer: Optional[TfidfVectorizer], vectors: Optional[sparse.csr_matrix],
+                       chunks: List[Dict]) -> None:
+        """Build the derived indexes and publish the new version with one assignment"""
+        chunks = tuple(chunks)
+        bm25 = self._build_bm25_index(chunks) if self.retriever == 'bm25' else None
+        # La nueva versión invalida la caché: las entradas anteriores quedan inalcanzables
+        self.index = IndexState(vectorizer, vectors, chunks, bm25, self.index.version + 1)
+    
+    @staticmethod
+    def _build_bm25_index(chunks: Tuple[Dict, ...]) -> BM25Retriever:
+        """Build the BM25 inverted index over a chunk list"""
+        bm25 = BM25Retriever()
+        bm25.build([chunk['text'] for chunk in chunks])
+        print(f"✓ Índice BM25 creado ({len(bm25.doc_ids)} postings)")
+        return bm25
+    
+    def search_documents(self, query: str, top_k: int = 3, timings: Dict[str, float] = None) -> List[Dict]:
+        """Search for relevant document chunks (stage timings in ms go into `timings`)"""
+        return self._search(self.index, query, top_k, timings)
+    
+    def _search(self, index: IndexState, query: str, top_k: int, timings: Dict[str, float] = None) -> List[Dict]:
+        """Cached search against one index version"""
+        if timings is None:
+            timings = {}
+        timings.setdefault('vectorize', 0.0)
+        timings.setdefault('score', 0.0)
+        
+        key = self._cache_key(index, query, top_k)
+        cached = self.query_cache.get(key) if self.query_cache else None
+        timings['cache_hit'] = cached is not None
+        if cached is not None:
+            return [chunk.copy() for chunk in cached]
+        
+        results = self._search_uncached(index, query, top_k, timings)
+        if self.query_cache:
+            self.query_cache.put(key, tuple(chunk.copy() for chunk in results))
+        return results
     
-    def search_documents(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Search for relevant document chunks"""
-        if not self.vectorizer or self.document_vectors is None:
+    def search_documents_batch(self, queries: List[str], top_k: int = 3) -> List[List[Dict]]:
+        """Search many queries with a single sparse matrix product"""
+        index = self.index
+        results = [None] * len(queries)
+        keys = [self._cache_key(index, query, top_k) for query in queries]
+        pending = []
+        for i, key in enumerate(keys):
+            cached = self.query_cache.get(key) if self.query_cache else None
+            if cached is not None:
+                results[i] = [chunk.copy() for chunk in cached]
+            else:
+                pending.append(i)
+        
+        if pending:
+            found = self._search_batch_uncached(index, [queries[i] for i in pending], top_k)
+            for i, chunks in zip(pending, found):
+                results[i] = chunks
+                if self.query_cache:
+                    self.query_cache.put(keys[i], tuple(chunk.copy() for chunk in chunks))
+        return results
+    
+    def _cache_key(self, index: IndexState, query: str, top_k: int) -> tuple:
+        """Cache key: normalized query, top_k, retriever and index version"""
+        return (QueryCache.normalize(query), top_k, self.retriever, index.version)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the retrieval cache"""
+        stats = self.query_cache.stats() if self.query_cache else {'enabled': False}
+        stats['index_version'] = self.index.version
+        return stats
+    
+    def _search_uncached(self, index: IndexState, query: str, top_k: int,
+                         timings: Dict[str, float] = None) -> List[Dict]:
+        """Score one query against the index"""
+        if timings is None:
+            timings = {}
+        
+        if self.retriever == 'bm25':
+            start = time.perf_counter()
+            results = self._search_bm25(index, query, top_k)
+            timings['score'] = _elapsed_ms(start)
+            return results
+        
+        if not index.vectorizer or index.vectors is None:
             return []
         
         # Vectorize query
-        query_vector = self.vectorizer.transform([query])
+        start = time.perf_counter()
+        query_vector = index.vectorizer.transform([query]).toarray().ravel()
+        timings['vectorize'] = _elapsed_ms(start)
+        
+        # Rows and query are L2-normalized by TF-IDF, so the dot product is
+        # the cosine similarity
+        start = time.perf_counter()
+        similarities = index.vectors @ query_vector
+        
+        # Get top k results without sorting the whole vector
+        top_indices = self._top_k_indices(similarities, top_k)
+        results = self._build_results(index.chunks, top_indices, similarities[top_indices])
+        timings['score'] = _elapsed_ms(start)
+        return results
+    
+    def _search_batch_uncached(self, index: IndexState, queries: List[str], top_k: int) -> List[List[Dict]]:
+        """Score many queries in one sparse matrix product"""
+        if self.retriever == 'bm25':
+            return [self._search_bm25(index, query, top_k) for query in queries]
+        
+        if not index.vectorizer or index.vectors is None:
+            return [[] for _ in queries]
+        if not queries:
+            return []
+        
+        query_vectors = index.vectorizer.transform(queries)
+        # (n_queries x n_chunks), sparse: only chunks sharing terms are stored
+        similarities = (query_vectors @ index.vectors.T).tocsr()
+        # Columnas ordenadas: el desempate por posición es el mismo que por chunk
+        similarities.sort_indices()
+        
+        results = []
+        for row in range(similarities.shape[0]):
+            start, end = similarities.indptr[row], similarities.indptr[row + 1]
+            row_scores = similarities.data[start:end]
+            row_chunks = similarities.indices[start:end]
+            best = self._top_k_indices(row_scores, top_k)
+            results.append(self._build_results(index.chunks, row_chunks[best], row_scores[best]))
+        return results
+    
+    def _search_bm25(self, index: IndexState, query: str, top_k: int) -> List[Dict]:
+        """Search with the BM25 inverted index"""
+        bm25 = index.bm25
+        if bm25 is None:
+            if not index.chunks:
+                return []
+            bm25 = self._build_bm25_index(index.chunks)
+            with self._reindex_lock:
+                if self.index is index:
+                    self.index = index._replace(bm25=bm25)
         
-        # Calculate similarities
-        similarities = cosine_similarity(query_vector, self.document_vectors)[0]
+        hits = bm25.search(query, top_k)
+        if not hits:
+            return []
         
-        # Get top k results
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        # 'similarity' normalizada a [0, 1] con la cota máxima de la consulta
+        bound = bm25.upper_bound(query) or 1.0
+        results = []
+        for idx, score in hits:
+            chunk = index.chunks[idx].copy()
+            chunk['score'] = score
+            chunk['similarity'] = score / bound
+            results.append(chunk)
+        return results
+    
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Indices of the top_k scores in descending order (partition + small sort).
         
+        Same order as the full ``argsort(scores)[::-1][:top_k]``: equal scores
+        go by decreasing index, also at the k-th place, so the result does not
+        depend on which of the tied entries the partition happens to pick.
+        """
+        if top_k <= 0 or len(scores) == 0:
+            return np.empty(0, dtype=np.intp)
+        if top_k < len(scores):
+            kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+            above = np.flatnonzero(scores > kth)
+            tied = np.flatnonzero(scores == kth)[::-1][:top_k - len(above)]
+            candidates = np.concatenate([above, tied])
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.lexsort((-candidates, -scores[candidates]))]
+    
+    def _build_results(self, chunks: Tuple[Dict, ...], indices: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        """Copy the selected chunks and attach their similarity"""
         results = []
-        for idx in top_indices:
-            if similarities[idx] > 0.1:  # Minimum similarity threshold
-                chunk = self.document_chunks[idx].copy()
-                chunk['similarity'] = similarities[idx]
+        for idx, score in zip(indices, scores):
+            if score > self.MIN_SIMILARITY:  # Minimum similarity threshold
+                chunk = chunks[idx].copy()
+                chunk['similarity'] = float(score)
                 results.append(chunk)
         
         return results
     
     def query_with_context(self, query: str) -> str:
         """Query with document context (RAG)"""
-        # Search for relevant documents
-        relevant_docs = self.search_documents(query, top_k=3)
+        try:
+            return self.answer_query(query)['answer']
+        except CircuitOpenError as e:
+            return f"Error: {str(e)}"
+    
+    def prepare_query(self, query: str, top_k: int = 3) -> Dict[str, Any]:
+        """Retrieval and prompt-building stages of the RAG pipeline (no generation)"""
+        timings = {}
+        index = self.index
+        relevant_docs = self._search(index, query, top_k, timings)
+        cache_hit = timings.pop('cache_hit')
+        
+        compression = None
+        if self.compressor and relevant_docs:
+            start = time.perf_counter()
+            compression = self.compressor.compress(index.vectorizer, query, relevant_docs)
+            relevant_docs = compression.pop('chunks')
+            timings['compress'] = _elapsed_ms(start)
+        
+        start = time.perf_counter()
+        built = self._build_prompt(query, relevant_docs)
+        prompt = built['prompt']
+        timings['prompt_build'] = _elapsed_ms(start)
+        
+        # Solo los chunks que entraron en el prompt se reportan como fuentes
+        return {
+            'chunks': built['chunks'],
+            'scores': [doc['similarity'] for doc in built['chunks']],
+            'prompt': prompt,
+            'prompt_chars': len(prompt),
+            'prompt_tokens': estimate_tokens(prompt),
+            'context_tokens': built['context_tokens'],
+            'compression': compression,
+            'cache_hit': cache_hit,
+            'timings': timings
+        }
+    
+    def answer_query(self, query: str, top_k: int = 3, priority: int = 0) -> Dict[str, Any]:
+        """Retrieve, build the prompt and generate once, reporting per-stage timings (ms).
+        
+        When a scheduler is set, generation waits for an admission slot and
+        SchedulerRejected propagates to the caller if the queue is full or
+        the wait times out.
+        """
+        result = self.prepare_query(query, top_k)
+        prompt = result.pop('prompt')
+        timings = result['timings']
+        
+        slot = self.scheduler.acquire(priority) if self.scheduler else None
+        if slot:
+            timings['queue_wait'] = slot.wait_ms
+        
+        start = time.perf_counter()
+        try:
+            result['answer'] = self.generate(prompt)
+        finally:
+            if slot:
+                slot.release()
+        timings['generate'] = _elapsed_ms(start)
+        timings['total'] = round(sum(timings.values()), 3)
+        return result
+    
+    def query_with_context_stream(self, query: str, top_k: int = 3) -> Iterator[Dict[str, Any]]:
+        """Query with document context, yielding the sources first and then tokens"""
+        prepared = self.prepare_query(query, top_k)
+        yield self.sources_event(prepared)
         
+        timings = prepared['timings']
+        start = time.perf_counter()
+        first_token = None
+        for token in self.generate_stream(prepared['prompt']):
+            if first_token is None:
+                first_token = _elapsed_ms(start)
+            yield {'type': 'token', 'token': token}
+        timings['first_token'] = first_token or 0.0
+        timings['generate'] = _elapsed_ms(start)
+        
+        yield self.done_event(prepared)
+    
+    @staticmethod
+    def sources_event(prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """First streaming event: the sources used for the answer"""
+        return {
+            'type': 'sources',
+            'sources': [
+                {'source': doc['source'], 'article': doc.get('article'), 'similarity': doc['similarity']}
+                for doc in prepared['chunks']
+            ]
+        }
+    
+    @staticmethod
+    def done_event(prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """Last streaming event: prompt size and stage timings"""
+        return {
+            'type': 'done',
+            'prompt_chars': prepared['prompt_chars'],
+            'prompt_tokens': prepared['prompt_tokens'],
+            'cache_hit': prepared['cache_hit'],
+            'timings': prepared['timings']
+        }
+    
+    def _build_prompt(self, query: str, relevant_docs: List[Dict]) -> Dict[str, Any]:
+        """Build the RAG prompt, packing the retrieved chunks into the token budget"""
         if not relevant_docs:
             # If no relevant docs, use general prompt
             prompt = f"""Pregunta: {query}
 
 Responde de manera útil y precisa."""
-        else:
-            # Build context from relevant documents
-            context = "\n\n".join([
-                f"Documento: {doc['source']}\n{doc['text'][:800]}..."
-                for doc in relevant_docs
-            ])
-            
-            prompt = f"""Basándote en los siguientes documentos sobre compras públicas en Chile, responde la pregunta:
+            return {'prompt': prompt, 'chunks': [], 'context_tokens': 0}
+        
+        template = """Basándote en los siguientes documentos sobre compras públicas en Chile, responde la pregunta:
 
 CONTEXTO:
 {context}
@@ -168,8 +765,16 @@ CONTEXTO:
 PREGUNTA: {query}
 
 RESPUESTA (basada en los documentos proporcionados):"""
+        reserved = estimate_tokens(template.format(context="", query=query))
+        packed = self.context_packer.pack(relevant_docs, reserved_tokens=reserved)
         
-        return self.generate(prompt)
+        # Build context from relevant documents
+        context = "\n\n".join(block['text'] for block in packed['blocks'])
+        return {
+            'prompt': template.format(context=context, query=query),
+            'chunks': [block['chunk'] for block in packed['blocks']],
+            'context_tokens': packed['tokens']
+        }
     
     def list_documents(self) -> List[str]:
         """List loaded documents"""
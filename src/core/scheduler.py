@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Control de admisión y cola acotada para las generaciones enviadas a Ollama
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+
+class SchedulerRejected(Exception):
+    """Request not admitted; carries the HTTP status and a Retry-After hint"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFullError(SchedulerRejected):
+    """The wait queue is full"""
+
+    status_code = 429
+
+
+class QueueTimeoutError(SchedulerRejected):
+    """The request waited longer than the configured timeout"""
+
+    status_code = 503
+
+
+class GenerationSlot:
+    """Admission ticket; release() is idempotent so it can be wired to several hooks"""
+
+    def __init__(self, scheduler, wait_ms: float):
+        self.scheduler = scheduler
+        self.wait_ms = wait_ms
+        self.acquired_at = time.monotonic()
+        self.released = False
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        self.scheduler._release(time.monotonic() - self.acquired_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class _SchedulerBase:
+    """Counters, wait-time statistics and Retry-After estimation"""
+
+    def __init__(self, max_in_flight: int = 2, max_queue: int = 32, wait_timeout: float = 30.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.wait_timeout = wait_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+        self.max_queue_depth = 0
+        self.wait_times = deque(maxlen=1000)
+        self.service_time = None  # Media móvil exponencial (segundos)
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def _record_admission(self, wait_seconds: float) -> None:
+        self.admitted += 1
+        self.wait_times.append(wait_seconds * 1000)
+
+    def _record_completion(self, service_seconds: float) -> None:
+        self.completed += 1
+        if self.service_time is None:
+            self.service_time = service_seconds
+        else:
+            self.service_time = 0.8 * self.service_time + 0.2 * service_seconds
+
+    def _prune(self) -> None:
+        """Drop cancelled entries at the head of the heap, or all of them once they outnumber the waiters"""
+        if len(self._heap) > 2 * self.waiting:
+            self._heap = [entry for entry in self._heap if self._pending(entry)]
+            heapq.heapify(self._heap)
+        while self._heap and not self._pending(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, from queue depth and service time"""
+        service = self.service_time or 1.0
+        estimate = service * (self.waiting + 1) / max(self.max_in_flight, 1)
+        return int(min(max(math.ceil(estimate), 1), 60))
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.wait_times)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(int(p * len(waits)), len(waits) - 1)], 3)
+
+        return {
+            'max_in_flight': self.max_in_flight,
+            'max_queue': self.max_queue,
+            'wait_timeout': self.wait_timeout,
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'max_queue_depth': self.max_queue_depth,
+            'admitted': self.admitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'wait_ms': {
+                'mean': round(sum(waits) / len(waits), 3) if waits else 0.0,
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'max': round(waits[-1], 3) if waits else 0.0
+            },
+            'service_time_ms': round(self.service_time * 1000, 3) if self.service_time else None
+        }
+
+
+class GenerationScheduler(_SchedulerBase):
+    """Thread-based scheduler for the Flask server.
+
+    At most ``max_in_flight`` generations run at once; up to ``max_queue``
+    more wait in priority order (lower value first, FIFO within a
+    priority). A full queue raises QueueFullError (HTTP 429) and waiting
+    longer than ``wait_timeout`` raises QueueTimeoutError (HTTP 503).
+    """
+
+    def __init__(self, max_in_flight: int = 2, max_queue: int = 32, wait_timeout: float = 30.0):
+        super().__init__(max_in_flight, max_queue, wait_timeout)
+        self._condition = threading.Condition()
+
+    def acquire(self, priority: int = 0) -> GenerationSlot:
+        """Block until a generation slot is free; returns the slot to release"""
+        start = time.monotonic()
+        with self._condition:
+            if self.in_flight < self.max_in_flight and not self.waiting:
+                self.in_flight += 1
+                self._record_admission(0.0)
+                return GenerationSlot(self, 0.0)
+
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError("Generation queue is full", self.retry_after())
+
+            # [prioridad, secuencia, estado]; el estado cambia a 'granted' o 'cancelled'
+            entry = [priority, next(self._sequence), 'waiting']
+            heapq.heappush(self._heap, entry)
+            self.waiting += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.waiting)
+
+            deadline = start + self.wait_timeout
+            while entry[2] == 'waiting':
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    entry[2] = 'cancelled'
+                    self.waiting -= 1
+                    self.timed_out += 1
+                    self._prune()
+                    raise QueueTimeoutError("Timed out waiting for a generation slot", self.retry_after())
+                self._condition.wait(remaining)
+
+            waited = time.monotonic() - start
+            self._record_admission(waited)
+            return GenerationSlot(self, round(waited * 1000, 3))
+
+    def _release(self, service_seconds: float) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._record_completion(service_seconds)
+            while self.in_flight < self.max_in_flight and self._heap:
+                entry = heapq.heappop(self._heap)
+                if entry[2] != 'waiting':
+                    continue
+                entry[2] = 'granted'
+                self.waiting -= 1
+                self.in_flight += 1
+            self._condition.notify_all()
+
+    @staticmethod
+    def _pending(entry) -> bool:
+        return entry[2] == 'waiting'
+
+
+class AsyncGenerationScheduler(_SchedulerBase):
+    """asyncio version of GenerationScheduler for the ASGI server (single event loop)"""
+
+    async def acquire(self, priority: int = 0) -> GenerationSlot:
+        """Wait for a generation slot; returns the slot to release"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+            self._record_admission(0.0)
+            return GenerationSlot(self, 0.0)
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError("Generation queue is full", self.retry_after())
+
+        future = loop.create_future()
+        heapq.heappush(self._heap, (priority, next(self._sequence), future))
+        self.waiting += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.waiting)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.waiting -= 1
+                self.timed_out += 1
+                self._prune()
+                raise QueueTimeoutError("Timed out waiting for a generation slot", self.retry_after())
+        except asyncio.CancelledError:
+            # Cliente desconectado mientras esperaba
+            if future.done() and not future.cancelled():
+                self._release(0.0)
+            else:
+                future.cancel()
+                self.waiting -= 1
+                self._prune()
+            raise
+
+        waited = loop.time() - start
+        self._record_admission(waited)
+        return GenerationSlot(self, round(waited * 1000, 3))
+
+    def _release(self, service_seconds: float) -> None:
+        self.in_flight -= 1
+        self._record_completion(service_seconds)
+        while self.in_flight < self.max_in_flight and self._heap:
+            _, _, future = heapq.heappop(self._heap)
+            if future.done():
+                continue
+            future.set_result(True)
+            self.waiting -= 1
+            self.in_flight += 1
+
+    @staticmethod
+    def _pending(entry) -> bool:
+        return not entry[2].done()
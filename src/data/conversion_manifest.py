@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Manifiesto de conversión PDF -> TXT para no reextraer archivos sin cambios
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+
+class ConversionManifest:
+    """Per-directory record of what produced each TXT file.
+
+    One entry per PDF with the PDF hash and stat, the extractor and its
+    version, the output hash and, for every page, the hash of its content
+    stream, the hash of its extracted text and its length in the output.
+    A PDF whose stat is unchanged is skipped without being read; a PDF
+    whose hash changed only needs its changed pages re-extracted. The
+    ``cleaned`` part records the final TXT generated from the per-page one,
+    so a new cleaner version re-runs only the cleanup. PDFs whose conversion
+    failed are kept in ``quarantine`` and not retried until they change.
+    """
+
+    FILENAME = ".conversion_manifest.json"
+
+    def __init__(self, directory: str):
+        self.path = Path(directory) / self.FILENAME
+        self.entries = {}
+        self.quarantined = {}
+        self.dirty = False
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.entries = data.get('files', {})
+                self.quarantined = data.get('quarantine', {})
+            except (OSError, ValueError):
+                self.entries = {}
+                self.quarantined = {}
+
+    @staticmethod
+    def file_hash(path) -> str:
+        """SHA-256 of a file, read in blocks"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, pdf_path) -> Optional[Dict[str, Any]]:
+        return self.entries.get(Path(pdf_path).name)
+
+    def is_current(self, pdf_path, txt_path, extractor_version: str) -> bool:
+        """Whether txt_path is the up-to-date conversion of pdf_path"""
+        entry = self.get(pdf_path)
+        txt_path = Path(txt_path)
+        if not entry or entry['extractor_version'] != extractor_version:
+            return False
+        if not txt_path.exists() or txt_path.stat().st_size != entry['output_size']:
+            return False
+
+        stat = os.stat(pdf_path)
+        if stat.st_size == entry['pdf_size'] and stat.st_mtime_ns == entry['pdf_mtime_ns']:
+            return True
+        if stat.st_size != entry['pdf_size'] or self.file_hash(pdf_path) != entry['pdf_sha256']:
+            return False
+        # Mismo contenido con otra fecha (p. ej. copiado de nuevo): actualizar stat
+        entry['pdf_mtime_ns'] = stat.st_mtime_ns
+        self.dirty = True
+        return True
+
+    def reusable_pages(self, pdf_path, txt_path, source_hashes: List[str],
+                       extractor_version: str) -> Set[int]:
+        """Pages whose content stream did not change since the last run.
+
+        The previous TXT is read page by page (never whole) to check each
+        page's text hash; if the file as a whole no longer matches the
+        manifest, e.g. it was edited by hand, nothing is reused.
+        """
+        entry = self.get(pdf_path)
+        txt_path = Path(txt_path)
+        if not entry or entry['extractor_version'] != extractor_version or not txt_path.exists():
+            return set()
+
+        reusable = set()
+        digest = hashlib.sha256()
+        with open(txt_path, 'r', encoding='utf-8', newline='') as f:
+            for page_num, page in enumerate(entry['pages']):
+                text = f.read(page['chars'])
+                digest.update(text.encode('utf-8'))
+                if (page_num < len(source_hashes) and page['source_sha256'] == source_hashes[page_num]
+                        and self.text_hash(text) == page['text_sha256']):
+                    reusable.add(page_num)
+            for block in iter(lambda: f.read(1 << 16), ''):
+                digest.update(block.encode('utf-8'))
+        if digest.hexdigest() != entry['output_sha256']:
+            return set()
+        return reusable
+
+    def record(self, pdf_path, txt_path, pdf_hash: str, extractor: str, extractor_version: str,
+               output_sha256: str, pages: List[Dict[str, Any]]) -> None:
+        """Store the entry for a freshly written TXT file"""
+        stat = os.stat(pdf_path)
+        self.entries[Path(pdf_path).name] = {
+            'pdf_sha256': pdf_hash,
+            'pdf_size': stat.st_size,
+            'pdf_mtime_ns': stat.st_mtime_ns,
+            'extractor': extractor,
+            'extractor_version': extractor_version,
+            'output': os.path.relpath(txt_path, self.path.parent),
+            'output_sha256': output_sha256,
+            'output_size': Path(txt_path).stat().st_size,
+            'pages': pages
+        }
+        self.quarantined.pop(Path(pdf_path).name, None)
+        self.dirty = True
+
+    def is_cleaned(self, pdf_path, txt_path, cleaner_version: str) -> bool:
+        """Whether txt_path is the up-to-date cleanup of the recorded per-page TXT"""
+        entry = self.get(pdf_path)
+        cleaned = entry.get('cleaned') if entry else None
+        txt_path = Path(txt_path)
+        return bool(cleaned and cleaned['cleaner_version'] == cleaner_version and txt_path.exists()
+                    and txt_path.stat().st_size == cleaned['output_size'])
+
+    def record_cleaned(self, pdf_path, txt_path, cleaner_version: str, output_sha256: str) -> None:
+        """Store the final TXT generated for an entry already recorded"""
+        self.get(pdf_path)['cleaned'] = {
+            'cleaner_version': cleaner_version,
+            'output': os.path.relpath(txt_path, self.path.parent),
+            'output_sha256': output_sha256,
+            'output_size': Path(txt_path).stat().st_size
+        }
+        self.dirty = True
+
+    def is_quarantined(self, pdf_path) -> bool:
+        """Whether pdf_path failed before and has not changed since"""
+        record = self.quarantined.get(Path(pdf_path).name)
+        if not record:
+            return False
+        stat = os.stat(pdf_path)
+        if stat.st_size == record['pdf_size'] and stat.st_mtime_ns == record['pdf_mtime_ns']:
+            return True
+        if stat.st_size != record['pdf_size'] or self.file_hash(pdf_path) != record['pdf_sha256']:
+            return False
+        record['pdf_mtime_ns'] = stat.st_mtime_ns
+        self.dirty = True
+        return True
+
+    def quarantine(self, pdf_path, reason: str) -> None:
+        """Record a failed conversion so the PDF is skipped until it changes"""
+        stat = os.stat(pdf_path)
+        name = Path(pdf_path).name
+        previous = self.quarantined.get(name, {})
+        self.quarantined[name] = {
+            'pdf_sha256': self.file_hash(pdf_path),
+            'pdf_size': stat.st_size,
+            'pdf_mtime_ns': stat.st_mtime_ns,
+            'reason': reason,
+            'failed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'attempts': previous.get('attempts', 0) + 1
+        }
+        self.dirty = True
+
+    def save(self) -> None:
+        """Write the manifest atomically if something changed"""
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.FILENAME}.tmp-{os.getpid()}")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.entries, 'quarantine': self.quarantined}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self.dirty = False
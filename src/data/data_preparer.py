@@ -3,20 +3,306 @@
 Preparar datos de entrenamiento para fine-tuning del modelo de compras públicas
 """
 
+import argparse
+import bisect
 import json
+import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import random
+from collections import Counter
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.data.deduplicator import NearDuplicateFilter
+from src.data.keyword_index import KeywordIndex
+from src.data.quality_filter import QualityFilter, repeated_lines
+from src.data.sharded_dataset import ShardedDatasetWriter
+from src.data.stage_cache import StageCache, content_hash
+
+# Disparadores de los patrones de extracción, buscados en una sola pasada. Son
+# lookaheads para que se encuentren aunque se superpongan entre sí
+QA_ANCHOR = re.compile(
+    r'(?=(?P<definition>se entiende por|significa|definición de|concepto de)'
+    r'|(?P<article>art[íi]culo\s+\d+[°º]?\.?)'
+    r'|(?P<procedure>procedimiento|proceso de)'
+    r'|(?P<label>:))',
+    re.IGNORECASE
+)
+QA_WHITESPACE = re.compile(r'\s*')
+QA_LABEL_START = re.compile(r'[A-Z]', re.IGNORECASE)
+# Con menos texto, lanzar procesos cuesta más que extraer en serie
+PARALLEL_MIN_CHARS = 1_000_000
+
+# Tipo de par y número máximo de oraciones extra de la respuesta, por patrón, en
+# el orden en que se generan los pares de cada documento
+QA_PATTERNS = (
+    ('definition', 'definition', 3),   # "se entiende por X. Y."
+    ('label', 'definition', 2),        # "X: Y."
+    ('article', 'definition', 3),      # "Artículo N. X. Y."
+    ('procedimiento', 'procedure', 3),  # "procedimiento X. Y."
+    ('proceso de', 'procedure', 3)     # "proceso de X. Y."
+)
+
+# Preguntas generales sobre compras públicas, respondidas con las oraciones de
+# los documentos que más mencionan sus palabras clave
+GENERAL_QUESTIONS = [
+    {
+        'question': "¿Qué es una licitación pública?",
+        'keywords': ['licitación pública', 'licitación', 'proceso licitatorio']
+    },
+    {
+        'question': "¿Cuáles son los tipos de procedimientos de compra?",
+        'keywords': ['tipos de procedimientos', 'procedimientos de compra', 'modalidades']
+    },
+    {
+        'question': "¿Qué documentos se requieren para licitar?",
+        'keywords': ['documentos', 'requisitos', 'licitación']
+    },
+    {
+        'question': "¿Cuáles son los montos para licitación pública?",
+        'keywords': ['montos', 'umbrales', 'licitación pública']
+    },
+    {
+        'question': "¿Qué es el trato directo?",
+        'keywords': ['trato directo', 'contratación directa']
+    },
+    {
+        'question': "¿Cuáles son las etapas de una licitación?",
+        'keywords': ['etapas', 'fases', 'proceso licitatorio']
+    },
+    {
+        'question': "¿Qué es ChileCompra?",
+        'keywords': ['ChileCompra', 'plataforma', 'sistema']
+    },
+    {
+        'question': "¿Qué cambios introduce el nuevo reglamento 2024?",
+        'keywords': ['nuevo reglamento', '2024', 'cambios', 'modificaciones']
+    }
+]
+
+# Versión de cada etapa cacheada: cambiarla descarta sus resultados anteriores
+STAGE_VERSIONS = {'extract': 1, 'general': 1, 'variations': 1, 'minhash': 1}
+# Semilla por defecto: mismos documentos, mismo dataset byte a byte
+DEFAULT_SEED = 42
+INSTRUCTION = "Eres un experto en compras públicas de Chile. Responde basándote únicamente en la legislación chilena."
+
+MatchSpan = Tuple[int, int, int, int, int]  # inicio/fin del concepto, de la respuesta y del match
+
+def _next_period(periods: List[int], position: int) -> int:
+    """Posición del primer punto en position o después (-1 si no hay), por búsqueda binaria"""
+    i = bisect.bisect_left(periods, position)
+    return periods[i] if i < len(periods) else -1
+
+def _answer_span(content: str, periods: List[int], start: int, extra_sentences: int) -> Optional[Tuple[int, int]]:
+    """Posición de la respuesta ``\\s*([^.]+(?:\\.[^.]*){0,N}\\.)`` que empieza en start.
+    
+    Llega hasta el primer punto y suma hasta extra_sentences oraciones, como
+    el regex codicioso, pero con las posiciones de los puntos (calculadas una
+    vez por documento) en vez de backtracking; si después de los blancos
+    viene un punto, la respuesta empieza con el último blanco.
+    """
+    text_start = QA_WHITESPACE.match(content, start).end()
+    if text_start < len(content) and content[text_start] != '.':
+        answer_start = text_start
+    elif text_start > start:
+        answer_start = text_start - 1
+    else:
+        return None
+    i = bisect.bisect_left(periods, answer_start + 1)
+    if i == len(periods):
+        return None
+    period = periods[min(i + extra_sentences, len(periods) - 1)]
+    return answer_start, period + 1
+
+def _fallback_span(content: str, periods: List[int], concept_start: int, period: int,
+                   extra_sentences: int) -> MatchSpan:
+    """Match cuando no hay respuesta después del punto del concepto.
+    
+    El regex retrocedía y le cedía el último carácter del concepto a la
+    respuesta; se reproduce para que los matches, y dónde empieza el
+    siguiente, no cambien.
+    """
+    answer_end = _answer_span(content, periods, period - 1, extra_sentences)[1]
+    return concept_start, period - 1, period - 1, answer_end, answer_end
+
+def _definition_match(content: str, periods: List[int], anchor, cursor: int, extra: int) -> Optional[MatchSpan]:
+    # (?:se entiende por|...)\s+([^.]+)\s*[:.]?\s*(answer)
+    keyword_end = anchor.end('definition')
+    text_start = QA_WHITESPACE.match(content, keyword_end).end()
+    if text_start == keyword_end:
+        return None
+    concept_start = text_start
+    if text_start == len(content) or content[text_start] == '.':
+        concept_start -= 1  # \s+ cede un blanco al concepto
+        if concept_start == keyword_end:
+            return None
+    period = _next_period(periods, concept_start)
+    if period == -1:
+        return None
+    answer = _answer_span(content, periods, period + 1, extra)
+    if answer:
+        return concept_start, period, answer[0], answer[1], answer[1]
+    fallback_start = min(concept_start, period - 2)
+    if fallback_start <= keyword_end:
+        return None
+    return _fallback_span(content, periods, fallback_start, period, extra)
+
+def _label_match(content: str, periods: List[int], anchor, cursor: int, extra: int) -> Optional[MatchSpan]:
+    # ([A-Z][^:]+):\s*(answer), desde la primera letra que sigue al match anterior
+    colon = anchor.start('label')
+    letter = QA_LABEL_START.search(content, cursor, max(colon - 1, cursor))
+    if not letter:
+        return None
+    answer = _answer_span(content, periods, colon + 1, extra)
+    if not answer:
+        return None
+    return letter.start(), colon, answer[0], answer[1], answer[1]
+
+def _article_match(content: str, periods: List[int], anchor, cursor: int, extra: int) -> Optional[MatchSpan]:
+    # Art[íi]culo\s+\d+[°º]?\.?\s*([^.]+)\s*\.\s*(answer)
+    heading_end = anchor.end('article')
+    concept_start = QA_WHITESPACE.match(content, heading_end).end()
+    answer = None
+    if concept_start < len(content) and content[concept_start] != '.':
+        period = _next_period(periods, concept_start)
+    elif concept_start > heading_end:
+        concept_start -= 1  # \s* cede un blanco al concepto
+        period = _next_period(periods, concept_start)
+    else:
+        period = -1
+    if period != -1:
+        answer = _answer_span(content, periods, period + 1, extra)
+    if answer:
+        return concept_start, period, answer[0], answer[1], answer[1]
+    
+    # Sin respuesta: el regex cedía el "º" o un dígito del encabezado, y el
+    # concepto de un carácter terminaba en el punto del propio encabezado
+    if content[heading_end - 1] == '.' and (content[heading_end - 2] in '°º' or
+                                            content[heading_end - 3:heading_end - 1].isdigit()):
+        answer = _answer_span(content, periods, heading_end, extra)
+        if answer:
+            return heading_end - 2, heading_end - 1, answer[0], answer[1], answer[1]
+    return None
+
+def _procedure_match(content: str, periods: List[int], anchor, cursor: int, extra: int) -> Optional[MatchSpan]:
+    # (procedimiento[^.]*)\s*[:.]?\s*(answer)
+    start = anchor.start('procedure')
+    period = _next_period(periods, start)
+    if period == -1:
+        return None
+    answer = _answer_span(content, periods, period + 1, extra)
+    if answer:
+        return start, period, answer[0], answer[1], answer[1]
+    if period - 1 < anchor.end('procedure'):
+        return None
+    return _fallback_span(content, periods, start, period, extra)
+
+QA_MATCHERS = {
+    'definition': _definition_match,
+    'label': _label_match,
+    'article': _article_match,
+    'procedimiento': _procedure_match,
+    'proceso de': _procedure_match
+}
+
+def extract_document_qa_pairs(doc: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Extraer los pares pregunta-respuesta de un documento en una sola pasada.
+    
+    Produce los mismos pares que aplicar cada patrón con re.finditer, pero
+    recorre el texto una vez buscando los disparadores y resuelve cada match
+    con búsquedas binarias sobre las posiciones de los puntos, calculadas una
+    sola vez, así que el tiempo no crece de forma cuadrática aunque el texto
+    tenga pocos puntos. Es una función de módulo para poder ejecutarse en
+    otro proceso.
+    """
+    content = doc['content']
+    filename = doc['filename']
+    matches = {name: [] for name, _, _ in QA_PATTERNS}
+    cursors = dict.fromkeys(matches, 0)
+    extra = {name: extra_sentences for name, _, extra_sentences in QA_PATTERNS}
+    periods = [match.start() for match in re.finditer(r'\.', content)]
+    
+    for anchor in QA_ANCHOR.finditer(content):
+        if not periods or anchor.start() > periods[-1]:
+            break  # Todo match termina en un punto: no quedan más
+        name = anchor.lastgroup
+        if name == 'procedure':
+            name = anchor.group('procedure').lower()
+        if anchor.start() < cursors[name]:
+            continue  # Dentro del match anterior del mismo patrón
+        span = QA_MATCHERS[name](content, periods, anchor, cursors[name], extra[name])
+        if span:
+            matches[name].append(span)
+            cursors[name] = span[4]
+        elif name == 'label':
+            cursors[name] = anchor.start() + 1  # Ningún inicio antes de este ":" coincide
+    
+    qa_pairs = []
+    for name, pair_type, _ in QA_PATTERNS:
+        for concept_start, concept_end, answer_start, answer_end, _ in matches[name]:
+            concept = content[concept_start:concept_end].strip()
+            answer = content[answer_start:answer_end].strip()
+            if len(concept) <= 10 or len(answer) <= 20:
+                continue
+            if pair_type == 'definition':
+                qa_pairs.append({
+                    'question': f"¿Qué es {concept.lower()}?",
+                    'answer': answer,
+                    'source': filename,
+                    'type': 'definition'
+                })
+                qa_pairs.append({
+                    'question': f"Define {concept.lower()}",
+                    'answer': answer,
+                    'source': filename,
+                    'type': 'definition'
+                })
+            else:
+                qa_pairs.append({
+                    'question': f"¿Cómo funciona el {concept.lower()}?",
+                    'answer': answer,
+                    'source': filename,
+                    'type': 'procedure'
+                })
+    return qa_pairs
+
+def document_general_answers(doc: Dict[str, Any]) -> List[List[Any]]:
+    """Puntaje y respuesta candidata del documento para cada pregunta general
+    
+    La respuesta final de cada pregunta sale de comparar los candidatos de todos
+    los documentos (KeywordIndex.pick_best), así que esto se calcula y guarda en
+    caché por documento.
+    """
+    index = KeywordIndex([doc])
+    index.add_keywords(kw for general_q in GENERAL_QUESTIONS for kw in general_q['keywords'])
+    return [list(index.candidates(general_q['keywords']).get(0, (0, None))) for general_q in GENERAL_QUESTIONS]
+
 
 class TrainingDataPreparer:
-    def __init__(self):
+    def __init__(self, dedup_threshold: Optional[float] = 0.8, seed: Optional[int] = DEFAULT_SEED,
+                 cache_dir: Optional[str] = None, quality_threshold: Optional[float] = 0.5):
         self.documents = []
         self.training_data = []
+        self.qa_groups = None
+        self._keyword_index = None
+        # Similitud (Jaccard de k-gramas de pregunta+respuesta) desde la que dos
+        # ejemplos se consideran duplicados; None desactiva la deduplicación
+        self.dedup_threshold = dedup_threshold
+        # Puntaje mínimo (0-1) de un par en el filtro de calidad; None lo desactiva
+        self.quality_threshold = quality_threshold
+        # Semilla de la mezcla (None = aleatoria en cada ejecución)
+        self.seed = seed
+        # Resultados de cada etapa por documento, direccionados por contenido
+        self.cache = StageCache(cache_dir) if cache_dir else None
         
     def load_documents(self, directory: str = ".") -> None:
-        """Cargar documentos TXT"""
-        txt_files = list(Path(directory).glob("*.txt"))
+        """Cargar documentos TXT, en orden de nombre y con el hash de su contenido"""
+        txt_files = sorted(Path(directory).glob("*.txt"))
         print(f"Cargando {len(txt_files)} archivos TXT...")
         
         for txt_file in txt_files:
@@ -25,167 +311,156 @@ class TrainingDataPreparer:
                     content = f.read()
                     self.documents.append({
                         'filename': txt_file.name,
-                        'content': content
+                        'content': content,
+                        'sha256': content_hash(content)
                     })
                 print(f"✓ Cargado: {txt_file.name}")
             except Exception as e:
                 print(f"✗ Error cargando {txt_file.name}: {e}")
     
-    def extract_qa_pairs(self) -> None:
-        """Extraer pares pregunta-respuesta de los documentos"""
-        
-        # Patrones para extraer información relevante
-        patterns = {
-            'definitions': [
-                r'(?:se entiende por|significa|definición de|concepto de)\s+([^.]+)\s*[:.]?\s*([^.]+(?:\.[^.]*){0,3}\.)',
-                r'([A-Z][^:]+):\s*([^.]+(?:\.[^.]*){0,2}\.)',
-                r'Art[íi]culo\s+\d+[°º]?\.?\s*([^.]+)\s*\.\s*([^.]+(?:\.[^.]*){0,3}\.)'
-            ],
-            'procedures': [
-                r'(procedimiento[^.]*)\s*[:.]?\s*([^.]+(?:\.[^.]*){0,3}\.)',
-                r'(proceso de[^.]*)\s*[:.]?\s*([^.]+(?:\.[^.]*){0,3}\.)'
-            ],
-            'requirements': [
-                r'(requisitos?[^.]*)\s*[:.]?\s*([^.]+(?:\.[^.]*){0,3}\.)',
-                r'(documentos? (?:necesarios?|requeridos?)[^.]*)\s*[:.]?\s*([^.]+(?:\.[^.]*){0,3}\.)'
-            ]
-        }
-        
-        # Generar QA pairs
-        qa_pairs = []
+    def extract_qa_pairs(self, workers: Optional[int] = None) -> None:
+        """Extraer pares pregunta-respuesta de los documentos
         
+        Cada documento se procesa en una sola pasada (extract_document_qa_pairs);
+        con corpus grandes los documentos se reparten entre procesos (workers,
+        None = todos los núcleos) y los pares se devuelven en el orden de los
+        documentos. Con caché solo se procesan los documentos cuyo contenido no
+        se había visto.
+        """
+        per_document = []
+        missing = []
         for doc in self.documents:
-            content = doc['content']
-            filename = doc['filename']
-            
-            # Extraer definiciones
-            for pattern in patterns['definitions']:
-                matches = re.finditer(pattern, content, re.IGNORECASE | re.MULTILINE)
-                for match in matches:
-                    concept = match.group(1).strip()
-                    definition = match.group(2).strip()
-                    
-                    if len(concept) > 10 and len(definition) > 20:
-                        qa_pairs.append({
-                            'question': f"¿Qué es {concept.lower()}?",
-                            'answer': definition,
-                            'source': filename,
-                            'type': 'definition'
-                        })
-                        
-                        qa_pairs.append({
-                            'question': f"Define {concept.lower()}",
-                            'answer': definition,
-                            'source': filename,
-                            'type': 'definition'
-                        })
-            
-            # Extraer procedimientos
-            for pattern in patterns['procedures']:
-                matches = re.finditer(pattern, content, re.IGNORECASE | re.MULTILINE)
-                for match in matches:
-                    procedure = match.group(1).strip()
-                    description = match.group(2).strip()
-                    
-                    if len(procedure) > 10 and len(description) > 20:
-                        qa_pairs.append({
-                            'question': f"¿Cómo funciona el {procedure.lower()}?",
-                            'answer': description,
-                            'source': filename,
-                            'type': 'procedure'
-                        })
+            found, pairs = self._cache_get('extract', doc['filename'], self._document_hash(doc))
+            per_document.append(pairs)
+            if not found:
+                missing.append(doc)
         
-        # Generar preguntas generales sobre compras públicas
-        general_questions = [
-            {
-                'question': "¿Qué es una licitación pública?",
-                'keywords': ['licitación pública', 'licitación', 'proceso licitatorio']
-            },
-            {
-                'question': "¿Cuáles son los tipos de procedimientos de compra?",
-                'keywords': ['tipos de procedimientos', 'procedimientos de compra', 'modalidades']
-            },
-            {
-                'question': "¿Qué documentos se requieren para licitar?",
-                'keywords': ['documentos', 'requisitos', 'licitación']
-            },
-            {
-                'question': "¿Cuáles son los montos para licitación pública?",
-                'keywords': ['montos', 'umbrales', 'licitación pública']
-            },
-            {
-                'question': "¿Qué es el trato directo?",
-                'keywords': ['trato directo', 'contratación directa']
-            },
-            {
-                'question': "¿Cuáles son las etapas de una licitación?",
-                'keywords': ['etapas', 'fases', 'proceso licitatorio']
-            },
-            {
-                'question': "¿Qué es ChileCompra?",
-                'keywords': ['ChileCompra', 'plataforma', 'sistema']
-            },
-            {
-                'question': "¿Qué cambios introduce el nuevo reglamento 2024?",
-                'keywords': ['nuevo reglamento', '2024', 'cambios', 'modificaciones']
-            }
-        ]
+        total_chars = sum(len(doc['content']) for doc in missing)
+        if workers == 1 or len(missing) < 2 or total_chars < PARALLEL_MIN_CHARS:
+            extracted = [extract_document_qa_pairs(doc) for doc in missing]
+        else:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+                extracted = list(executor.map(extract_document_qa_pairs, missing))
+        extracted = iter(extracted)
+        for i, doc in enumerate(self.documents):
+            if per_document[i] is None:
+                per_document[i] = next(extracted)
+                self._cache_put('extract', per_document[i], doc['filename'], self._document_hash(doc))
         
-        # Buscar respuestas para preguntas generales
-        for general_q in general_questions:
-            best_answer = self.find_best_answer(general_q['keywords'])
+        # Buscar respuestas para preguntas generales: cada documento aporta su
+        # candidato (en caché) y gana el que más menciona las palabras clave
+        questions_hash = content_hash(GENERAL_QUESTIONS)
+        candidates = [self._cached('general', lambda: document_general_answers(doc),
+                                   doc['filename'], self._document_hash(doc), questions_hash)
+                      for doc in self.documents]
+        general_pairs = []
+        for i, general_q in enumerate(GENERAL_QUESTIONS):
+            best_answer = KeywordIndex.pick_best((doc['filename'], *answers[i])
+                                                 for doc, answers in zip(self.documents, candidates))
             if best_answer:
-                qa_pairs.append({
+                general_pairs.append({
                     'question': general_q['question'],
                     'answer': best_answer['answer'],
                     'source': best_answer['source'],
                     'type': 'general'
                 })
         
-        print(f"✓ Generados {len(qa_pairs)} pares pregunta-respuesta")
-        self.qa_pairs = qa_pairs
+        self.qa_groups = per_document + [general_pairs]
+        self.qa_pairs = [qa for pairs in self.qa_groups for qa in pairs]
+        print(f"✓ Generados {len(self.qa_pairs)} pares pregunta-respuesta")
         
-    def find_best_answer(self, keywords: List[str]) -> Dict[str, Any]:
-        """Encontrar la mejor respuesta para palabras clave"""
-        best_match = None
-        best_score = 0
+    def filter_qa_pairs(self, report_file: Optional[str] = None) -> None:
+        """Descartar pares de baja calidad (texto cortado, encabezados de página, etc.)
         
-        for doc in self.documents:
-            content = doc['content'].lower()
-            score = 0
-            
-            for keyword in keywords:
-                if keyword.lower() in content:
-                    score += content.count(keyword.lower())
-            
-            if score > best_score:
-                best_score = score
-                # Extraer párrafo relevante
-                sentences = content.split('.')
-                relevant_sentences = []
-                
-                for sentence in sentences:
-                    if any(keyword.lower() in sentence for keyword in keywords):
-                        relevant_sentences.append(sentence.strip())
-                        if len(relevant_sentences) >= 3:
-                            break
-                
-                if relevant_sentences:
-                    best_match = {
-                        'answer': '. '.join(relevant_sentences) + '.',
-                        'source': doc['filename']
-                    }
+        Los rasgos de todos los pares se calculan en lote (QualityFilter); se
+        eliminan los de puntaje menor a quality_threshold y, si se indica
+        report_file, se guarda en JSON cada par eliminado con su puntaje y motivo.
+        """
+        if not self.quality_threshold:
+            return
+        quality_filter = QualityFilter(self.quality_threshold, repeated_lines(self.documents))
+        groups = self.qa_groups if self.qa_groups is not None else [self.qa_pairs]
+        result = quality_filter.evaluate([qa for pairs in groups for qa in pairs])
+        
+        keep = set(result['keep'])
+        filtered = []
+        index = 0
+        for pairs in groups:
+            filtered.append([qa for i, qa in enumerate(pairs, index) if i in keep])
+            index += len(pairs)
+        removed = [dict(self.qa_pairs[item['index']], score=item['score'], reason=item['reason'])
+                   for item in result['removed']]
+        
+        print(f"✓ Filtro de calidad: {len(removed)} de {len(self.qa_pairs)} pares eliminados "
+              f"(umbral {self.quality_threshold:g})")
+        for reason, count in Counter(item['reason'] for item in removed).most_common():
+            print(f"  - {reason}: {count}")
         
-        return best_match
+        if report_file:
+            Path(report_file).parent.mkdir(parents=True, exist_ok=True)
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'threshold': self.quality_threshold,
+                    'total': len(self.qa_pairs),
+                    'kept': len(keep),
+                    'removed': removed
+                }, f, ensure_ascii=False, indent=2)
+            print(f"  - Detalle en: {report_file}")
+        
+        self.qa_groups = filtered
+        self.qa_pairs = [qa for pairs in filtered for qa in pairs]
+        
+    def keyword_index(self) -> KeywordIndex:
+        """Índice de palabras clave de los documentos cargados (se reconstruye si cambian)"""
+        if self._keyword_index is None or len(self._keyword_index) != len(self.documents):
+            self._keyword_index = KeywordIndex(self.documents)
+        return self._keyword_index
+    
+    def find_best_answer(self, keywords: List[str]) -> Dict[str, Any]:
+        """Encontrar la mejor respuesta para palabras clave
+        
+        Las primeras 3 oraciones con alguna palabra clave del documento donde
+        más aparecen, consultando el índice en vez de recorrer los documentos.
+        """
+        return self.keyword_index().best_answer(keywords)
     
     def create_training_dataset(self) -> None:
-        """Crear dataset en formato para fine-tuning"""
+        """Crear dataset en formato para fine-tuning
+        
+        Las variaciones y las firmas MinHash se calculan (o se toman de la caché)
+        por grupo de pares de cada documento; la deduplicación y la mezcla, que
+        cruzan documentos, se rehacen siempre sobre esos resultados.
+        """
+        groups = self.qa_groups if self.qa_groups is not None else [self.qa_pairs]
+        per_group = [self._cached('variations', lambda: self.expand_examples(pairs), content_hash(pairs))
+                     for pairs in groups]
+        training_examples = [example for examples in per_group for example in examples]
+        
+        # Quitar casi duplicados antes de mezclar: se conserva el primero de cada grupo
+        if self.dedup_threshold:
+            dedup = NearDuplicateFilter(threshold=self.dedup_threshold)
+            signatures = []
+            for examples in per_group:
+                signatures.extend(self._cached(
+                    'minhash', lambda: [signature.tolist() for signature in dedup.signatures(self._dedup_texts(examples))],
+                    content_hash(examples), dedup.num_perm, dedup.shingle_size, dedup.seed))
+            signatures = [np.array(signature, dtype=np.uint64) for signature in signatures]
+            training_examples = self.remove_near_duplicates(training_examples, signatures)
+        
+        # Mezclar dataset (con semilla fija, siempre en el mismo orden)
+        random.Random(self.seed).shuffle(training_examples)
+        
+        print(f"✓ Dataset final: {len(training_examples)} ejemplos de entrenamiento")
+        self.training_data = training_examples
+        
+    def expand_examples(self, qa_pairs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Ejemplos conversacionales de los pares, con hasta 2 variaciones de cada pregunta"""
         training_examples = []
         
-        for qa in self.qa_pairs:
+        for qa in qa_pairs:
             # Formato conversacional
             conversation = {
-                "instruction": "Eres un experto en compras públicas de Chile. Responde basándote únicamente en la legislación chilena.",
+                "instruction": INSTRUCTION,
                 "input": qa['question'],
                 "output": qa['answer']
             }
@@ -195,16 +470,23 @@ class TrainingDataPreparer:
             variations = self.generate_question_variations(qa['question'])
             for variation in variations[:2]:  # Máximo 2 variaciones por pregunta
                 training_examples.append({
-                    "instruction": "Eres un experto en compras públicas de Chile. Responde basándote únicamente en la legislación chilena.",
+                    "instruction": INSTRUCTION,
                     "input": variation,
                     "output": qa['answer']
                 })
+        return training_examples
         
-        # Mezclar dataset
-        random.shuffle(training_examples)
-        
-        print(f"✓ Dataset final: {len(training_examples)} ejemplos de entrenamiento")
-        self.training_data = training_examples
+    def remove_near_duplicates(self, examples: List[Dict[str, str]],
+                               signatures: Optional[List[np.ndarray]] = None) -> List[Dict[str, str]]:
+        """Eliminar ejemplos casi duplicados (MinHash + LSH sobre pregunta y respuesta)"""
+        dedup = NearDuplicateFilter(threshold=self.dedup_threshold)
+        keep = dedup.keep(self._dedup_texts(examples), signatures)
+        print(f"✓ Eliminados {len(examples) - len(keep)} ejemplos casi duplicados (umbral {self.dedup_threshold:g})")
+        return [examples[i] for i in keep]
+    
+    @staticmethod
+    def _dedup_texts(examples: List[Dict[str, str]]) -> List[str]:
+        return [f"{example['input']}\n{example['output']}" for example in examples]
         
     def generate_question_variations(self, question: str) -> List[str]:
         """Generar variaciones de preguntas"""
@@ -235,21 +517,52 @@ class TrainingDataPreparer:
         
         return variations
     
-    def save_dataset(self, filename: str = "compras_publicas_dataset.json") -> None:
-        """Guardar dataset en formato JSON"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.training_data, f, ensure_ascii=False, indent=2)
+    def save_dataset(self, directory: str = "compras_publicas_dataset") -> None:
+        """Guardar dataset en fragmentos JSONL comprimidos con su índice
         
-        print(f"✓ Dataset guardado en: {filename}")
-        print(f"  - {len(self.training_data)} ejemplos de entrenamiento")
-        
-        # Crear también formato JSONL para algunos frameworks
-        jsonl_filename = filename.replace('.json', '.jsonl')
-        with open(jsonl_filename, 'w', encoding='utf-8') as f:
+        Los ejemplos se escriben uno a uno (ShardedDatasetWriter) y fine_tuner y
+        model_creator los leen sin cargarlos enteros (open_dataset). La
+        preparación sí tiene todos los ejemplos en memoria: la deduplicación y
+        la mezcla necesitan la lista completa.
+        """
+        with ShardedDatasetWriter(directory) as writer:
             for example in self.training_data:
-                f.write(json.dumps(example, ensure_ascii=False) + '\n')
+                writer.write(example)
         
-        print(f"✓ Dataset JSONL guardado en: {jsonl_filename}")
+        print(f"✓ Dataset guardado en: {directory}/")
+        print(f"  - {writer.count} ejemplos de entrenamiento en {len(writer.shards)} fragmentos")
+    
+    def prune_cache(self) -> None:
+        """Mostrar el uso de la caché y borrar las entradas que ya no corresponden a ningún documento"""
+        if self.cache is None:
+            return
+        for stage, counts in self.cache.stats().items():
+            print(f"  - {stage}: {counts['hits']} reutilizados, {counts['misses']} calculados")
+        removed = self.cache.prune()
+        if removed:
+            print(f"  - {removed} entradas obsoletas eliminadas de la caché")
+    
+    def _document_hash(self, doc: Dict[str, Any]) -> str:
+        if 'sha256' not in doc:
+            doc['sha256'] = content_hash(doc['content'])
+        return doc['sha256']
+    
+    def _cache_get(self, stage: str, *parts: Any) -> Tuple[bool, Any]:
+        if self.cache is None:
+            return False, None
+        return self.cache.get(stage, StageCache.key(stage, STAGE_VERSIONS[stage], *parts))
+    
+    def _cache_put(self, stage: str, value: Any, *parts: Any) -> None:
+        if self.cache is not None:
+            self.cache.put(stage, StageCache.key(stage, STAGE_VERSIONS[stage], *parts), value)
+    
+    def _cached(self, stage: str, compute, *parts: Any) -> Any:
+        """Resultado de compute() para la etapa y sus entradas, reutilizado si ya estaba en caché"""
+        found, value = self._cache_get(stage, *parts)
+        if not found:
+            value = compute()
+            self._cache_put(stage, value, *parts)
+        return value
     
     def show_sample(self, n: int = 5) -> None:
         """Mostrar ejemplos del dataset"""
@@ -264,22 +577,41 @@ class TrainingDataPreparer:
 
 def main():
     """Ejecutar preparación de datos"""
+    parser = argparse.ArgumentParser(description="Preparar datos de entrenamiento de compras públicas")
+    parser.add_argument('directory', nargs='?', default=".", help="Directorio con los documentos TXT")
+    parser.add_argument('--output', default="compras_publicas_dataset", help="Directorio del dataset")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Caché de etapas (por defecto .training_cache junto al dataset)")
+    parser.add_argument('--no-cache', action='store_true', help="Recalcular todas las etapas")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="Semilla de la mezcla")
+    parser.add_argument('--dedup-threshold', type=float, default=0.8,
+                        help="Similitud desde la que se eliminan casi duplicados (0 = no deduplicar)")
+    parser.add_argument('--quality-threshold', type=float, default=0.5,
+                        help="Puntaje de calidad mínimo de un par (0 = no filtrar)")
+    args = parser.parse_args()
+    
     print("🔧 Preparando datos de entrenamiento para compras públicas...")
     print("=" * 60)
     
-    preparer = TrainingDataPreparer()
+    cache_dir = None if args.no_cache else args.cache_dir or str(Path(args.output).parent / ".training_cache")
+    preparer = TrainingDataPreparer(dedup_threshold=args.dedup_threshold or None, seed=args.seed,
+                                    cache_dir=cache_dir, quality_threshold=args.quality_threshold or None)
     
     # Cargar documentos
-    preparer.load_documents()
+    preparer.load_documents(args.directory)
     
     # Extraer pares Q&A
     preparer.extract_qa_pairs()
     
+    # Descartar pares de baja calidad
+    preparer.filter_qa_pairs(str(Path(args.output) / "quality_report.json"))
+    
     # Crear dataset
     preparer.create_training_dataset()
     
     # Guardar dataset
-    preparer.save_dataset()
+    preparer.save_dataset(args.output)
+    preparer.prune_cache()
     
     # Mostrar muestra
     preparer.show_sample()
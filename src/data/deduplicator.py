@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Eliminación de casi duplicados con MinHash y LSH por bandas
+"""
+
+import re
+import zlib
+from collections import defaultdict
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+
+# Primo de Mersenne 2^31 - 1: a * x + b cabe en 64 bits sin desbordar
+MERSENNE_PRIME = (1 << 31) - 1
+WHITESPACE = re.compile(r'\s+')
+
+
+def shingles(text: str, size: int) -> Set[int]:
+    """Hashes (estables entre ejecuciones) de los k-gramas de bytes del texto normalizado"""
+    data = WHITESPACE.sub(' ', text.lower()).strip().encode('utf-8')
+    if len(data) <= size:
+        return {zlib.crc32(data)}
+    return {zlib.crc32(data[i:i + size]) for i in range(len(data) - size + 1)}
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """Bands and rows per band with the highest S-curve midpoint, (1/b)^(1/r), not above threshold.
+
+    Candidates are verified with the exact similarity, so erring towards
+    false positives only costs comparisons while false negatives are missed
+    duplicates.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    return max(below, key=lambda option: (1 / option[0]) ** (1 / option[1])) if below else options[-1]
+
+
+class NearDuplicateFilter:
+    """Group texts whose shingle Jaccard similarity reaches a threshold.
+
+    Every text gets a MinHash signature of ``num_perm`` values (one
+    vectorized pass per text over its shingle hashes). Signatures are cut
+    into bands; texts sharing any band bucket are candidates, and only
+    candidates are compared, with the exact Jaccard similarity of their
+    shingle sets. Matching pairs are merged with union-find, so the cost is
+    linear in the number of texts plus the number of candidate pairs
+    instead of quadratic. Hash functions come from a fixed seed: the same
+    input always gives the same clusters.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"threshold debe estar en (0, 1]: {threshold}")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: Set[int]) -> np.ndarray:
+        """MinHash signature: minimum of each hash function over the shingles"""
+        values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set)) % MERSENNE_PRIME
+        hashed = (np.outer(values, self.a) + self.b) % MERSENNE_PRIME
+        return hashed.min(axis=0)
+
+    def signatures(self, texts: List[str]) -> List[np.ndarray]:
+        return [self.signature(shingles(text, self.shingle_size)) for text in texts]
+
+    def clusters(self, texts: List[str], signatures: Optional[List[np.ndarray]] = None) -> List[List[int]]:
+        """Indices of the texts grouped by near-duplicate cluster, in order of first member.
+
+        ``signatures`` may come from an earlier ``signatures`` call (e.g. a
+        cache); shingle sets are then rebuilt only for the candidates.
+        """
+        shingle_sets = {}
+        if signatures is None:
+            shingle_sets = {i: shingles(text, self.shingle_size) for i, text in enumerate(texts)}
+            signatures = [self.signature(shingle_sets[i]) for i in range(len(texts))]
+
+        def shingle_set(i: int) -> Set[int]:
+            if i not in shingle_sets:
+                shingle_sets[i] = shingles(texts[i], self.shingle_size)
+            return shingle_sets[i]
+
+        parent = list(range(len(texts)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        buckets = [defaultdict(list) for _ in range(self.bands)]
+        for i, signature in enumerate(signatures):
+            compared = set()
+            for band in range(self.bands):
+                key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                bucket = buckets[band][key]
+                for j in bucket:
+                    if j in compared:
+                        continue
+                    compared.add(j)
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j and self.jaccard(shingle_set(i), shingle_set(j)) >= self.threshold:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+                bucket.append(i)
+
+        groups = defaultdict(list)
+        for i in range(len(texts)):
+            groups[find(i)].append(i)
+        return sorted(groups.values())
+
+    def keep(self, texts: List[str], signatures: Optional[List[np.ndarray]] = None) -> List[int]:
+        """Indices to keep, in input order: the first text of every cluster"""
+        return sorted(cluster[0] for cluster in self.clusters(texts, signatures))
+
+    @staticmethod
+    def jaccard(first: Set[int], second: Set[int]) -> float:
+        return len(first & second) / len(first | second)
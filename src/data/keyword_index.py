@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Índice de palabras clave sobre las oraciones de los documentos (Aho-Corasick)
+"""
+
+import heapq
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def build_automaton(keywords: Iterable[str]) -> Tuple[List[Dict[str, int]], List[int], List[List[str]]]:
+    """Aho-Corasick automaton: goto transitions, failure links and the keywords ending at each state"""
+    goto = [{}]
+    fail = [0]
+    output = [[]]
+    for keyword in keywords:
+        state = 0
+        for char in keyword:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                next_state = len(goto)
+                goto[state][char] = next_state
+                goto.append({})
+                fail.append(0)
+                output.append([])
+            state = next_state
+        output[state].append(keyword)
+
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            link = fail[state]
+            while link and char not in goto[link]:
+                link = fail[link]
+            fail[next_state] = goto[link].get(char, 0)
+            output[next_state] = output[next_state] + output[fail[next_state]]
+    return goto, fail, output
+
+
+class KeywordIndex:
+    """Lowercase sentence table of a set of documents and keyword postings.
+
+    Documents are lowercased and split on '.' once; every sentence gets a
+    global ID and each document owns a contiguous range of IDs. Keywords are
+    added in batches: one Aho-Corasick automaton per batch is run over every
+    sentence, recording for each keyword its number of (non-overlapping)
+    occurrences per document and the IDs of the sentences containing it.
+    Scoring a question is then a few dictionary lookups instead of a scan of
+    every document per keyword.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.filenames = []
+        self.sentences = []
+        self.ranges = []
+        for doc in documents:
+            start = len(self.sentences)
+            self.sentences.extend(doc['content'].lower().split('.'))
+            self.filenames.append(doc['filename'])
+            self.ranges.append(range(start, len(self.sentences)))
+        self.counts = {}
+        self.postings = {}
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def add_keywords(self, keywords: Iterable[str]) -> None:
+        """Index the keywords not indexed yet, with a single pass over the sentences"""
+        new = sorted({keyword.lower() for keyword in keywords} - self.counts.keys())
+        for keyword in new:
+            self.counts[keyword] = {}
+            self.postings[keyword] = {}
+
+        # Una palabra clave con punto nunca cabe en una oración: solo cuenta en el documento
+        dotted = [keyword for keyword in new if '.' in keyword or not keyword]
+        for keyword in dotted:
+            for doc_id, ids in enumerate(self.ranges):
+                text = '.'.join(self.sentences[ids.start:ids.stop])
+                count = text.count(keyword)
+                if count:
+                    self.counts[keyword][doc_id] = count
+                    if not keyword:
+                        self.postings[keyword][doc_id] = list(ids)
+
+        keywords = [keyword for keyword in new if keyword not in dotted]
+        if not keywords:
+            return
+        goto, fail, output = build_automaton(keywords)
+        for doc_id, ids in enumerate(self.ranges):
+            counts = Counter()
+            for sentence_id in ids:
+                found = self._scan(self.sentences[sentence_id], goto, fail, output)
+                for keyword, count in found.items():
+                    counts[keyword] += count
+                    self.postings[keyword].setdefault(doc_id, []).append(sentence_id)
+            for keyword, count in counts.items():
+                self.counts[keyword][doc_id] = count
+
+    @staticmethod
+    def _scan(text: str, goto, fail, output) -> Counter:
+        """Non-overlapping occurrences of each keyword in text, as str.count would find them"""
+        found = Counter()
+        ends = {}
+        state = 0
+        for position, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                if position - len(keyword) >= ends.get(keyword, 0):
+                    ends[keyword] = position
+                    found[keyword] += 1
+        return found
+
+    def scores(self, keywords: List[str]) -> Dict[int, int]:
+        """Total occurrences of the keywords (repeated ones count again) per document"""
+        self.add_keywords(keywords)
+        scores = Counter()
+        for keyword in keywords:
+            for doc_id, count in self.counts[keyword.lower()].items():
+                scores[doc_id] += count
+        return scores
+
+    def sentences_with(self, keywords: List[str], doc_id: int, limit: int) -> List[int]:
+        """IDs of the first ``limit`` sentences of a document containing any of the keywords"""
+        postings = [self.postings[keyword].get(doc_id, []) for keyword in {k.lower() for k in keywords}]
+        ids = []
+        for sentence_id in heapq.merge(*postings):
+            if not ids or ids[-1] != sentence_id:
+                ids.append(sentence_id)
+                if len(ids) >= limit:
+                    break
+        return ids
+
+    def candidates(self, keywords: List[str], max_sentences: int = 3) -> Dict[int, Tuple[int, Optional[str]]]:
+        """Score and answer (first matching sentences, None if none) of every document with a match"""
+        candidates = {}
+        for doc_id, score in sorted(self.scores(keywords).items()):
+            ids = self.sentences_with(keywords, doc_id, max_sentences)
+            answer = '. '.join(self.sentences[i].strip() for i in ids) + '.' if ids else None
+            candidates[doc_id] = (score, answer)
+        return candidates
+
+    @staticmethod
+    def pick_best(candidates: Iterable[Tuple[str, int, Optional[str]]]) -> Optional[Dict[str, Any]]:
+        """Answer of the document where the keywords occur the most, from (source, score, answer).
+
+        Ties go to the earlier document. A document that scores best but has
+        no sentence containing a keyword raises the bar without providing
+        the answer.
+        """
+        best_match = None
+        best_score = 0
+        for source, score, answer in candidates:
+            if score <= best_score:
+                continue
+            best_score = score
+            if answer is not None:
+                best_match = {'answer': answer, 'source': source}
+        return best_match
+
+    def best_answer(self, keywords: List[str], max_sentences: int = 3) -> Optional[Dict[str, Any]]:
+        """First sentences matching the keywords in the document where they occur the most"""
+        candidates = self.candidates(keywords, max_sentences)
+        return self.pick_best((self.filenames[doc_id], score, answer) for doc_id, (score, answer) in candidates.items())
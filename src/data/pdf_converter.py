@@ -3,25 +3,228 @@
 Script para convertir archivos PDF a TXT
 """
 
+import argparse
+import hashlib
+import json
 import os
+import re
+import shutil
 import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import PyPDF2
 import pdfplumber
 
-def convert_pdf_to_txt_pypdf2(pdf_path, txt_path):
-    """Convierte PDF a TXT usando PyPDF2"""
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.data.conversion_manifest import ConversionManifest
+from src.data.sandbox import run_sandboxed
+
+# Páginas por tarea en el modo paralelo: abrir el PDF en cada proceso tiene
+# un costo fijo, así que cada tarea procesa un rango de páginas contiguas
+PAGES_PER_SHARD = 8
+# Límites por tarea aislada (un documento, o un rango de páginas con --workers):
+# un PDF malformado o enorme no puede colgar ni agotar la memoria del proceso
+DOCUMENT_TIMEOUT = 300        # Segundos
+MAX_WORKER_MEMORY_MB = 2048   # RSS del proceso de trabajo
+# Incrementar al cambiar la forma de extraer o de unir las páginas; invalida
+# las conversiones registradas en el manifiesto
+CONVERTER_VERSION = 1
+# Estrategias de extracción: 'adaptive' usa PyPDF2 y repite con pdfplumber
+# solo las páginas que lo necesitan
+EXTRACTION_STRATEGIES = ('adaptive', 'pdfplumber', 'pypdf2')
+DEFAULT_STRATEGY = 'adaptive'
+# Umbrales de la estrategia adaptativa (texto de PyPDF2 de una página)
+MIN_PAGE_CHARS = 20           # Menos caracteres visibles: página vacía o escaneada
+MAX_SHORT_TOKEN_RATIO = 0.35  # Palabras de 1 letra: texto partido ("l i c i t a c i ó n")
+MAX_LONG_TOKEN_RATIO = 0.05   # Palabras de más de 30 letras (no URLs): espacios perdidos
+MAX_FRAGMENT_LINE_RATIO = 0.3  # Líneas de 1-2 caracteres: orden de lectura roto
+MIN_TABLE_LINES = 3           # Líneas con columnas alineadas por espacios
+TABLE_GAP = re.compile(r'\S {3,}\S')
+# Limpieza posterior a la conversión: el texto por página queda en RAW_DIR
+# (es lo que registra el manifiesto) y el TXT final se genera a partir de él
+CLEANER_VERSION = 1
+RAW_DIR = '.raw'
+PAGE_EDGE_LINES = 4           # Líneas al inicio y al final de cada página donde se buscan encabezados y pies
+REPEATED_LINE_RATIO = 0.5     # Líneas de borde presentes en al menos esta fracción de las páginas
+MIN_REPEAT_PAGES = 3
+MAX_NOTE_LINES = 4            # Una nota al margen (Ley / Art. / D.O.) ocupa pocas líneas seguidas
+WRAP_RATIO = 0.75             # Línea de al menos este largo (respecto del ancho típico): se cortó en el margen
+NOTE_TEXT = r'L[Ee][Yy] \d{4,5}|Art\. .{1,25}|D\.O\. \d{2}\.\d{2}\.\d{4}'
+MARGIN_GAP = re.compile(r'^(.*\S)\s{3,}(\S.*)$')
+MARGIN_NOTE = re.compile(rf'^(?:{NOTE_TEXT}|NOTA|\d{{1,2}}\)|[a-z]\))$')
+MARGIN_NOTE_TAIL = re.compile(rf'^(?:(.*?)\s+)?({NOTE_TEXT})$')
+MARGIN_NOTE_CONTINUATION = re.compile(r'^(?:(.*?)\s+)?(\d{1,2}\)|[a-z]\))$')
+STRUCTURE_LINE = re.compile(r'^"?\s*(?:CAP[IÍ]TULO|T[IÍ]TULO|P[AÁ]RRAFO|P[aá]rrafo|ART[IÍ]CULO|Art[ií]culo)s?\b'
+                            r'|^(?:[a-zñ]|[IVXL]+)[.)]\s|^\d{1,3}[.)](?=\s|[^\W\d_])|^[•●▪]|^[–-]\s')
+ARTICLE_HEADING = re.compile(r'^(?:ART[IÍ]CULO|Art[ií]culo)\s+(\S+?(?:\s+(?:bis|ter|qu[áa]ter|quinquies|'
+                             r'sexies|septies|octies|nonies|decies))?)\s*\.-')
+
+def iter_pages_pypdf2(pdf_path, page_numbers=None):
+    """Genera (número de página, texto) con PyPDF2, una página a la vez.
+    
+    Los números de página empiezan en 0; page_numbers limita la extracción
+    a esas páginas (en orden creciente).
+    """
+    with open(pdf_path, 'rb') as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        if page_numbers is None:
+            page_numbers = range(len(pdf_reader.pages))
+        for page_num in page_numbers:
+            yield page_num, pdf_reader.pages[page_num].extract_text() or ""
+
+def iter_pages_pdfplumber(pdf_path, page_numbers=None):
+    """Genera (número de página, texto) con pdfplumber, una página a la vez.
+    
+    Solo se crean los objetos de las páginas pedidas y la caché de cada una
+    (caracteres, layout, mapa de texto) se libera apenas se extrae su
+    texto, así que la memoria no crece con el largo del documento.
+    """
+    pages = None if page_numbers is None else [page_num + 1 for page_num in page_numbers]
+    with pdfplumber.open(pdf_path, pages=pages) as pdf:
+        for page in pdf.pages:
+            try:
+                text = page.extract_text() or ""
+            finally:
+                page.close()
+            yield page.page_number - 1, text
+
+def iter_pages_layout(pdf_path, page_numbers=None, extractors=None):
+    """Genera (número de página, texto) con pdfplumber y PyPDF2 como respaldo.
+    
+    Si pdfplumber no puede abrir el PDF se usa PyPDF2 para todo; si falla en
+    una página, solo esa página se extrae con PyPDF2. Los extractores usados
+    se agregan al conjunto ``extractors`` si se entrega.
+    """
+    if extractors is None:
+        extractors = set()
+    pages = None if page_numbers is None else [page_num + 1 for page_num in page_numbers]
+    try:
+        pdf = pdfplumber.open(pdf_path, pages=pages)
+    except Exception:
+        extractors.add('pypdf2')
+        yield from iter_pages_pypdf2(pdf_path, page_numbers)
+        return
+    
+    fallback = None
+    with pdf:
+        for page in pdf.pages:
+            page_num = page.page_number - 1
+            try:
+                text = page.extract_text() or ""
+                extractors.add('pdfplumber')
+            except Exception:
+                if fallback is None:
+                    fallback = PyPDF2.PdfReader(pdf_path)
+                text = fallback.pages[page_num].extract_text() or ""
+                extractors.add('pypdf2')
+            finally:
+                page.close()
+            yield page_num, text
+
+def layout_reason(text):
+    """Motivo para reextraer con pdfplumber una página leída con PyPDF2 (None si no hace falta)"""
+    visible = len(text) - text.count(' ') - text.count('\n')
+    if visible < MIN_PAGE_CHARS:
+        return 'low_density'
+    if '\ufffd' in text or '(cid:' in text:
+        return 'garbled'
+    tokens = text.split()
+    short = sum(1 for token in tokens if len(token) == 1 and token.isalpha())
+    long_tokens = sum(1 for token in tokens if len(token) > 30 and token.isalpha())
+    if short / len(tokens) > MAX_SHORT_TOKEN_RATIO or long_tokens / len(tokens) > MAX_LONG_TOKEN_RATIO:
+        return 'garbled'
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if sum(1 for line in lines if len(line) <= 2) / len(lines) > MAX_FRAGMENT_LINE_RATIO:
+        return 'fragmented'
+    table_lines = sum(1 for line in lines if len(TABLE_GAP.findall(line)) >= 2)
+    if table_lines >= MIN_TABLE_LINES:
+        return 'table'
+    return None
+
+def iter_pages_adaptive(pdf_path, page_numbers=None, extractors=None, reasons=None):
+    """Genera (número de página, texto) con PyPDF2 y pdfplumber solo donde hace falta.
+    
+    Cada página se extrae primero con PyPDF2 (mucho más rápido); las que
+    layout_reason marca (tablas, poca densidad de texto, texto partido o
+    ilegible) se repiten con pdfplumber, que se abre solo si alguna página
+    lo necesita. ``reasons`` recibe {página: motivo} de las reextraídas.
+    Si pdfplumber no puede abrir el PDF, las páginas marcadas conservan el
+    texto de PyPDF2.
+    """
+    if extractors is None:
+        extractors = set()
+    if reasons is None:
+        reasons = {}
+    pdf = None
+    open_error = None
     try:
         with open(pdf_path, 'rb') as pdf_file:
             pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
-            
-            with open(txt_path, 'w', encoding='utf-8') as txt_file:
-                txt_file.write(text)
+            if page_numbers is None:
+                page_numbers = range(len(pdf_reader.pages))
+            for page_num in page_numbers:
+                try:
+                    raw_text = pdf_reader.pages[page_num].extract_text() or ""
+                except Exception:
+                    raw_text = None
+                
+                reason = 'error' if raw_text is None else layout_reason(raw_text)
+                if reason is None:
+                    extractors.add('pypdf2')
+                    # Quitar la sangría y los espacios finales que agrega PyPDF2
+                    yield page_num, '\n'.join(line.strip() for line in raw_text.splitlines())
+                    continue
+                
+                if pdf is None and open_error is None:
+                    try:
+                        pdf = pdfplumber.open(pdf_path)
+                    except Exception as e:
+                        open_error = e
+                        print(f"⚠️  pdfplumber no pudo abrir {Path(pdf_path).name} ({e}): "
+                              f"se conserva el texto de PyPDF2")
+                if pdf is None:
+                    if raw_text is None:
+                        raise open_error
+                    text = raw_text
+                    extractors.add('pypdf2')
+                else:
+                    page = pdf.pages[page_num]
+                    try:
+                        text = page.extract_text() or ""
+                        extractors.add('pdfplumber')
+                    except Exception:
+                        if raw_text is None:
+                            raise
+                        text = raw_text
+                        extractors.add('pypdf2')
+                    finally:
+                        page.close()
+                reasons[page_num] = reason
+                yield page_num, text
+    finally:
+        if pdf is not None:
+            pdf.close()
+
+def iter_pages(pdf_path, page_numbers=None, extractors=None, strategy=DEFAULT_STRATEGY):
+    """Genera (número de página, texto) con la estrategia de extracción indicada"""
+    if strategy == 'adaptive':
+        return iter_pages_adaptive(pdf_path, page_numbers, extractors)
+    if strategy == 'pdfplumber':
+        return iter_pages_layout(pdf_path, page_numbers, extractors)
+    if strategy == 'pypdf2':
+        if extractors is not None:
+            extractors.add('pypdf2')
+        return iter_pages_pypdf2(pdf_path, page_numbers)
+    raise ValueError(f"Estrategia desconocida '{strategy}', se esperaba una de {EXTRACTION_STRATEGIES}")
+
+def convert_pdf_to_txt_pypdf2(pdf_path, txt_path):
+    """Convierte PDF a TXT usando PyPDF2"""
+    try:
+        with open(txt_path, 'w', encoding='utf-8') as txt_file:
+            for _, page_text in iter_pages_pypdf2(pdf_path):
+                txt_file.write(page_text + "\n")
                 
         print(f"✓ Convertido: {pdf_path} -> {txt_path}")
         return True
@@ -32,16 +235,10 @@ def convert_pdf_to_txt_pypdf2(pdf_path, txt_path):
 def convert_pdf_to_txt_pdfplumber(pdf_path, txt_path):
     """Convierte PDF a TXT usando pdfplumber (mejor para tablas)"""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            text = ""
-            
-            for page in pdf.pages:
-                page_text = page.extract_text()
+        with open(txt_path, 'w', encoding='utf-8') as txt_file:
+            for _, page_text in iter_pages_pdfplumber(pdf_path):
                 if page_text:
-                    text += page_text + "\n"
-            
-            with open(txt_path, 'w', encoding='utf-8') as txt_file:
-                txt_file.write(text)
+                    txt_file.write(page_text + "\n")
                 
         print(f"✓ Convertido: {pdf_path} -> {txt_path}")
         return True
@@ -49,9 +246,667 @@ def convert_pdf_to_txt_pdfplumber(pdf_path, txt_path):
         print(f"✗ Error con pdfplumber: {e}")
         return False
 
-def convert_pdfs_in_directory(directory="."):
+def extractor_version(strategy=DEFAULT_STRATEGY):
+    """Versión de la extracción registrada en el manifiesto"""
+    return (f"{strategy}: pdfplumber {pdfplumber.__version__}, PyPDF2 {PyPDF2.__version__}, "
+            f"v{CONVERTER_VERSION}")
+
+def page_source_hashes(pdf_path):
+    """Hash del flujo de contenido de cada página, sin extraer texto"""
+    hashes = []
+    with open(pdf_path, 'rb') as pdf_file:
+        for page in PyPDF2.PdfReader(pdf_file).pages:
+            digest = hashlib.sha256(repr(page.mediabox).encode('utf-8'))
+            contents = page.get_contents()
+            if contents is not None:
+                digest.update(contents.get_data())
+            hashes.append(digest.hexdigest())
+    return hashes
+
+def extract_pages(pdf_path, page_numbers, strategy=DEFAULT_STRATEGY):
+    """Extrae un rango de páginas en un proceso de trabajo.
+    
+    Devuelve (extractores usados, [(número de página, texto), ...]).
+    """
+    extractors = set()
+    pages = list(iter_pages(pdf_path, page_numbers, extractors, strategy))
+    return extractors, pages
+
+def plan_conversion(pdf_file, txt_file, manifest, force=False, strategy=DEFAULT_STRATEGY,
+                    source_hashes=None):
+    """Qué hay que extraer de un PDF; None si su TXT está al día.
+    
+    source_hashes son los de page_source_hashes si ya se calcularon (en un
+    proceso aislado); si no, se calculan aquí.
+    """
+    version = extractor_version(strategy)
+    if not force and manifest.is_current(pdf_file, txt_file, version):
+        return None
+    
+    if source_hashes is None:
+        source_hashes = page_source_hashes(pdf_file)
+    reused = set() if force else manifest.reusable_pages(pdf_file, txt_file, source_hashes, version)
+    return {
+        'txt_file': txt_file,
+        'strategy': strategy,
+        'pdf_hash': ConversionManifest.file_hash(pdf_file),
+        'source_hashes': source_hashes,
+        'reused': reused,
+        'pages': [page_num for page_num in range(len(source_hashes)) if page_num not in reused]
+    }
+
+class _ConversionWriter:
+    """Escribe el TXT de un PDF a medida que llegan sus páginas.
+    
+    Las páginas pueden llegar desordenadas (modo paralelo): se escriben
+    apenas está completo el prefijo siguiente, y las reutilizadas se copian
+    del TXT anterior leyéndolo hacia adelante, sin cargarlo entero. Se
+    escribe en un temporal que reemplaza al TXT anterior solo al terminar.
+    """
+    
+    def __init__(self, pdf_file, plan, manifest):
+        self.pdf_file = pdf_file
+        self.plan = plan
+        self.manifest = manifest
+        self.txt_file = Path(plan['txt_file'])
+        self.tmp_file = self.txt_file.with_name(f".{self.txt_file.name}.tmp-{os.getpid()}")
+        self.output = open(self.tmp_file, 'w', encoding='utf-8', newline='')
+        self.previous = None
+        self.previous_pages = []
+        self.previous_position = 0  # Páginas del TXT anterior ya leídas
+        if plan['reused']:
+            self.previous = open(self.txt_file, 'r', encoding='utf-8', newline='')
+            self.previous_pages = manifest.get(pdf_file)['pages']
+        self.digest = hashlib.sha256()
+        self.pages = []
+        self.pending = {}
+        self.extractors = set()
+    
+    def add(self, page_num, page_text):
+        """Recibe una página extraída y escribe todo lo que ya esté en orden"""
+        self.pending[page_num] = page_text + "\n" if page_text else ""
+        self._flush()
+    
+    def _previous_page(self, page_num):
+        """Texto de la página page_num en el TXT anterior"""
+        while self.previous_position < page_num:
+            self.previous.read(self.previous_pages[self.previous_position]['chars'])
+            self.previous_position += 1
+        self.previous_position += 1
+        return self.previous.read(self.previous_pages[page_num]['chars'])
+    
+    def _flush(self):
+        while len(self.pages) < len(self.plan['source_hashes']):
+            page_num = len(self.pages)
+            if page_num in self.plan['reused']:
+                page_output = self._previous_page(page_num)
+            elif page_num in self.pending:
+                page_output = self.pending.pop(page_num)
+            else:
+                return
+            
+            self.output.write(page_output)
+            self.digest.update(page_output.encode('utf-8'))
+            self.pages.append({
+                'source_sha256': self.plan['source_hashes'][page_num],
+                'text_sha256': ConversionManifest.text_hash(page_output),
+                'chars': len(page_output)
+            })
+    
+    def close(self):
+        """Cierra el TXT, reemplaza el anterior y lo registra en el manifiesto"""
+        self._flush()
+        if len(self.pages) != len(self.plan['source_hashes']):
+            self.abort()
+            raise RuntimeError(f"faltan páginas de {self.pdf_file.name}")
+        self.output.close()
+        if self.previous:
+            self.previous.close()
+        os.replace(self.tmp_file, self.txt_file)
+        
+        extractor = '+'.join(sorted(self.extractors))
+        if not extractor:
+            # Solo cambiaron metadatos del PDF: se conserva el extractor anterior
+            extractor = self.manifest.get(self.pdf_file)['extractor']
+        self.manifest.record(self.pdf_file, self.txt_file, self.plan['pdf_hash'], extractor,
+                             extractor_version(self.plan['strategy']), self.digest.hexdigest(),
+                             self.pages)
+    
+    def abort(self):
+        """Descarta el temporal y deja el TXT anterior intacto"""
+        self.output.close()
+        if self.previous:
+            self.previous.close()
+        self.tmp_file.unlink(missing_ok=True)
+
+def iter_raw_pages(raw_file, pages):
+    """Genera (número de página, texto) del TXT por página usando los largos del manifiesto"""
+    with open(raw_file, 'r', encoding='utf-8', newline='') as f:
+        for page_num, page in enumerate(pages):
+            yield page_num, f.read(page['chars'])
+
+def _line_key(line):
+    """Forma normalizada de una línea para contar repeticiones ("página 3 de 32" = "página # de #")"""
+    return re.sub(r'\d+', '#', ' '.join(line.split()).lower())
+
+def _is_repeated(key, repeated):
+    """Si la línea es un encabezado/pie repetido, o varios pegados en una sola línea"""
+    if key in repeated:
+        return True
+    for prefix in repeated:
+        if len(prefix) >= 10 and key.startswith(prefix) and _is_repeated(key[len(prefix):].strip(), repeated):
+            return True
+    return False
+
+def _edge_lines(text):
+    """Índices y contenido de las líneas no vacías en los bordes de la página"""
+    lines = [(index, line.strip()) for index, line in enumerate(text.splitlines()) if line.strip()]
+    if len(lines) <= 2 * PAGE_EDGE_LINES:
+        return lines
+    return lines[:PAGE_EDGE_LINES] + lines[-PAGE_EDGE_LINES:]
+
+def scan_pages(pages):
+    """Primera pasada: encabezados/pies repetidos y ancho típico de línea.
+    
+    Una línea (con los números normalizados) que aparece en los bordes de al
+    menos REPEATED_LINE_RATIO de las páginas se considera encabezado o pie.
+    El ancho típico es la mediana del largo de las líneas, sin lo que haya
+    después de un espacio ancho (notas al margen).
+    """
+    edge_counts = Counter()
+    widths = Counter()
+    page_count = 0
+    for _, text in pages:
+        page_count += 1
+        edge_counts.update({_line_key(line) for _, line in _edge_lines(text)})
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                match = MARGIN_GAP.match(line)
+                widths[len(match.group(1) if match else line)] += 1
+    
+    repeated = set()
+    if page_count >= MIN_REPEAT_PAGES:
+        threshold = max(2, REPEATED_LINE_RATIO * page_count)
+        repeated = {key for key, count in edge_counts.items()
+                    if count >= threshold and re.search(r'[^\W\d_]{3}', key)}
+    
+    line_width = 0
+    seen = 0
+    for width in sorted(widths):
+        seen += widths[width]
+        if seen * 2 >= sum(widths.values()):
+            line_width = width
+            break
+    return {'repeated': repeated, 'line_width': line_width}
+
+class _TextCleaner:
+    """Segunda pasada: limpia las páginas como un solo flujo de líneas.
+    
+    Quita los encabezados/pies de scan_pages, separa las notas al margen
+    (p. ej. "Ley 20238 / Art. único Nº 1 a) / D.O. 19.01.2008") y une las
+    palabras cortadas con guion y las líneas cortadas al llegar al margen.
+    Una nota pegada al final de una línea con un solo espacio (pdfplumber)
+    solo se acepta si el bloque termina en una fecha "D.O. dd.mm.aaaa"; por
+    eso las líneas esperan en una ventana de MAX_NOTE_LINES antes de salir.
+    """
+    
+    def __init__(self, repeated, line_width):
+        self.repeated = repeated
+        self.min_wrapped_width = WRAP_RATIO * line_width
+        self.window = []
+        self.paragraph = None
+        self.last_width = 0
+        self.article = None
+        self.open_note = None
+        self.annotations = []
+        self.removed_lines = 0
+    
+    def feed(self, page_num, text):
+        """Procesa una página y genera los párrafos que ya están completos"""
+        edges = {index for index, line in _edge_lines(text) if _is_repeated(_line_key(line), self.repeated)}
+        for index, line in enumerate(text.splitlines()):
+            if index in edges:
+                self.removed_lines += 1
+                continue
+            entry = self._parse(page_num, line.strip())
+            self.window.append(entry)
+            if entry['kind'] == 'do':
+                self._confirm_block()
+            if len(self.window) > MAX_NOTE_LINES:
+                yield from self._emit(self.window.pop(0))
+    
+    def finish(self):
+        """Genera lo que queda pendiente al terminar el documento"""
+        while self.window:
+            yield from self._emit(self.window.pop(0))
+        if self.paragraph is not None:
+            yield self.paragraph
+            self.paragraph = None
+    
+    def _parse(self, page_num, line):
+        entry = {'page': page_num, 'line': line, 'body': line, 'note': None, 'kind': None, 'confirmed': False}
+        previous = self.window[-1]['kind'] if self.window else None
+        match = MARGIN_GAP.match(line)
+        if match and MARGIN_NOTE.match(match.group(2)):
+            note = match.group(2)
+            kind = self._kind(note)
+            if kind != 'cont' or previous == 'art':
+                # El espacio ancho ya indica que es una columna aparte
+                entry.update(body=match.group(1), note=note, kind=kind, confirmed=True)
+            return entry
+        
+        match = MARGIN_NOTE_TAIL.match(line)
+        if not match and previous == 'art':
+            match = MARGIN_NOTE_CONTINUATION.match(line)
+        if match:
+            kind = self._kind(match.group(2))
+            entry.update(body=match.group(1) or '', note=match.group(2), kind=kind, confirmed=kind == 'do')
+        return entry
+    
+    @staticmethod
+    def _kind(note):
+        if note.startswith(('L', 'l')):
+            return 'ley'
+        if note.startswith('Art.'):
+            return 'art'
+        if note.startswith('D.O.'):
+            return 'do'
+        if note == 'NOTA':
+            return 'nota'
+        return 'cont'
+    
+    def _confirm_block(self):
+        """Confirma las notas sin confirmar que preceden a una fecha D.O."""
+        for entry in reversed(self.window[:-1]):
+            if entry['note'] is None or entry['confirmed']:
+                break
+            entry['confirmed'] = True
+    
+    def _emit(self, entry):
+        if entry['note'] is not None and not entry['confirmed']:
+            entry['body'] = entry['line']  # No era una nota: se deja la línea como estaba
+            entry['note'] = None
+        
+        body = entry['body']
+        match = ARTICLE_HEADING.match(body)
+        if match:
+            self.article = ' '.join(match.group(1).split())
+        if entry['note'] is not None:
+            self._add_note(entry)
+        if entry['note'] is not None and not body:
+            return
+        yield from self._join(body)
+    
+    def _add_note(self, entry):
+        kind = entry['kind']
+        if kind in ('ley', 'nota') or self.open_note is None:
+            self.open_note = {'page': entry['page'] + 1, 'article': self.article, 'text': entry['note']}
+            self.annotations.append(self.open_note)
+        else:
+            self.open_note['text'] += ' ' + entry['note']
+        if kind in ('do', 'nota'):
+            self.open_note = None
+    
+    def _join(self, line):
+        """Une line al párrafo en curso si la línea anterior se cortó en el margen"""
+        if not line:
+            if self.paragraph is not None:
+                yield self.paragraph
+                self.paragraph = None
+            yield ''
+            return
+        
+        previous = self.paragraph
+        if previous is None:
+            self.paragraph = line
+        elif re.search(r'[^\W\d_]-$', previous) and line[0].islower():
+            self.paragraph = previous[:-1] + line  # "contra-\ntación" -> "contratación"
+        elif (self.last_width >= self.min_wrapped_width and not previous.endswith(('.', ':', ';', '!', '?'))
+              and not STRUCTURE_LINE.match(line)):
+            self.paragraph = f"{previous} {line}"
+        else:
+            yield previous
+            self.paragraph = line
+        self.last_width = len(line)
+
+def clean_txt(raw_file, txt_file, annotations_file, pages, source=None):
+    """Genera el TXT final a partir del TXT por página, en dos pasadas.
+    
+    Quita encabezados y pies repetidos, une palabras y líneas cortadas y
+    guarda las notas al margen en annotations_file (JSON) en vez de dejarlas
+    intercaladas en el texto. Devuelve estadísticas y el hash del TXT.
+    """
+    scan = scan_pages(iter_raw_pages(raw_file, pages))
+    cleaner = _TextCleaner(scan['repeated'], scan['line_width'])
+    
+    digest = hashlib.sha256()
+    tmp_file = txt_file.with_name(f".{txt_file.name}.tmp-{os.getpid()}")
+    try:
+        with open(tmp_file, 'w', encoding='utf-8', newline='') as output:
+            for page_num, text in iter_raw_pages(raw_file, pages):
+                for paragraph in cleaner.feed(page_num, text):
+                    output.write(paragraph + "\n")
+                    digest.update((paragraph + "\n").encode('utf-8'))
+            for paragraph in cleaner.finish():
+                output.write(paragraph + "\n")
+                digest.update((paragraph + "\n").encode('utf-8'))
+        os.replace(tmp_file, txt_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+    
+    with open(annotations_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'source': source,
+            'cleaner_version': CLEANER_VERSION,
+            'repeated_lines': sorted(scan['repeated']),
+            'annotations': cleaner.annotations
+        }, f, ensure_ascii=False, indent=2)
+    
+    return {
+        'output_sha256': digest.hexdigest(),
+        'removed_lines': cleaner.removed_lines,
+        'annotations': len(cleaner.annotations)
+    }
+
+def cleaner_version(clean=True):
+    """Versión de la limpieza registrada en el manifiesto ('none' = texto sin limpiar)"""
+    return f"v{CLEANER_VERSION}" if clean else 'none'
+
+def finish_conversion(pdf_file, raw_file, txt_file, manifest, clean=True):
+    """Genera el TXT final desde el texto por página y lo registra en el manifiesto"""
+    annotations_file = _annotations_path(txt_file)
+    if clean:
+        stats = clean_txt(raw_file, txt_file, annotations_file, manifest.get(pdf_file)['pages'],
+                          source=Path(pdf_file).name)
+    else:
+        shutil.copyfile(raw_file, txt_file)
+        annotations_file.unlink(missing_ok=True)
+        stats = {'output_sha256': ConversionManifest.file_hash(txt_file), 'removed_lines': 0, 'annotations': 0}
+    manifest.record_cleaned(pdf_file, txt_file, cleaner_version(clean), stats['output_sha256'])
+    return stats
+
+def _extract_serial(plans):
+    """Extrae archivo por archivo en este proceso, página por página.
+    
+    Genera (pdf, páginas, estado): estado None mientras llegan páginas, el
+    conjunto de extractores al terminar el archivo o la excepción si falló.
+    """
+    for pdf_file, plan in plans.items():
+        extractors = set()
+        try:
+            for page in iter_pages(str(pdf_file), plan['pages'], extractors, plan['strategy']):
+                yield pdf_file, [page], None
+        except Exception as e:
+            yield pdf_file, [], e
+            continue
+        yield pdf_file, [], extractors
+
+def _extract_parallel(plans, workers=None, pages_per_shard=PAGES_PER_SHARD):
+    """Reparte las páginas pendientes en rangos entre procesos.
+    
+    Las páginas de todos los archivos comparten el mismo pool; genera los
+    mismos eventos que _extract_serial, un rango a la vez.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for pdf_file, plan in plans.items():
+            for start in range(0, len(plan['pages']), pages_per_shard):
+                shard = plan['pages'][start:start + pages_per_shard]
+                future = executor.submit(extract_pages, str(pdf_file), shard, plan['strategy'])
+                futures[future] = pdf_file
+        
+        remaining = {pdf_file: len(plan['pages']) for pdf_file, plan in plans.items()}
+        extractors = {pdf_file: set() for pdf_file in plans}
+        for pdf_file, count in remaining.items():
+            if count == 0:
+                yield pdf_file, [], extractors[pdf_file]
+        
+        for future in as_completed(futures):
+            pdf_file = futures[future]
+            if remaining[pdf_file] is None:
+                continue  # El archivo ya falló en otro rango
+            try:
+                shard_extractors, shard_pages = future.result()
+            except Exception as e:
+                remaining[pdf_file] = None
+                yield pdf_file, [], e
+                continue
+            
+            extractors[pdf_file].update(shard_extractors)
+            remaining[pdf_file] -= len(shard_pages)
+            yield pdf_file, shard_pages, extractors[pdf_file] if remaining[pdf_file] == 0 else None
+
+def _source_hashes_job(pdf_path):
+    """Tarea aislada: los hashes por página de un PDF"""
+    yield page_source_hashes(pdf_path)
+
+def _extraction_job(pdf_path, page_numbers, strategy):
+    """Tarea aislada: genera ('page', (número, texto)) y al final ('extractors', conjunto)"""
+    extractors = set()
+    for page in iter_pages(pdf_path, page_numbers, extractors, strategy):
+        yield 'page', page
+    yield 'extractors', extractors
+
+def _hash_sandboxed(pdf_files, workers=1, timeout=DOCUMENT_TIMEOUT, max_memory_mb=MAX_WORKER_MEMORY_MB):
+    """Genera (pdf, hashes por página o excepción), leyendo cada PDF en un proceso aislado"""
+    jobs = ((pdf_file, _source_hashes_job, (str(pdf_file),)) for pdf_file in pdf_files)
+    hashes = {}
+    for pdf_file, item, status in run_sandboxed(jobs, workers, timeout, max_memory_mb):
+        if status is None:
+            hashes[pdf_file] = item
+        else:
+            yield pdf_file, hashes.pop(pdf_file) if status is True else status
+
+def _extract_sandboxed(plans, workers=1, pages_per_shard=PAGES_PER_SHARD, timeout=DOCUMENT_TIMEOUT,
+                       max_memory_mb=MAX_WORKER_MEMORY_MB):
+    """Extrae en procesos aislados con límite de tiempo y de memoria.
+    
+    Con workers=1 cada documento es una tarea; si no, sus páginas se reparten
+    en rangos como en _extract_parallel. Un proceso que se cuelga, muere o
+    excede los límites se termina y su documento falla sin detener al resto.
+    Genera los mismos eventos que _extract_serial.
+    """
+    shards = {}
+    jobs = []
+    for pdf_file, plan in plans.items():
+        size = len(plan['pages']) if workers == 1 else pages_per_shard
+        ranges = [plan['pages'][start:start + size] for start in range(0, len(plan['pages']), size or 1)]
+        shards[pdf_file] = len(ranges)
+        jobs.extend((pdf_file, _extraction_job, (str(pdf_file), pages, plan['strategy'])) for pages in ranges)
+    
+    extractors = {pdf_file: set() for pdf_file in plans}
+    for pdf_file, count in shards.items():
+        if count == 0:
+            yield pdf_file, [], extractors[pdf_file]
+    
+    failed = set()  # Sus rangos pendientes se cancelan
+    for pdf_file, item, status in run_sandboxed(jobs, workers or os.cpu_count(), timeout, max_memory_mb,
+                                                failed):
+        if pdf_file in failed:
+            continue
+        if status is None:
+            kind, value = item
+            if kind == 'page':
+                yield pdf_file, [value], None
+            else:
+                extractors[pdf_file].update(value)
+        elif status is True:
+            shards[pdf_file] -= 1
+            if shards[pdf_file] == 0:
+                yield pdf_file, [], extractors[pdf_file]
+        else:
+            failed.add(pdf_file)
+            yield pdf_file, [], status
+
+def convert_pdfs(pdf_files, output_dir=None, workers=1, force=False, pages_per_shard=PAGES_PER_SHARD,
+                 strategy=DEFAULT_STRATEGY, clean=True, sandbox=True, timeout=DOCUMENT_TIMEOUT,
+                 max_memory_mb=MAX_WORKER_MEMORY_MB):
+    """Convierte PDFs a TXT reextrayendo solo lo que cambió.
+    
+    Un manifiesto en el directorio de salida registra el hash de cada PDF,
+    el extractor y su versión, el hash del TXT y el de cada página: los PDFs
+    sin cambios se omiten sin leerlos y de un PDF modificado solo se
+    reextraen las páginas cuyo contenido cambió. Con workers distinto de 1
+    las páginas se reparten en rangos entre procesos (0/None = todos los
+    núcleos); strategy es una de EXTRACTION_STRATEGIES. El texto por página
+    queda en RAW_DIR y, con clean, el TXT final pasa por clean_txt (sin
+    clean es una copia).
+    
+    Con sandbox, los PDFs se leen y extraen en procesos aislados con límite
+    de tiempo (timeout, segundos) y de memoria (max_memory_mb); los que
+    fallan quedan en cuarentena en el manifiesto y se omiten hasta que
+    cambien (o con force). Devuelve estadísticas, incluidas páginas/segundo.
+    """
+    start_time = time.perf_counter()
+    stats = {'files': 0, 'skipped': 0, 'failed': 0, 'quarantined': 0, 'pages_extracted': 0,
+             'pages_reused': 0, 'cleaned': 0, 'removed_lines': 0, 'annotations': 0}
+    manifests = {}
+    plans = {}
+    pending = {}
+    
+    def fail(pdf_file, manifest, error):
+        print(f"✗ Error con {pdf_file.name}: {error}")
+        stats['failed'] += 1
+        stats['quarantined'] += 1
+        try:
+            manifest.quarantine(pdf_file, str(error))
+        except OSError:
+            pass  # El PDF ya no existe
+    
+    def finish(pdf_file, raw_file, txt_file, manifest):
+        try:
+            result = finish_conversion(pdf_file, raw_file, txt_file, manifest, clean)
+        except Exception as e:
+            print(f"✗ Error limpiando {pdf_file.name}: {e}")
+            stats['failed'] += 1
+            return False
+        stats['cleaned'] += 1
+        stats['removed_lines'] += result['removed_lines']
+        stats['annotations'] += result['annotations']
+        return True
+    
+    for pdf_file in map(Path, pdf_files):
+        txt_file = _output_path(pdf_file, output_dir)
+        raw_file = _raw_path(txt_file)
+        manifest = manifests.setdefault(txt_file.parent, ConversionManifest(txt_file.parent))
+        try:
+            if not force and manifest.is_quarantined(pdf_file):
+                reason = manifest.quarantined[pdf_file.name]['reason']
+                print(f"⚠️  En cuarentena: {pdf_file.name} ({reason})")
+                stats['quarantined'] += 1
+                continue
+            current = not force and manifest.is_current(pdf_file, raw_file, extractor_version(strategy))
+        except OSError as e:
+            print(f"✗ Error leyendo {pdf_file}: {e}")
+            stats['failed'] += 1
+            continue
+        if current:
+            if manifest.is_cleaned(pdf_file, txt_file, cleaner_version(clean)):
+                print(f"✓ Sin cambios: {pdf_file.name}")
+                stats['skipped'] += 1
+            elif finish(pdf_file, raw_file, txt_file, manifest):
+                print(f"✓ Regenerado: {raw_file} -> {txt_file}")
+                stats['skipped'] += 1
+            continue
+        pending[pdf_file] = (raw_file, txt_file, manifest)
+    
+    if sandbox:
+        source_hashes = _hash_sandboxed(pending, workers or os.cpu_count(), timeout, max_memory_mb)
+    else:
+        source_hashes = ((pdf_file, None) for pdf_file in pending)
+    for pdf_file, hashes in source_hashes:
+        raw_file, txt_file, manifest = pending[pdf_file]
+        if isinstance(hashes, Exception):
+            fail(pdf_file, manifest, hashes)
+            continue
+        try:
+            plan = plan_conversion(pdf_file, raw_file, manifest, force, strategy, hashes)
+        except Exception as e:
+            fail(pdf_file, manifest, e)
+            continue
+        if plan is None:
+            continue
+        plan['manifest'] = manifest
+        plan['output_file'] = txt_file
+        plans[pdf_file] = plan
+    # Mismo orden que la entrada, aunque los hashes lleguen en otro
+    plans = {pdf_file: plans[pdf_file] for pdf_file in pending if pdf_file in plans}
+    
+    if plans:
+        if sandbox:
+            results = _extract_sandboxed(plans, workers, pages_per_shard, timeout, max_memory_mb)
+        elif workers == 1:
+            results = _extract_serial(plans)
+        else:
+            results = _extract_parallel(plans, workers or None, pages_per_shard)
+        
+        writers = {}
+        for pdf_file, pages, status in results:
+            plan = plans[pdf_file]
+            if isinstance(status, Exception):
+                if pdf_file in writers:
+                    writers.pop(pdf_file).abort()
+                fail(pdf_file, plan['manifest'], status)
+                continue
+            
+            if pdf_file not in writers:
+                writers[pdf_file] = _ConversionWriter(pdf_file, plan, plan['manifest'])
+            writer = writers[pdf_file]
+            for page_num, page_text in pages:
+                writer.add(page_num, page_text)
+            if status is None:
+                continue
+            
+            writer.extractors.update(status)
+            writers.pop(pdf_file).close()
+            if not finish(pdf_file, plan['txt_file'], plan['output_file'], plan['manifest']):
+                continue
+            stats['files'] += 1
+            stats['pages_extracted'] += len(plan['pages'])
+            stats['pages_reused'] += len(plan['reused'])
+            reused = f", {len(plan['reused'])} reutilizadas" if plan['reused'] else ""
+            print(f"✓ Convertido: {pdf_file} -> {plan['output_file']} "
+                  f"({len(plan['pages'])} páginas extraídas{reused})")
+    
+    for manifest in manifests.values():
+        manifest.save()
+    
+    stats['seconds'] = round(time.perf_counter() - start_time, 3)
+    stats['pages_per_second'] = (round(stats['pages_extracted'] / stats['seconds'], 2)
+                                 if stats['seconds'] else 0.0)
+    print(f"📄 {stats['pages_extracted']} páginas extraídas en {stats['seconds']}s "
+          f"({stats['pages_per_second']} páginas/s), {stats['skipped']} archivos sin cambios")
+    if clean and stats['cleaned']:
+        print(f"🧹 {stats['removed_lines']} líneas de encabezado/pie eliminadas, "
+              f"{stats['annotations']} notas al margen separadas")
+    if stats['quarantined']:
+        print(f"⚠️  {stats['quarantined']} archivos en cuarentena: se omiten hasta que "
+              f"cambien (--force para reintentar)")
+    return stats
+
+def _output_path(pdf_file, output_dir=None):
+    """Ruta del TXT: junto al PDF o dentro de output_dir"""
+    if output_dir is None:
+        return Path(pdf_file).with_suffix('.txt')
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    return Path(output_dir) / Path(pdf_file).with_suffix('.txt').name
+
+def _raw_path(txt_file):
+    """Ruta del TXT por página (sin limpiar), en RAW_DIR junto al TXT final"""
+    raw_dir = Path(txt_file).parent / RAW_DIR
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    return raw_dir / Path(txt_file).name
+
+def _annotations_path(txt_file):
+    """Ruta del JSON con las notas al margen separadas del TXT"""
+    return Path(txt_file).with_suffix('.annotations.json')
+
+def convert_pdfs_in_directory(directory=".", output_dir=None, workers=1, force=False,
+                              strategy=DEFAULT_STRATEGY, clean=True, sandbox=True,
+                              timeout=DOCUMENT_TIMEOUT, max_memory_mb=MAX_WORKER_MEMORY_MB):
     """Convierte todos los PDFs en el directorio a TXT"""
-    pdf_files = list(Path(directory).glob("*.pdf"))
+    pdf_files = sorted(Path(directory).glob("*.pdf"))
     
     if not pdf_files:
         print("No se encontraron archivos PDF en el directorio.")
@@ -61,36 +916,46 @@ def convert_pdfs_in_directory(directory="."):
     for pdf_file in pdf_files:
         print(f"  - {pdf_file.name}")
     
-    for pdf_file in pdf_files:
-        txt_file = pdf_file.with_suffix('.txt')
-        
-        print(f"\nConvirtiendo: {pdf_file.name}")
-        
-        # Intentar primero con pdfplumber
-        if convert_pdf_to_txt_pdfplumber(pdf_file, txt_file):
-            continue
-            
-        # Si falla, intentar con PyPDF2
-        print("Intentando con PyPDF2...")
-        convert_pdf_to_txt_pypdf2(pdf_file, txt_file)
+    return convert_pdfs(pdf_files, output_dir, workers, force, strategy=strategy, clean=clean,
+                        sandbox=sandbox, timeout=timeout, max_memory_mb=max_memory_mb)
 
 def main():
-    if len(sys.argv) > 1:
-        # Convertir archivo específico
-        pdf_path = sys.argv[1]
-        if not os.path.exists(pdf_path):
-            print(f"Error: El archivo {pdf_path} no existe.")
-            return
-        
-        txt_path = Path(pdf_path).with_suffix('.txt')
-        
-        print(f"Convirtiendo: {pdf_path}")
-        if not convert_pdf_to_txt_pdfplumber(pdf_path, txt_path):
-            print("Intentando con PyPDF2...")
-            convert_pdf_to_txt_pypdf2(pdf_path, txt_path)
+    parser = argparse.ArgumentParser(description="Convertir archivos PDF a TXT")
+    parser.add_argument('path', nargs='?', default=".",
+                        help="PDF o directorio con PDFs (por defecto, el directorio actual)")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directorio de salida (por defecto, junto a cada PDF)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos para convertir por rangos de páginas (0 = todos los núcleos)")
+    parser.add_argument('--extractor', choices=EXTRACTION_STRATEGIES, default=DEFAULT_STRATEGY,
+                        help="adaptive: PyPDF2 y pdfplumber solo donde hace falta (por defecto)")
+    parser.add_argument('--force', action='store_true',
+                        help="Reextraer todo aunque el manifiesto indique que no hay cambios")
+    parser.add_argument('--no-clean', action='store_true',
+                        help="No quitar encabezados, pies ni notas al margen del texto extraído")
+    parser.add_argument('--timeout', type=float, default=DOCUMENT_TIMEOUT,
+                        help="Segundos máximos por documento (o rango de páginas); 0 = sin límite")
+    parser.add_argument('--max-memory', type=float, default=MAX_WORKER_MEMORY_MB,
+                        help="MB de memoria residente por proceso de trabajo; 0 = sin límite")
+    parser.add_argument('--no-sandbox', action='store_true',
+                        help="Extraer sin procesos aislados ni límites (para depurar)")
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.path):
+        print(f"Error: El archivo {args.path} no existe.")
+        return
+    
+    if os.path.isdir(args.path):
+        # Convertir todos los PDFs del directorio
+        convert_pdfs_in_directory(args.path, args.output_dir, args.workers, args.force, args.extractor,
+                                  not args.no_clean, not args.no_sandbox, args.timeout or None,
+                                  args.max_memory or None)
     else:
-        # Convertir todos los PDFs del directorio actual
-        convert_pdfs_in_directory()
+        # Convertir archivo específico
+        print(f"Convirtiendo: {args.path}")
+        convert_pdfs([args.path], args.output_dir, args.workers, args.force, strategy=args.extractor,
+                     clean=not args.no_clean, sandbox=not args.no_sandbox, timeout=args.timeout or None,
+                     max_memory_mb=args.max_memory or None)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
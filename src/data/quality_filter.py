@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Filtro de calidad de pares pregunta-respuesta con rasgos calculados en lote
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Encabezados y pies de página genéricos de los PDF convertidos
+PAGE_HEADER_PATTERNS = [
+    r'biblioteca del congreso nacional',
+    r'www\.[\w-]+\.(?:cl|com|gob|org)\b',
+    r'documento generado el',
+    r'p[áa]gina \d+ de \d+'
+]
+# Líneas completas de encabezado: una fecha sola, como el pie de una
+# presentación ("12 DICIEMBRE 2024")
+PAGE_HEADER_LINE_PATTERNS = [
+    r'(?:\d{1,2}[ \t]+(?:de[ \t]+)?)?(?:enero|febrero|marzo|abril|mayo|junio|julio|agosto|'
+    r'septiembre|octubre|noviembre|diciembre)[ \t]+(?:de[ \t]+)?\d{4}'
+]
+# Líneas que se repiten al menos estas veces en un documento son encabezados/pies
+HEADER_MIN_REPEATS = 5
+HEADER_MIN_LETTERS = 3
+TOKEN = re.compile(r'\w+')
+
+# Rampas (valor malo, valor bueno) de cada rasgo: puntaje 0 en el malo, 1 en el bueno
+RAMPS = {
+    'line_length': (15.0, 35.0),       # caracteres por línea de pregunta y respuesta
+    'alpha_ratio': (0.55, 0.75),       # letras / caracteres no blancos
+    'answer_length': (15.0, 50.0),     # caracteres de la respuesta
+    'question_length': (300.0, 150.0),  # caracteres de la pregunta
+    'question_newlines': (1.0, 0.0),   # saltos de línea dentro de la pregunta
+    'duplicate_ratio': (0.6, 0.35),    # palabras repetidas / palabras de la respuesta
+}
+# Texto de encabezado o pie de página descarta el par, sea cual sea el umbral
+HEADER_SCORE = 0.0
+REASONS = {
+    'line_length': "texto cortado en líneas cortas",
+    'alpha_ratio': "pocas letras",
+    'answer_length': "respuesta muy corta",
+    'question_length': "pregunta muy larga",
+    'question_newlines': "concepto de la pregunta cortado entre líneas",
+    'duplicate_ratio': "palabras repetidas",
+    'header': "texto de encabezado de página"
+}
+
+
+def repeated_lines(documents: Iterable[Dict[str, Any]]) -> List[str]:
+    """Líneas con letras que se repiten HEADER_MIN_REPEATS veces o más dentro de un documento"""
+    lines = set()
+    for doc in documents:
+        counts = Counter(line.strip() for line in doc['content'].split('\n'))
+        lines.update(line for line, count in counts.items()
+                     if count >= HEADER_MIN_REPEATS and sum(c.isalpha() for c in line) >= HEADER_MIN_LETTERS)
+    return sorted(lines)
+
+
+def _char_table(predicate) -> np.ndarray:
+    """predicate de cada carácter del plano básico (BMP), como arreglo indexable por código"""
+    return np.array([predicate(chr(code)) for code in range(0x10000)], dtype=bool)
+
+
+def _classify(codes: np.ndarray, table: np.ndarray, predicate) -> np.ndarray:
+    """Clase de cada código: por tabla en el BMP y carácter por carácter fuera de él (raro)"""
+    result = table[np.minimum(codes, 0xFFFF)]
+    outside = np.flatnonzero(codes > 0xFFFF)
+    if outside.size:
+        result[outside] = [predicate(chr(code)) for code in codes[outside].tolist()]
+    return result
+
+
+def _ramp(values: np.ndarray, bad: float, good: float) -> np.ndarray:
+    return np.clip((values - bad) / (good - bad), 0.0, 1.0)
+
+
+class QualityFilter:
+    """Score QA pairs from cheap text features computed for the whole batch at once.
+
+    Questions and answers are joined into one string that is turned into a
+    code-point array; character classes come from lookup tables indexed by
+    code point and per-text counts from cumulative sums at the text
+    boundaries. Header matches come from regex passes over the joined text
+    (inline patterns, then whole lines), assigned to their text with
+    ``searchsorted``. Each feature
+    maps to a sub-score in [0, 1] through a linear ramp and the pair's score
+    is their product, so one very bad feature is enough to drop a pair;
+    page-header text scores 0 and always drops it. The lowest sub-score is
+    reported as the reason.
+    """
+
+    _alpha = None
+    _space = None
+
+    def __init__(self, threshold: float = 0.5, header_lines: Optional[List[str]] = None):
+        self.threshold = threshold
+        # Sin distinguir mayúsculas, sobre el texto original: lower() puede
+        # cambiar el largo del texto y desplazar las posiciones de los matches
+        self.header = re.compile('|'.join(PAGE_HEADER_PATTERNS), re.IGNORECASE)
+        lines = PAGE_HEADER_LINE_PATTERNS + [re.escape(line) for line in
+                                             sorted(header_lines or [], key=len, reverse=True)]
+        self.header_line = re.compile(rf'^[ \t]*(?:{"|".join(lines)})[ \t]*$', re.IGNORECASE | re.MULTILINE)
+        if QualityFilter._alpha is None:
+            QualityFilter._alpha = _char_table(str.isalpha)
+            QualityFilter._space = _char_table(str.isspace)
+
+    def features(self, pairs: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Feature arrays, one value per pair"""
+        n = len(pairs)
+        texts = [qa['question'] for qa in pairs] + [qa['answer'] for qa in pairs]
+        lengths = np.array([len(text) for text in texts], dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+        ends = starts + lengths
+        joined = '\n'.join(texts)
+
+        codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+        is_alpha = _classify(codes, self._alpha, str.isalpha)
+        is_space = _classify(codes, self._space, str.isspace)
+        is_newline = (codes == ord('\n'))
+
+        def per_text(mask: np.ndarray) -> np.ndarray:
+            totals = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+            return totals[ends] - totals[starts]
+
+        alpha = per_text(is_alpha)
+        visible = lengths - per_text(is_space)
+        newlines = per_text(is_newline)
+
+        # Palabras de cada respuesta: total y distintas
+        words = [TOKEN.findall(answer.lower()) for answer in texts[n:]]
+        tokens = np.array([len(answer_words) for answer_words in words], dtype=np.int64)
+        distinct = np.array([len(set(answer_words)) for answer_words in words], dtype=np.int64)
+
+        header_positions = np.array([match.start() for header in (self.header, self.header_line)
+                                     for match in header.finditer(joined)], dtype=np.int64)
+        header = np.zeros(2 * n, dtype=bool)
+        header[np.searchsorted(starts, header_positions, side='right') - 1] = True
+
+        return {
+            'line_length': (lengths[:n] + lengths[n:]) / (newlines[:n] + newlines[n:] + 2),
+            'alpha_ratio': (alpha[:n] + alpha[n:]) / np.maximum(visible[:n] + visible[n:], 1),
+            'answer_length': lengths[n:].astype(float),
+            'question_length': lengths[:n].astype(float),
+            'question_newlines': newlines[:n].astype(float),
+            'duplicate_ratio': 1 - distinct / np.maximum(tokens, 1),
+            'header': header[:n] | header[n:]
+        }
+
+    def scores(self, features: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Sub-score of every feature and the combined 'score' (their product)"""
+        sub_scores = {name: _ramp(features[name], *ramp) for name, ramp in RAMPS.items()}
+        sub_scores['header'] = np.where(features['header'], HEADER_SCORE, 1.0)
+        sub_scores['score'] = np.prod(np.vstack(list(sub_scores.values())), axis=0)
+        return sub_scores
+
+    def evaluate(self, pairs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Indices to keep and, for every dropped pair, its score and main reason"""
+        if not pairs:
+            return {'keep': [], 'removed': []}
+        scores = self.scores(self.features(pairs))
+        names = [name for name in scores if name != 'score']
+        worst = np.argmin(np.vstack([scores[name] for name in names]), axis=0)
+        keep = np.flatnonzero(scores['score'] >= self.threshold)
+        removed = [{
+            'index': int(i),
+            'score': round(max(0.0, float(scores['score'][i])), 3),
+            'reason': REASONS[names[worst[i]]]
+        } for i in np.flatnonzero(scores['score'] < self.threshold)]
+        return {'keep': keep.tolist(), 'removed': removed}
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Ejecución aislada de tareas en procesos con límite de tiempo y de memoria
+"""
+
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from typing import Any, Callable, Iterable, Iterator, Optional, Set, Tuple
+
+# Cada cuánto se revisan el tiempo y la memoria de los procesos en curso
+POLL_SECONDS = 0.2
+# Mensajes leídos por proceso en cada vuelta, para revisar los límites aunque produzca sin parar
+MAX_MESSAGES_PER_POLL = 64
+
+
+class SandboxError(Exception):
+    """A sandboxed task failed: it raised, crashed, timed out or used too much memory"""
+
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process in MB (None where /proc is not available)"""
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _sandbox_main(conn, func, args) -> None:
+    """Runs in the child: sends every item produced by func(*args), then the outcome"""
+    try:
+        for item in func(*args):
+            conn.send(('item', item))
+        conn.send(('done', None))
+    except BaseException as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def run_sandboxed(jobs: Iterable[Tuple[Any, Callable, tuple]], workers: int = 1,
+                  timeout: Optional[float] = None,
+                  max_rss_mb: Optional[float] = None,
+                  cancelled: Optional[Set[Any]] = None) -> Iterator[Tuple[Any, Any, Any]]:
+    """Run generator functions in separate processes, at most ``workers`` at a time.
+
+    ``jobs`` yields (key, func, args); ``func(*args)`` must be a picklable
+    generator function. Items are streamed back as (key, item, None) while
+    the job runs, followed by (key, None, True) when it finishes or
+    (key, None, SandboxError) when it raises, dies, runs longer than
+    ``timeout`` seconds or its RSS exceeds ``max_rss_mb`` (checked through
+    /proc, so only the timeout applies where it does not exist). A process
+    that breaks a limit is killed; the other jobs keep running. Jobs whose
+    key the caller adds to ``cancelled`` are killed (or never started)
+    without further events.
+    """
+    if cancelled is None:
+        cancelled = set()
+    pending = iter(jobs)
+    running = {}
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(running) < max(1, workers):
+                job = next(pending, None)
+                if job is None:
+                    exhausted = True
+                    break
+                key, func, args = job
+                if key in cancelled:
+                    continue
+                parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=_sandbox_main, args=(child_conn, func, args), daemon=True)
+                process.start()
+                child_conn.close()
+                deadline = time.monotonic() + timeout if timeout else None
+                running[parent_conn] = (key, process, deadline)
+            if not running:
+                return
+
+            for conn in wait(list(running), timeout=POLL_SECONDS):
+                key, process, _ = running[conn]
+                if key in cancelled:
+                    continue
+                outcome = None
+                try:
+                    for _ in range(MAX_MESSAGES_PER_POLL):
+                        if not conn.poll():
+                            break
+                        kind, value = conn.recv()
+                        if kind == 'item':
+                            yield key, value, None
+                        elif kind == 'done':
+                            outcome = True
+                            break
+                        else:
+                            outcome = SandboxError(value)
+                            break
+                except (EOFError, OSError):
+                    process.join(1)
+                    outcome = SandboxError(f"el proceso terminó inesperadamente (código {process.exitcode})")
+                if outcome is not None:
+                    _stop(running.pop(conn)[1], conn)
+                    yield key, None, outcome
+
+            now = time.monotonic()
+            for conn, (key, process, deadline) in list(running.items()):
+                if key in cancelled:
+                    del running[conn]
+                    _stop(process, conn, kill=True)
+                    continue
+                if deadline is not None and now > deadline:
+                    reason = f"tiempo límite de {timeout:g}s excedido"
+                else:
+                    rss = process_rss_mb(process.pid) if max_rss_mb else None
+                    if rss is None or rss <= max_rss_mb:
+                        continue
+                    reason = f"memoria de {rss:.0f} MB excede el límite de {max_rss_mb:g} MB"
+                del running[conn]
+                _stop(process, conn, kill=True)
+                yield key, None, SandboxError(reason)
+    finally:
+        # Si se deja de consumir el generador, no quedan procesos huérfanos
+        for conn, (_, process, _) in running.items():
+            _stop(process, conn, kill=True)
+
+
+def _stop(process, conn, kill: bool = False) -> None:
+    conn.close()
+    if kill:
+        process.kill()
+    process.join(5)
+    if process.is_alive():
+        process.kill()
+        process.join()
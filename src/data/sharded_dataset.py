@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Dataset de entrenamiento en fragmentos JSONL comprimidos con índice, para
+escribirlo y leerlo sin cargarlo entero en memoria
+"""
+
+import bisect
+import gzip
+import hashlib
+import json
+import os
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Union
+
+INDEX_FILENAME = "index.json"
+FORMAT_VERSION = 1
+# Registros por bloque gzip: leer un registro al azar descomprime solo su bloque
+RECORDS_PER_BLOCK = 64
+RECORDS_PER_SHARD = 10_000
+
+
+class ShardedDatasetWriter:
+    """Stream examples to gzip-compressed JSONL shards described by an index.
+
+    Each shard is a sequence of independent gzip members of
+    ``records_per_block`` lines (a valid .jsonl.gz file for any gzip
+    reader). The index records, per shard, its record count, size, SHA-256
+    and the byte offset of every block, so a reader can decompress a single
+    block to reach any record. Only the current block is held in memory.
+    Shards are written under temporary names; on close they are renamed to
+    names carrying a hash of their contents, so they never overwrite the
+    shards of a different dataset, and index.json is switched last. A
+    reader always pairs an index with the shards it describes. Compression
+    uses a fixed mtime, so the same examples always produce the same bytes
+    and the same shard names.
+    """
+
+    def __init__(self, directory: str, records_per_shard: int = RECORDS_PER_SHARD,
+                 records_per_block: int = RECORDS_PER_BLOCK):
+        self.directory = Path(directory)
+        self.records_per_shard = records_per_shard
+        self.records_per_block = records_per_block
+        self.shards = []
+        self.count = 0
+        self._file = None
+        self._lines = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self) -> 'ShardedDatasetWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, example: Dict[str, Any]) -> None:
+        if self._file is None:
+            self._open_shard()
+        self._lines.append(json.dumps(example, ensure_ascii=False) + '\n')
+        shard = self.shards[-1]
+        shard['count'] += 1
+        self.count += 1
+        if len(self._lines) >= self.records_per_block:
+            self._flush_block()
+        if shard['count'] >= self.records_per_shard:
+            self._close_shard()
+
+    def close(self) -> Dict[str, Any]:
+        """Finish the last shard, publish the shards and then the index, and drop stale shards"""
+        if self._file is not None:
+            self._close_shard()
+        # Nombres según el contenido: los fragmentos del índice anterior no se tocan
+        generation = hashlib.sha256(''.join(shard['sha256'] for shard in self.shards).encode()).hexdigest()[:12]
+        for num, shard in enumerate(self.shards):
+            tmp = self._tmp_path(shard['file'])
+            shard['file'] = f"shard-{generation}-{num:05d}.jsonl.gz"
+            os.replace(tmp, self.directory / shard['file'])
+
+        index = {
+            'format': 'jsonl.gz',
+            'version': FORMAT_VERSION,
+            'count': self.count,
+            'records_per_block': self.records_per_block,
+            'shards': self.shards
+        }
+        self._publish_index(index)
+
+        current = {shard['file'] for shard in self.shards}
+        for path in self.directory.glob("shard-*.jsonl.gz"):
+            if path.name not in current:
+                path.unlink()
+        return index
+
+    def abort(self) -> None:
+        """Discard the shards written so far; the previous dataset, if any, is left untouched"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for shard in self.shards:
+            self._tmp_path(shard['file']).unlink(missing_ok=True)
+
+    def _publish_index(self, index: Dict[str, Any]) -> None:
+        tmp = self.directory / f"{INDEX_FILENAME}.tmp-{os.getpid()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self.directory / INDEX_FILENAME)
+
+    def _open_shard(self) -> None:
+        name = f"shard-{len(self.shards):05d}.jsonl.gz"
+        self.shards.append({'file': name, 'count': 0, 'bytes': 0, 'sha256': None, 'offsets': []})
+        self._file = open(self._tmp_path(name), 'wb')
+        self._digest = hashlib.sha256()
+
+    def _flush_block(self) -> None:
+        block = gzip.compress(''.join(self._lines).encode('utf-8'), mtime=0)
+        shard = self.shards[-1]
+        shard['offsets'].append(shard['bytes'])
+        shard['bytes'] += len(block)
+        self._file.write(block)
+        self._digest.update(block)
+        self._lines = []
+
+    def _close_shard(self) -> None:
+        if self._lines:
+            self._flush_block()
+        self._file.close()
+        self._file = None
+        self.shards[-1]['sha256'] = self._digest.hexdigest()
+
+    def _tmp_path(self, name: str) -> Path:
+        return self.directory / f"{name}.tmp-{os.getpid()}"
+
+
+class ShardedDataset(Sequence):
+    """Read-only view of a dataset written by ShardedDatasetWriter.
+
+    Only the index is loaded. Iteration streams the shards in order;
+    indexing seeks to the record's block and decompresses just that block
+    (the last block read is kept, so consecutive reads are cheap). Being a
+    Sequence, it works with ``random.sample`` and ``len`` like the list it
+    replaces.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        with open(self.directory / INDEX_FILENAME, 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        if self.index.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Versión de dataset no soportada en {self.directory}: {self.index.get('version')}")
+        self.records_per_block = self.index['records_per_block']
+        self.shards = self.index['shards']
+        self._starts = []
+        start = 0
+        for shard in self.shards:
+            self._starts.append(start)
+            start += shard['count']
+        self._cached_key = None
+        self._cached_block = []
+
+    @staticmethod
+    def exists(directory) -> bool:
+        return (Path(directory) / INDEX_FILENAME).exists()
+
+    def __len__(self) -> int:
+        return self.index['count']
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for shard in self.shards:
+            with gzip.open(self.directory / shard['file'], 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"índice fuera de rango: {index}")
+        shard_num = bisect.bisect_right(self._starts, index) - 1
+        block_num, position = divmod(index - self._starts[shard_num], self.records_per_block)
+        return json.loads(self._block(shard_num, block_num)[position])
+
+    def verify(self) -> List[str]:
+        """Shards whose size or SHA-256 no longer match the index"""
+        damaged = []
+        for shard in self.shards:
+            path = self.directory / shard['file']
+            if not path.exists() or path.stat().st_size != shard['bytes']:
+                damaged.append(shard['file'])
+                continue
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            if digest.hexdigest() != shard['sha256']:
+                damaged.append(shard['file'])
+        return damaged
+
+    def _block(self, shard_num: int, block_num: int) -> List[str]:
+        if self._cached_key != (shard_num, block_num):
+            shard = self.shards[shard_num]
+            offsets = shard['offsets']
+            end = offsets[block_num + 1] if block_num + 1 < len(offsets) else shard['bytes']
+            with open(self.directory / shard['file'], 'rb') as f:
+                f.seek(offsets[block_num])
+                data = f.read(end - offsets[block_num])
+            self._cached_block = gzip.decompress(data).decode('utf-8').split('\n')[:-1]
+            self._cached_key = (shard_num, block_num)
+        return self._cached_block
+
+
+def open_dataset(path: str) -> Union[ShardedDataset, List[Dict[str, Any]]]:
+    """Open a training dataset for lazy reading.
+
+    ``path`` is a sharded dataset directory; the name of the JSON file the
+    preparer used to write ("compras_publicas_dataset.json") also finds the
+    directory next to it. A JSON file with no sharded dataset is loaded
+    whole, as before, and returned as a list.
+    """
+    path = Path(path)
+    sharded = path.with_suffix('') if path.suffix == '.json' else path
+    if ShardedDataset.exists(sharded):
+        return ShardedDataset(sharded)
+    legacy = path if path.suffix == '.json' else path.with_name(path.name + '.json')
+    if legacy.is_file():
+        with open(legacy, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    raise FileNotFoundError(f"No se encontró el dataset: {path}")
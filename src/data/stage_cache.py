@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Caché por contenido de los resultados de cada etapa de preparación de datos
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+
+def content_hash(value: Any) -> str:
+    """SHA-256 de un valor JSON en forma canónica (claves ordenadas)"""
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """Content-addressed store of stage outputs, one JSON file per entry.
+
+    An entry lives at ``<directory>/<stage>/<key>.json`` where the key is
+    the hash of everything the output depends on (input content, stage
+    version, parameters), so a changed input simply misses and an unchanged
+    one hits no matter when or where it was computed. ``prune`` removes the
+    entries the current run did not touch, which keeps the cache the size of
+    the current corpus.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.hits = Counter()
+        self.misses = Counter()
+        self.used = set()
+
+    @staticmethod
+    def key(stage: str, *parts: Any) -> str:
+        return content_hash([stage, list(parts)])
+
+    def get(self, stage: str, key: str) -> Tuple[bool, Any]:
+        """(True, value) on a hit, (False, None) on a miss"""
+        path = self._path(stage, key)
+        self.used.add(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses[stage] += 1
+            return False, None
+        self.hits[stage] += 1
+        return True, value
+
+    def put(self, stage: str, key: str, value: Any) -> None:
+        path = self._path(stage, key)
+        self.used.add(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def prune(self) -> int:
+        """Delete the entries not used since this cache was opened; returns how many"""
+        removed = 0
+        for path in self.directory.glob("*/*.json"):
+            if path not in self.used:
+                path.unlink()
+                removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {stage: {'hits': self.hits[stage], 'misses': self.misses[stage]}
+                for stage in sorted(set(self.hits) | set(self.misses))}
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self.directory / stage / f"{key}.json"
@@ -3,7 +3,7 @@
 Fine-tuning script para crear modelo especializado en compras públicas chilenas
 """
 
-import json
+import sys
 import torch
 from transformers import (
     AutoTokenizer, 
@@ -16,6 +16,14 @@ from datasets import Dataset
 import os
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.data.sharded_dataset import open_dataset
+
+def conversation_texts(examples):
+    """Ejemplos en formato Sistema + Usuario + Asistente, uno a la vez"""
+    for example in examples:
+        yield {"text": f"Sistema: {example['instruction']}\nUsuario: {example['input']}\nAsistente: {example['output']}"}
+
 class ComprasPublicasFineTuner:
     def __init__(self, base_model: str = "microsoft/DialoGPT-small"):
         self.base_model = base_model
@@ -41,21 +49,17 @@ class ComprasPublicasFineTuner:
         
         print("✅ Modelo y tokenizer cargados")
         
-    def load_dataset(self, dataset_file: str = "compras_publicas_dataset.json"):
-        """Cargar dataset de entrenamiento"""
-        print(f"📊 Cargando dataset: {dataset_file}")
+    def load_dataset(self, dataset_file: str = "compras_publicas_dataset"):
+        """Cargar dataset de entrenamiento
         
-        with open(dataset_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        Los ejemplos se recorren de a uno y se vuelcan al caché Arrow (en disco)
+        de datasets, así que el tamaño del dataset no queda limitado por la RAM.
+        """
+        print(f"📊 Cargando dataset: {dataset_file}")
         
         # Formatear datos para entrenamiento conversacional
-        formatted_data = []
-        for example in data:
-            # Formato: Sistema + Usuario + Asistente
-            text = f"Sistema: {example['instruction']}\nUsuario: {example['input']}\nAsistente: {example['output']}"
-            formatted_data.append({"text": text})
-        
-        self.dataset = Dataset.from_list(formatted_data)
+        examples = open_dataset(dataset_file)
+        self.dataset = Dataset.from_generator(conversation_texts, gen_kwargs={"examples": examples})
         print(f"✅ Dataset cargado: {len(self.dataset)} ejemplos")
         
     def tokenize_dataset(self):
@@ -215,8 +219,10 @@ def main():
     print("=" * 50)
     
     # Verificar si existe el dataset
-    if not Path("compras_publicas_dataset.json").exists():
-        print("❌ No se encontró compras_publicas_dataset.json")
+    try:
+        open_dataset("compras_publicas_dataset")
+    except FileNotFoundError:
+        print("❌ No se encontró compras_publicas_dataset")
         print("Ejecuta primero: python prepare_training_data.py")
         return
     
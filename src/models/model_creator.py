@@ -3,22 +3,24 @@
 Crear modelo especializado usando Ollama con sistema de prompts personalizado
 """
 
-import json
 import random
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.data.sharded_dataset import open_dataset
+
 class SpecializedModelCreator:
     def __init__(self):
         self.training_data = []
         self.load_training_data()
         
-    def load_training_data(self):
-        """Cargar datos de entrenamiento"""
-        if Path("compras_publicas_dataset.json").exists():
-            with open("compras_publicas_dataset.json", 'r', encoding='utf-8') as f:
-                self.training_data = json.load(f)
-            print(f"✅ Cargados {len(self.training_data)} ejemplos")
-        else:
+    def load_training_data(self, dataset_path: str = "compras_publicas_dataset"):
+        """Abrir datos de entrenamiento (solo el índice: los ejemplos se leen al usarlos)"""
+        try:
+            self.training_data = open_dataset(dataset_path)
+            print(f"✅ Dataset con {len(self.training_data)} ejemplos")
+        except FileNotFoundError:
             print("❌ No se encontró el dataset. Ejecuta prepare_training_data.py primero")
             
     def create_modelfile(self):
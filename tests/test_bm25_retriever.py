@@ -0,0 +1,66 @@
+"""
+Pruebas del recuperador BM25 con poda MaxScore
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from src.core.bm25_retriever import BM25Retriever
+
+WORDS = ["licitación", "pública", "trato", "directo", "oferta", "contrato", "proveedor", "compra",
+         "entidad", "resolución", "plazo", "garantía", "bases", "adjudicación", "convenio", "marco"]
+
+
+def brute_force_scores(retriever, query):
+    """Puntaje BM25 de todos los documentos, sumando las listas completas"""
+    scores = np.zeros(retriever.n_docs)
+    for term in retriever._query_terms(query):
+        start, end = retriever.offsets[term], retriever.offsets[term + 1]
+        np.add.at(scores, retriever.doc_ids[start:end], retriever.impacts[start:end])
+    return scores
+
+
+def random_corpus(rng, n_docs):
+    # Frecuencias sesgadas: pocos términos con listas largas, muchos con listas cortas
+    weights = [1.0 / (rank + 1) for rank in range(len(WORDS))]
+    return [" ".join(rng.choices(WORDS, weights, k=rng.randint(0, 40))) for _ in range(n_docs)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_top_k_matches_brute_force(seed):
+    rng = random.Random(seed)
+    retriever = BM25Retriever()
+    retriever.build(random_corpus(rng, 300))
+
+    for _ in range(200):
+        query = " ".join(rng.sample(WORDS, rng.randint(1, 6)))
+        top_k = rng.randint(1, 12)
+        results = retriever.search(query, top_k=top_k)
+        scores = brute_force_scores(retriever, query)
+        expected = np.sort(scores[scores > 0])[::-1][:top_k]
+
+        assert [score for _, score in results] == pytest.approx(expected.tolist(), rel=1e-6)
+        for doc_id, score in results:
+            assert score == pytest.approx(scores[doc_id], rel=1e-6)
+        assert len({doc_id for doc_id, _ in results}) == len(results)
+
+
+def test_upper_bound_covers_every_document():
+    retriever = BM25Retriever()
+    retriever.build(random_corpus(random.Random(7), 200))
+    for query in ("licitación pública", "convenio marco garantía", "trato directo proveedor compra"):
+        assert brute_force_scores(retriever, query).max() <= retriever.upper_bound(query) + 1e-6
+
+
+def test_unknown_terms_and_empty_index():
+    retriever = BM25Retriever()
+    retriever.build(["licitación pública", "trato directo"])
+    assert retriever.search("inexistente", top_k=3) == []
+    assert retriever.search("licitación", top_k=0) == []
+
+    empty = BM25Retriever()
+    empty.build(["", "  "])
+    assert empty.n_docs == 2
+    assert empty.search("licitación", top_k=3) == []
@@ -0,0 +1,64 @@
+"""
+Pruebas del chunker de leyes y reglamentos
+"""
+
+from src.core.chunker import LegalDocumentChunker, estimate_tokens
+
+LEY = """Biblioteca del Congreso Nacional de Chile - www.leychile.cl - documento generado el 12-Mar-2024
+CAPITULO I
+Disposiciones generales
+Artículo 1º.- Los contratos que celebre la Administración del Estado se ajustarán a esta ley.
+Párrafo 1º
+De las definiciones
+Artículo 2º bis.- Para efectos de esta ley se entiende por licitación pública el procedimiento concursal.
+Ley 19886
+    "Artículo 5º.- Texto citado de la ley que se modifica.
+CAPITULO II
+Artículo 3º.- El trato directo procede solo en casos calificados.
+Disposiciones Transitorias
+Artículo único.- Esta ley rige desde su publicación.
+"""
+
+
+def chunk(content, **kwargs):
+    return LegalDocumentChunker(**kwargs).chunk({'content': content, 'filename': "ley.txt", 'path': "ley.txt"})
+
+
+def test_splits_on_articles_with_structure_metadata():
+    chunks = chunk(LEY)
+    assert [(c['chapter'], c['section'], c['article']) for c in chunks] == [
+        ("CAPITULO I - Disposiciones generales", None, "1º"),
+        ("CAPITULO I - Disposiciones generales", "Párrafo 1º - De las definiciones", "2º bis"),
+        ("CAPITULO II", None, "3º"),
+        ("Disposiciones Transitorias", None, "único transitorio"),
+    ]
+    # El artículo citado entre comillas sigue siendo texto del artículo que lo cita
+    assert "Texto citado" in chunks[1]['text']
+    assert all("Biblioteca del Congreso" not in c['text'] and "Ley 19886" not in c['text'] for c in chunks)
+    assert all(c['tokens'] == estimate_tokens(c['text']) and c['source'] == "ley.txt" for c in chunks)
+
+
+def test_long_articles_are_split_at_sentences_within_budget():
+    sentence = "La entidad licitante deberá publicar las bases en el sistema de información."
+    content = "Artículo 7º.- " + " ".join([sentence] * 40)
+    chunks = chunk(content, max_tokens=64, min_tokens=16)
+    assert len(chunks) > 1
+    assert [(c['part'], c['parts']) for c in chunks] == [(i, len(chunks)) for i in range(1, len(chunks) + 1)]
+    assert all(c['tokens'] <= 64 + 16 for c in chunks)
+    assert all(c['text'].endswith("información.") for c in chunks)
+    assert LegalDocumentChunker.article_label(chunks[1]) == f"Artículo 7º (parte 2/{len(chunks)})"
+
+
+def test_unstructured_text_is_split_by_budget():
+    content = "\n".join(f"Diapositiva {n}: etapas del ciclo de compra y gestión de contratos." for n in range(60))
+    chunks = chunk(content, max_tokens=50, min_tokens=10)
+    assert len(chunks) > 1
+    assert all(c['article'] is None for c in chunks)
+    assert LegalDocumentChunker.article_label(chunks[0]) is None
+
+
+def test_overlong_sentences_are_cut_by_words():
+    content = "palabra " * 1000
+    chunks = chunk(content, max_tokens=32, min_tokens=8)
+    assert all(len(c['text']) <= 32 * 4 + 8 * 4 + 1 for c in chunks)
+    assert " ".join(c['text'] for c in chunks).split() == content.split()
@@ -0,0 +1,51 @@
+"""
+Pruebas de la compresión extractiva del contexto
+"""
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.core.chunker import estimate_tokens
+from src.core.context_compressor import SentenceCompressor
+from src.core.ollama_client import OllamaClient
+
+SENTENCES = [
+    "Artículo 10.- La garantía de seriedad de la oferta se exige en toda licitación pública.",
+    "Las bases administrativas fijan su monto y la forma de devolverla.",
+    "El plazo de entrega de los bienes se cuenta desde la orden de compra.",
+    "Según el Art. 11 de la ley, la garantía de fiel cumplimiento asegura la ejecución del contrato.",
+    "Los proveedores se inscriben en el registro electrónico oficial.",
+    "La Dirección de Compras administra el sistema de información."
+]
+OTHER = "Artículo 12.- El Tribunal de Contratación Pública conoce de la acción de impugnación."
+
+
+def chunk(text, article):
+    return {'text': text, 'source': "ley.txt", 'article': article, 'tokens': estimate_tokens(text)}
+
+
+def vectorizer():
+    return TfidfVectorizer(**OllamaClient.VECTORIZER_PARAMS).fit(SENTENCES + [OTHER])
+
+
+def test_best_sentences_are_kept_in_document_order():
+    chunks = [chunk(" ".join(SENTENCES), "10"), chunk(OTHER, "12")]
+    result = SentenceCompressor(top_sentences=2, window=0).compress(
+        vectorizer(), "garantía de fiel cumplimiento del contrato", chunks)
+
+    # La frase del Art. 11 puntúa más alto, pero sale después del encabezado, como en el texto
+    assert result['chunks'][0]['text'] == f"{SENTENCES[0]} [...] {SENTENCES[3]} [...]"
+    assert result['chunks'][0]['tokens'] == estimate_tokens(result['chunks'][0]['text'])
+    assert result['chunks'][0]['article'] == "10"
+    # Un chunk de una sola frase queda igual, y los originales no se modifican
+    assert result['chunks'][1] == chunks[1]
+    assert chunks[0]['text'] == " ".join(SENTENCES)
+    assert result['tokens_after'] < result['tokens_before'] == sum(c['tokens'] for c in chunks)
+
+
+def test_article_headings_and_citations_are_not_split():
+    compressor = SentenceCompressor(top_sentences=1, window=1)
+    assert compressor._sentences(" ".join(SENTENCES)) == SENTENCES
+
+    result = compressor.compress(vectorizer(), "garantía de fiel cumplimiento", [chunk(" ".join(SENTENCES), "10")])
+    assert result['chunks'][0]['text'] == f"[...] {' '.join(SENTENCES[2:5])} [...]"
+    assert "Según el Art. 11 de la ley" in result['chunks'][0]['text']
@@ -0,0 +1,47 @@
+"""
+Pruebas del empaquetado del contexto del prompt
+"""
+
+from src.core.chunker import estimate_tokens
+from src.core.context_packer import ContextPacker
+
+SENTENCES = [f"La oración número {n} describe una obligación de la entidad licitante en el proceso." for n in range(40)]
+
+
+def chunk(sentences, source="ley.txt", article="1º"):
+    text = " ".join(sentences)
+    return {'text': text, 'source': source, 'article': article, 'tokens': estimate_tokens(text)}
+
+
+def test_whole_chunks_in_score_order_within_budget():
+    chunks = [chunk(SENTENCES[:3], article="1º"), chunk(SENTENCES[3:6], article="2º")]
+    packed = ContextPacker(max_tokens=1200).pack(chunks, reserved_tokens=100)
+    assert [block['chunk'] for block in packed['blocks']] == chunks
+    assert packed['blocks'][0]['text'] == f"Documento: ley.txt (Artículo 1º)\n{chunks[0]['text']}"
+    assert packed['tokens'] == sum(block['tokens'] for block in packed['blocks']) <= 1100
+    assert (packed['deduplicated'], packed['truncated'], packed['dropped']) == (0, 0, 0)
+
+
+def test_sentences_already_sent_are_dropped():
+    first = chunk(SENTENCES[:4], source="ley.txt")
+    copy = chunk(SENTENCES[:4], source="ley_copia.txt")
+    overlap = chunk(SENTENCES[2:6], source="reglamento.txt")
+    packed = ContextPacker().pack([first, copy, overlap])
+    assert [block['chunk']['source'] for block in packed['blocks']] == ["ley.txt", "reglamento.txt"]
+    assert packed['blocks'][1]['text'].endswith(" ".join(SENTENCES[4:6]))
+    assert packed['deduplicated'] == 2
+
+
+def test_first_chunk_that_does_not_fit_is_cut_at_a_sentence():
+    chunks = [chunk(SENTENCES[:10], article="1º"), chunk(SENTENCES[10:30], article="2º"),
+              chunk(SENTENCES[30:], article="3º")]
+    packed = ContextPacker(max_tokens=400).pack(chunks)
+    assert packed['tokens'] <= 400
+    assert (packed['truncated'], packed['dropped']) == (1, 1)
+    cut = packed['blocks'][1]['text'].split("\n", 1)[1]
+    assert cut.endswith("proceso.") and cut in chunks[1]['text'] and cut != chunks[1]['text']
+
+
+def test_too_little_room_drops_the_rest():
+    packed = ContextPacker(max_tokens=60).pack([chunk(SENTENCES[:10]), chunk(SENTENCES[10:20])])
+    assert packed['blocks'] == [] and packed['dropped'] == 2
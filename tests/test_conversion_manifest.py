@@ -0,0 +1,72 @@
+"""
+Pruebas del manifiesto de conversión PDF -> TXT
+"""
+
+import os
+
+import pytest
+
+from src.data.conversion_manifest import ConversionManifest
+
+PAGES = ["Página uno del reglamento.\n", "Página dos, con tildes: ñandú.\n", "Página tres.\n"]
+
+
+@pytest.fixture
+def converted(tmp_path):
+    """Un PDF (bytes cualquiera) y su TXT registrado en el manifiesto"""
+    pdf = tmp_path / "ley.pdf"
+    pdf.write_bytes(b"%PDF-1.4 contenido")
+    txt = tmp_path / "ley.txt"
+    txt.write_text("".join(PAGES), encoding='utf-8', newline='')
+    manifest = ConversionManifest(str(tmp_path))
+    pages = [{'source_sha256': f"stream-{i}", 'text_sha256': ConversionManifest.text_hash(text), 'chars': len(text)}
+             for i, text in enumerate(PAGES)]
+    manifest.record(pdf, txt, ConversionManifest.file_hash(pdf), 'pypdf2', "1",
+                    ConversionManifest.file_hash(txt), pages)
+    manifest.save()
+    return pdf, txt
+
+
+def test_unchanged_pdf_is_current_after_reload(converted):
+    pdf, txt = converted
+    manifest = ConversionManifest(str(pdf.parent))
+    assert manifest.is_current(pdf, txt, "1")
+    assert not manifest.is_current(pdf, txt, "2")
+
+
+def test_touched_pdf_with_same_content_is_current(converted):
+    pdf, txt = converted
+    os.utime(pdf, ns=(0, 0))
+    manifest = ConversionManifest(str(pdf.parent))
+    assert manifest.is_current(pdf, txt, "1")
+    assert manifest.dirty and manifest.get(pdf)['pdf_mtime_ns'] == 0
+
+
+def test_changed_pdf_or_output_is_not_current(converted):
+    pdf, txt = converted
+    txt.write_text("editado a mano", encoding='utf-8')
+    assert not ConversionManifest(str(pdf.parent)).is_current(pdf, txt, "1")
+
+    pdf.write_bytes(b"%PDF-1.4 contenido nuevo")
+    assert not ConversionManifest(str(pdf.parent)).is_current(pdf, txt, "1")
+
+
+def test_only_pages_with_the_same_stream_are_reused(converted):
+    pdf, txt = converted
+    manifest = ConversionManifest(str(pdf.parent))
+    assert manifest.reusable_pages(pdf, txt, ["stream-0", "otro", "stream-2"], "1") == {0, 2}
+    assert manifest.reusable_pages(pdf, txt, ["stream-0"], "1") == {0}
+    assert manifest.reusable_pages(pdf, txt, ["stream-0", "stream-1", "stream-2"], "2") == set()
+
+    # Un TXT editado a mano ya no corresponde al manifiesto: no se reutiliza nada
+    txt.write_text("".join(PAGES).replace("tres", "3"), encoding='utf-8', newline='')
+    assert manifest.reusable_pages(pdf, txt, ["stream-0", "stream-1", "stream-2"], "1") == set()
+
+
+def test_save_only_writes_when_dirty(tmp_path):
+    manifest = ConversionManifest(str(tmp_path))
+    manifest.save()
+    assert not (tmp_path / ConversionManifest.FILENAME).exists()
+
+    (tmp_path / ConversionManifest.FILENAME).write_text("{no es json", encoding='utf-8')
+    assert ConversionManifest(str(tmp_path)).entries == {}
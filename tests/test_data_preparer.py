@@ -0,0 +1,125 @@
+"""
+Pruebas de la preparación de datos de entrenamiento
+"""
+
+import random
+import re
+import time
+
+from src.data.data_preparer import TrainingDataPreparer, extract_document_qa_pairs
+
+# Patrones originales de extract_qa_pairs, aplicados uno por uno con finditer
+BASELINE_PATTERNS = [
+    ('definition', r'(?:se entiende por|significa|definición de|concepto de)\s+([^.]+)\s*[:.]?\s*([^.]+(?:\.[^.]*){0,3}\.)'),
+    ('definition', r'([A-Z][^:]+):\s*([^.]+(?:\.[^.]*){0,2}\.)'),
+    ('definition', r'Art[íi]culo\s+\d+[°º]?\.?\s*([^.]+)\s*\.\s*([^.]+(?:\.[^.]*){0,3}\.)'),
+    ('procedure', r'(procedimiento[^.]*)\s*[:.]?\s*([^.]+(?:\.[^.]*){0,3}\.)'),
+    ('procedure', r'(proceso de[^.]*)\s*[:.]?\s*([^.]+(?:\.[^.]*){0,3}\.)')
+]
+TOKENS = ['a', 'b', 'X', ' ', '  ', '.', '..', ':', '\n', '\t', 'º', '°', '7', 'ARTICULO 3', 'Artículo  4°',
+          'PROCESO DE', 'se entiende por', 'significa', 'Artículo 5', 'artículo 12º.', 'procedimiento',
+          'proceso de', 'Concepto de', ' texto largo aqui ', 'otra frase bastante larga', 'ñ', '1']
+
+
+def baseline_qa_pairs(doc):
+    qa_pairs = []
+    for pair_type, pattern in BASELINE_PATTERNS:
+        for match in re.finditer(pattern, doc['content'], re.IGNORECASE | re.MULTILINE):
+            concept = match.group(1).strip()
+            answer = match.group(2).strip()
+            if len(concept) <= 10 or len(answer) <= 20:
+                continue
+            if pair_type == 'definition':
+                questions = [f"¿Qué es {concept.lower()}?", f"Define {concept.lower()}"]
+            else:
+                questions = [f"¿Cómo funciona el {concept.lower()}?"]
+            qa_pairs.extend({'question': question, 'answer': answer, 'source': doc['filename'], 'type': pair_type}
+                            for question in questions)
+    return qa_pairs
+
+
+def test_extraction_matches_baseline_regexes():
+    rng = random.Random(0)
+    for _ in range(3000):
+        content = ''.join(rng.choice(TOKENS) for _ in range(rng.randint(1, 40)))
+        doc = {'content': content, 'filename': 'doc.txt'}
+        assert extract_document_qa_pairs(doc) == baseline_qa_pairs(doc), repr(content)
+
+
+def test_extraction_of_legal_text():
+    content = ("Artículo 2°. Licitación pública. Procedimiento administrativo de carácter concursal. "
+               "Para efectos de esta ley se entiende por adjudicación. Acto administrativo fundado por medio "
+               "del cual la autoridad selecciona una oferta. Trato directo: procedimiento de contratación que "
+               "por la naturaleza de la negociación debe efectuarse sin concurso.")
+    doc = {'content': content, 'filename': 'ley.txt'}
+    pairs = extract_document_qa_pairs(doc)
+    assert pairs == baseline_qa_pairs(doc)
+    assert {'question': "¿Qué es licitación pública?",
+            'answer': "Procedimiento administrativo de carácter concursal. Para efectos de esta ley se entiende "
+                      "por adjudicación. Acto administrativo fundado por medio del cual la autoridad selecciona "
+                      "una oferta. Trato directo: procedimiento de contratación que por la naturaleza de la "
+                      "negociación debe efectuarse sin concurso.",
+            'source': 'ley.txt', 'type': 'definition'} in pairs
+
+
+def test_colons_without_periods_are_not_quadratic():
+    small = {'content': 'Requisito: palabra ' * 500 + 'fin.', 'filename': 'x'}
+    assert extract_document_qa_pairs(small) == baseline_qa_pairs(small)
+
+    for tail in ('', '.'):
+        doc = {'content': 'Requisito: palabra ' * 200_000 + tail, 'filename': 'x'}
+        start = time.perf_counter()
+        extract_document_qa_pairs(doc)
+        # En tiempo cuadrático serían horas; en lineal, milisegundos
+        assert time.perf_counter() - start < 2.0
+
+
+TERMS = ["garantía de seriedad", "orden de compra", "convenio marco", "subasta inversa", "registro de proveedores",
+         "plan anual de compras", "bases administrativas", "comisión evaluadora", "acta de adjudicación",
+         "contrato de suministro", "boleta de garantía", "mercado público"]
+LEY = "\n".join(
+    f"Artículo {n}°. {term.capitalize()}. Instrumento que la entidad licitante exige o emite en la etapa "
+    f"{n} del proceso, conforme a las {TERMS[n - 2].lower()} vigentes. Para efectos de esta ley se entiende "
+    f"por {term} {n}. Documento que registra las condiciones del {TERMS[n - 3]} y sus plazos."
+    for n, term in enumerate(TERMS, 1)
+)
+
+
+def prepare(documents, output, cache_dir=None):
+    """Las etapas de main(), devolviendo el preparador para inspeccionar su caché"""
+    preparer = TrainingDataPreparer(cache_dir=str(cache_dir) if cache_dir else None)
+    preparer.load_documents(str(documents))
+    preparer.extract_qa_pairs(workers=1)
+    preparer.filter_qa_pairs(str(output / "quality_report.json"))
+    preparer.create_training_dataset()
+    preparer.save_dataset(str(output))
+    preparer.prune_cache()
+    return preparer
+
+
+def dataset_bytes(directory):
+    return {path.name: path.read_bytes() for path in sorted(directory.iterdir())}
+
+
+def test_cached_runs_write_the_same_bytes(tmp_path):
+    documents = tmp_path / "docs"
+    documents.mkdir()
+    (documents / "ley.txt").write_text(LEY, encoding='utf-8')
+    (documents / "reglamento.txt").write_text(LEY.replace("licitante", "compradora"), encoding='utf-8')
+    cache = tmp_path / "cache"
+
+    prepare(documents, tmp_path / "fresh")
+    prepare(documents, tmp_path / "cold", cache)
+    warm = prepare(documents, tmp_path / "warm", cache)
+    expected = dataset_bytes(tmp_path / "fresh")
+    assert len(warm.training_data) > 0
+    assert dataset_bytes(tmp_path / "cold") == expected
+    assert dataset_bytes(tmp_path / "warm") == expected
+    assert sum(warm.cache.misses.values()) == 0
+
+    # Un documento modificado solo recalcula sus etapas, con el mismo resultado que sin caché
+    (documents / "reglamento.txt").write_text(LEY.replace("vigentes", "en vigor"), encoding='utf-8')
+    changed = prepare(documents, tmp_path / "changed", cache)
+    prepare(documents, tmp_path / "changed_fresh")
+    assert dataset_bytes(tmp_path / "changed") == dataset_bytes(tmp_path / "changed_fresh")
+    assert changed.cache.hits['extract'] == 1 and changed.cache.misses['extract'] == 1
@@ -0,0 +1,102 @@
+"""
+Pruebas de la eliminación de casi duplicados con MinHash
+"""
+
+import itertools
+import random
+
+import pytest
+
+from src.data.deduplicator import NearDuplicateFilter, lsh_params, shingles
+
+WORDS = ["licitación", "pública", "trato", "directo", "oferta", "contrato", "proveedor", "compra", "entidad",
+         "resolución", "plazo", "garantía", "bases", "adjudicación", "convenio", "marco", "sanción", "multa"]
+
+
+def exact_clusters(texts, threshold, shingle_size=5):
+    """Componentes conexas del grafo de pares con Jaccard exacto >= umbral (comparando todos)"""
+    sets = [shingles(text, shingle_size) for text in texts]
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i, j in itertools.combinations(range(len(texts)), 2):
+        if NearDuplicateFilter.jaccard(sets[i], sets[j]) >= threshold:
+            parent[max(find(i), find(j))] = min(find(i), find(j))
+    groups = {}
+    for i in range(len(texts)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values())
+
+
+def corpus(rng, n_bases=40, max_variants=3):
+    """Textos base distintos y variantes con una o dos palabras cambiadas"""
+    texts = []
+    for _ in range(n_bases):
+        words = rng.choices(WORDS, k=60)
+        texts.append(" ".join(words))
+        for _ in range(rng.randint(0, max_variants)):
+            variant = list(words)
+            for position in rng.sample(range(len(variant)), rng.randint(1, 2)):
+                variant[position] = rng.choice(WORDS)
+            texts.append(" ".join(variant))
+    rng.shuffle(texts)
+    return texts
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.8, 0.9])
+def test_lsh_params_midpoint_is_not_above_threshold(threshold):
+    bands, rows = lsh_params(threshold, 128)
+    assert bands * rows == 128
+    assert (1 / bands) ** (1 / rows) <= threshold
+
+
+@pytest.mark.parametrize('threshold', [0.65, 0.75, 0.8])
+def test_clusters_match_exact_jaccard(threshold):
+    # Variantes (Jaccard > 0.8) y textos distintos (< 0.6) quedan lejos del umbral: LSH no pierde ni une de más
+    texts = corpus(random.Random(threshold))
+    assert NearDuplicateFilter(threshold=threshold).clusters(texts) == exact_clusters(texts, threshold)
+
+
+def test_clusters_never_merge_below_threshold():
+    # Con umbral 0.9 algunas variantes caen junto al umbral y LSH puede no verlas como
+    # candidatas, pero todo lo que une se verificó con el Jaccard exacto
+    texts = corpus(random.Random(9), n_bases=60)
+    exact = {i: tuple(cluster) for cluster in exact_clusters(texts, 0.9) for i in cluster}
+    for cluster in NearDuplicateFilter(threshold=0.9).clusters(texts):
+        assert set(cluster) <= set(exact[cluster[0]])
+
+
+def test_threshold_decides_which_pairs_merge():
+    base = " ".join(random.Random(3).choices(WORDS, k=40))
+    words = base.split()
+    words[10] = "sin"
+    variant = " ".join(words)
+    similarity = NearDuplicateFilter.jaccard(shingles(base, 5), shingles(variant, 5))
+    assert 0.8 < similarity < 0.95
+
+    texts = [base, "otro texto sin ninguna relación con las compras públicas", variant]
+    assert NearDuplicateFilter(threshold=0.8).keep(texts) == [0, 1]
+    assert NearDuplicateFilter(threshold=0.95).keep(texts) == [0, 1, 2]
+
+
+def test_clusters_are_deterministic_and_accept_precomputed_signatures():
+    texts = corpus(random.Random(5))
+    dedup = NearDuplicateFilter()
+    clusters = dedup.clusters(texts)
+    assert NearDuplicateFilter().clusters(texts) == clusters
+    assert dedup.clusters(texts, dedup.signatures(texts)) == clusters
+    assert dedup.keep(texts) == sorted(cluster[0] for cluster in clusters)
+
+
+def test_whitespace_and_case_do_not_matter():
+    texts = ["Artículo 1º.- La Licitación  Pública\nse adjudica.", "artículo 1º.- la licitación pública se adjudica."]
+    assert NearDuplicateFilter(threshold=1.0).keep(texts) == [0]
+
+
+def test_invalid_threshold():
+    with pytest.raises(ValueError):
+        NearDuplicateFilter(threshold=0)
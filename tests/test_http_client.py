@@ -0,0 +1,129 @@
+"""
+Pruebas del circuit breaker y de su uso en los clientes de Ollama
+"""
+
+import asyncio
+import time
+
+import pytest
+import requests
+
+from src.core.async_ollama_client import AsyncOllamaBackend
+from src.core.http_client import CircuitBreaker, CircuitOpenError
+from src.core.ollama_client import OllamaClient
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict = None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """Sesión que devuelve o lanza, en orden, los resultados indicados"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.allow_request()
+        breaker.record_failure()
+    breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+    open_breaker(breaker)
+    assert breaker.state == 'open'
+    assert not breaker.allow_request()
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.raise_if_open()
+    assert error.value.status_code == 503
+    assert 1 <= error.value.retry_after <= 60
+    assert breaker.stats()['rejected'] == 2
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    breaker.raise_if_open()  # No consume el sondeo
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+@pytest.mark.parametrize('error', [ValueError("respuesta inválida"), KeyboardInterrupt()])
+def test_probe_failing_with_any_exception_reopens_the_circuit(error):
+    client = OllamaClient(index_dir=None, failure_threshold=1, reset_timeout=0.05)
+    client.session = FakeSession(requests.ConnectionError("caído"), error,
+                                 FakeResponse(200, {'response': "hola"}))
+    with pytest.raises(requests.ConnectionError):
+        client._request("GET", "/api/tags")
+    assert client.circuit_breaker.state == 'open'
+
+    time.sleep(0.06)
+    with pytest.raises(type(error)):
+        client._request("POST", "/api/generate")
+    assert not client.circuit_breaker.probing
+    assert client.circuit_breaker.state == 'open'
+
+    time.sleep(0.06)
+    assert client.generate("pregunta") == "hola"
+    assert client.circuit_breaker.state == 'closed'
+
+
+def test_generate_propagates_an_open_circuit():
+    client = OllamaClient(index_dir=None, failure_threshold=1)
+    client.session = FakeSession(FakeResponse(500))
+    assert client.generate("pregunta") == "Error: 500"
+    with pytest.raises(CircuitOpenError):
+        client.generate("pregunta")
+    assert client.session.calls == 1
+
+
+def test_async_request_records_cancelled_probe():
+    backend = AsyncOllamaBackend(failure_threshold=1, reset_timeout=0.05)
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        backend.client.request = hang
+        backend.circuit_breaker.allow_request()
+        backend.circuit_breaker.record_failure()
+        await asyncio.sleep(0.06)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(backend._request("GET", "/api/tags"), 0.01)
+        await backend.aclose()
+
+    asyncio.run(scenario())
+    assert not backend.circuit_breaker.probing
+    assert backend.circuit_breaker.state == 'open'
@@ -0,0 +1,100 @@
+"""
+Pruebas de los snapshots en disco del índice TF-IDF
+"""
+
+import json
+import os
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.core.index_store import IndexSnapshotStore, scan_corpus
+from src.core.ollama_client import OllamaClient
+
+PARAMS = {'ngram_range': (1, 2)}
+TEXTS = ["La licitación pública es un procedimiento concursal.",
+         "El trato directo procede solo en casos calificados.",
+         "La entidad adjudica mediante resolución fundada."]
+
+
+def fitted():
+    vectorizer = TfidfVectorizer(**PARAMS)
+    vectors = vectorizer.fit_transform(TEXTS)
+    chunks = [{'text': text, 'source': "ley.txt", 'article': str(i)} for i, text in enumerate(TEXTS)]
+    return vectorizer, vectors, chunks
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = IndexSnapshotStore(str(tmp_path))
+    vectorizer, vectors, chunks = fitted()
+    store.save("abc", vectorizer, vectors, chunks, extra={'file_states': {}})
+
+    assert store.latest_hash() == "abc"
+    loaded_vectorizer, loaded_vectors, loaded_chunks, manifest = store.load("abc", PARAMS)
+    assert loaded_chunks == chunks
+    assert manifest['chunk_count'] == 3 and manifest['file_states'] == {}
+    assert (loaded_vectors != vectors).nnz == 0
+    query = ["licitación pública concursal"]
+    assert np.array_equal(loaded_vectorizer.transform(query).toarray(), vectorizer.transform(query).toarray())
+
+
+def test_stale_or_incomplete_snapshots_are_ignored(tmp_path):
+    store = IndexSnapshotStore(str(tmp_path))
+    assert store.load("missing", PARAMS) is None
+
+    store.save("abc", *fitted())
+    manifest_path = tmp_path / "abc" / "manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    manifest['format_version'] = -1
+    manifest_path.write_text(json.dumps(manifest), encoding='utf-8')
+    assert store.load("abc", PARAMS) is None
+
+    store.save("def", *fitted())
+    (tmp_path / "def" / "manifest.json").unlink()
+    assert store.load("def", PARAMS) is None
+
+
+def test_keeps_only_the_latest_snapshots(tmp_path):
+    store = IndexSnapshotStore(str(tmp_path), keep=2)
+    for i, name in enumerate(["a", "b", "c"]):
+        store.save(name, *fitted())
+        os.utime(tmp_path / name, (i, i))
+    assert sorted(path.name for path in tmp_path.iterdir() if path.is_dir()) == ["b", "c"]
+
+
+def test_scan_corpus_detects_changes_by_content(tmp_path):
+    (tmp_path / "ley.txt").write_text("uno", encoding='utf-8')
+    (tmp_path / "reglamento.txt").write_text("dos", encoding='utf-8')
+    first = scan_corpus(str(tmp_path), {})
+    assert [doc['filename'] for doc in first['added']] == ["ley.txt", "reglamento.txt"]
+
+    (tmp_path / "ley.txt").write_text("uno modificado", encoding='utf-8')
+    (tmp_path / "reglamento.txt").unlink()
+    (tmp_path / "decreto.txt").write_text("tres", encoding='utf-8')
+    second = scan_corpus(str(tmp_path), first['states'])
+    assert [doc['filename'] for doc in second['added']] == ["decreto.txt"]
+    assert [doc['filename'] for doc in second['modified']] == ["ley.txt"]
+    assert second['removed'] == [str(tmp_path / "reglamento.txt")]
+
+    # Mismo contenido con otro mtime: se relee pero no cuenta como modificado
+    os.utime(tmp_path / "decreto.txt", ns=(0, 0))
+    third = scan_corpus(str(tmp_path), second['states'])
+    assert third['modified'] == [] and str(tmp_path / "decreto.txt") in third['unchanged']
+
+
+def test_client_restart_loads_the_same_index(tmp_path, capsys):
+    documents = tmp_path / "docs"
+    documents.mkdir()
+    for i, text in enumerate(TEXTS):
+        (documents / f"doc{i}.txt").write_text(f"Artículo {i}º.- {text} " * 5, encoding='utf-8')
+
+    first = OllamaClient(index_dir=str(tmp_path / "index"), cache_size=0)
+    first.load_documents(str(documents))
+    capsys.readouterr()
+    second = OllamaClient(index_dir=str(tmp_path / "index"), cache_size=0)
+    second.load_documents(str(documents))
+    assert "Índice cargado desde snapshot" in capsys.readouterr().out
+
+    assert list(second.index.chunks) == list(first.index.chunks)
+    for query in ("licitación pública", "trato directo", "resolución fundada"):
+        assert second.search_documents(query) == first.search_documents(query)
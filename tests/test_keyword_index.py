@@ -0,0 +1,57 @@
+"""
+Pruebas del índice de palabras clave de las preguntas generales
+"""
+
+import random
+
+from src.data.keyword_index import KeywordIndex
+
+TOKENS = ['a', 'aa', 'ab', 'b', 'ba', ' ', '.', 'licitación', 'Licitación Pública', ' pública', 'trato directo',
+          'TRATO', 'chilecompra', 'ChileCompra', '2024', 'etapas']
+KEYWORDS = ['a', 'aa', 'aba', 'b.a', '', 'licitación pública', 'licitación', 'trato directo', 'ChileCompra',
+            '2024', 'etapas', 'fases']
+
+
+def baseline_best_answer(documents, keywords):
+    """find_best_answer original: recuenta y recorre cada documento por pregunta"""
+    best_match = None
+    best_score = 0
+    for doc in documents:
+        content = doc['content'].lower()
+        score = sum(content.count(keyword.lower()) for keyword in keywords if keyword.lower() in content)
+        if score > best_score:
+            best_score = score
+            relevant_sentences = []
+            for sentence in content.split('.'):
+                if any(keyword.lower() in sentence for keyword in keywords):
+                    relevant_sentences.append(sentence.strip())
+                    if len(relevant_sentences) >= 3:
+                        break
+            if relevant_sentences:
+                best_match = {'answer': '. '.join(relevant_sentences) + '.', 'source': doc['filename']}
+    return best_match
+
+
+def test_best_answer_matches_baseline():
+    rng = random.Random(0)
+    for _ in range(500):
+        documents = [{'filename': f"doc{i}.txt", 'content': ''.join(rng.choices(TOKENS, k=rng.randint(0, 30)))}
+                     for i in range(rng.randint(1, 4))]
+        index = KeywordIndex(documents)
+        for _ in range(5):
+            keywords = rng.sample(KEYWORDS, rng.randint(1, 3))
+            assert index.best_answer(keywords) == baseline_best_answer(documents, keywords), (documents, keywords)
+
+
+def test_counts_are_non_overlapping_like_str_count():
+    index = KeywordIndex([{'filename': "a.txt", 'content': "aaaa. aaa"}])
+    assert index.scores(['aa']) == {0: 3}
+    assert index.candidates(['aa', 'a']) == {0: (3 + 7, "aaaa. aaa.")}
+
+
+def test_pick_best_prefers_earlier_documents_on_ties():
+    assert KeywordIndex.pick_best([("a.txt", 2, "uno."), ("b.txt", 2, "dos."), ("c.txt", 1, "tres.")]) == \
+        {'answer': "uno.", 'source': "a.txt"}
+    # Un documento con más apariciones pero sin oración que las contenga sube la vara
+    assert KeywordIndex.pick_best([("a.txt", 2, "uno."), ("b.txt", 3, None)]) == {'answer': "uno.", 'source': "a.txt"}
+    assert KeywordIndex.pick_best([("b.txt", 3, None), ("a.txt", 2, "uno.")]) is None
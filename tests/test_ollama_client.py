@@ -0,0 +1,115 @@
+"""
+Pruebas del índice de búsqueda de OllamaClient
+"""
+
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from src.core.ollama_client import OllamaClient
+
+LAW = "\n".join(
+    f"Artículo {n}º.- La licitación pública número {n} se adjudica por la entidad licitante "
+    f"mediante resolución fundada, y el trato directo {n} procede solo en casos calificados."
+    for n in range(1, 40)
+)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    (tmp_path / "ley.txt").write_text(LAW, encoding='utf-8')
+    (tmp_path / "reglamento.txt").write_text(LAW.replace("licitación", "subasta"), encoding='utf-8')
+    return tmp_path
+
+
+@pytest.mark.parametrize('retriever', OllamaClient.RETRIEVERS)
+def test_searches_during_reload_see_one_index_version(corpus, retriever):
+    client = OllamaClient(index_dir=None, retriever=retriever, cache_size=0)
+    client.load_documents(str(corpus))
+    stop = threading.Event()
+
+    def reload_forever():
+        size = 0
+        while not stop.is_set():
+            size = size % 5 + 1
+            (corpus / "extra.txt").write_text(LAW[:size * 400], encoding='utf-8')
+            client.reload_documents()
+
+    reloader = threading.Thread(target=reload_forever)
+    reloader.start()
+    try:
+        for _ in range(500):
+            for chunk in client.search_documents("licitación pública artículo", top_k=5):
+                assert chunk['source'] in {"ley.txt", "reglamento.txt", "extra.txt"}
+    finally:
+        stop.set()
+        reloader.join()
+    assert client.index.version > 1
+
+
+def test_reload_publishes_a_new_index(corpus):
+    client = OllamaClient(index_dir=None)
+    client.load_documents(str(corpus))
+    before = client.index
+
+    (corpus / "reglamento.txt").unlink()
+    summary = client.reload_documents()
+
+    assert summary['removed'] == 1
+    assert client.index.version == before.version + 1
+    assert len(client.index.chunks) == summary['chunks'] == client.index.vectors.shape[0]
+    assert {chunk['source'] for chunk in client.index.chunks} == {"ley.txt"}
+    # El estado anterior no se modifica: una búsqueda en curso lo sigue viendo entero
+    assert len(before.chunks) == before.vectors.shape[0]
+
+
+def test_reload_invalidates_cached_results(corpus):
+    client = OllamaClient(index_dir=None, cache_size=16)
+    client.load_documents(str(corpus))
+    timings = {}
+
+    first = client.search_documents("licitación pública", top_k=2, timings=timings)
+    assert timings['cache_hit'] is False
+    assert client.search_documents("¿Licitación  PÚBLICA?", top_k=2, timings=timings) == first
+    assert timings['cache_hit'] is True
+
+    (corpus / "ley.txt").write_text(
+        "La licitación pública es el procedimiento concursal para contratar con el Estado.", encoding='utf-8'
+    )
+    client.reload_documents()
+
+    results = client.search_documents("licitación pública", top_k=2, timings=timings)
+    assert timings['cache_hit'] is False
+    assert results != first
+    assert "procedimiento concursal" in results[0]['text']
+    assert client.cache_stats()['index_version'] == client.index.version
+
+
+def test_top_k_matches_full_sort_including_ties():
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        n = int(rng.integers(0, 30))
+        # Pocos valores distintos: muchos empates, también en el k-ésimo lugar
+        scores = rng.integers(0, 4, size=n) / 4.0
+        top_k = int(rng.integers(0, n + 4))
+        expected = np.argsort(scores, kind='stable')[::-1][:top_k]
+        assert OllamaClient._top_k_indices(scores, top_k).tolist() == expected.tolist(), (scores, top_k)
+
+
+@pytest.mark.parametrize('top_k', [1, 3, 10, 500])
+def test_batch_search_matches_single_queries(corpus, top_k):
+    # Archivo duplicado: sus chunks empatan con los de ley.txt
+    (corpus / "copia.txt").write_text(LAW, encoding='utf-8')
+    client = OllamaClient(index_dir=None, cache_size=0)
+    client.load_documents(str(corpus))
+    words = LAW.split()
+    rng = random.Random(top_k)
+    queries = ["licitación pública", "trato directo 7", "subasta", "nada que ver", ""]
+    queries += [" ".join(rng.sample(words, 4)) for _ in range(40)]
+
+    for query, batch in zip(queries, client.search_documents_batch(queries, top_k=top_k)):
+        single = client.search_documents(query, top_k=top_k)
+        assert [(c['source'], c['text']) for c in batch] == [(c['source'], c['text']) for c in single], query
+        assert [c['similarity'] for c in batch] == pytest.approx([c['similarity'] for c in single])
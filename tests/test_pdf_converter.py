@@ -0,0 +1,50 @@
+"""
+Pruebas de la conversión de PDF a TXT por rangos de páginas
+"""
+
+import shutil
+from pathlib import Path
+
+import pytest
+
+from src.data import pdf_converter
+from src.data.pdf_converter import RAW_DIR, convert_pdfs, iter_pages_adaptive, iter_pages_pypdf2
+
+PDF = Path(__file__).resolve().parents[1] / "data" / "raw" / "pdfs" / "LEY_19886_Compras_Publicas_Chile_OFICIAL.pdf"
+
+
+@pytest.mark.skipif(not PDF.exists(), reason="sin el PDF de la ley en data/raw/pdfs")
+@pytest.mark.parametrize('sandbox', [False, True])
+def test_page_ranges_in_parallel_match_serial_output(tmp_path, sandbox):
+    pdf = tmp_path / PDF.name
+    shutil.copy(PDF, pdf)
+
+    serial = convert_pdfs([pdf], tmp_path / "serial", workers=1, sandbox=sandbox)
+    parallel = convert_pdfs([pdf], tmp_path / "parallel", workers=2, pages_per_shard=3, sandbox=sandbox)
+
+    assert serial['files'] == parallel['files'] == 1
+    assert serial['pages_extracted'] == parallel['pages_extracted'] > 3
+    name = PDF.with_suffix('.txt').name
+    for path in (Path(RAW_DIR) / name, Path(name)):
+        assert (tmp_path / "parallel" / path).read_bytes() == (tmp_path / "serial" / path).read_bytes()
+
+    # Sin cambios en el PDF, una segunda pasada no reextrae nada
+    again = convert_pdfs([pdf], tmp_path / "parallel", workers=2, sandbox=sandbox)
+    assert (again['skipped'], again['pages_extracted']) == (1, 0)
+
+
+@pytest.mark.skipif(not PDF.exists(), reason="sin el PDF de la ley en data/raw/pdfs")
+def test_adaptive_keeps_pypdf2_text_when_pdfplumber_cannot_open(monkeypatch, capsys):
+    def broken_open(*args, **kwargs):
+        raise OSError("PDF dañado")
+
+    monkeypatch.setattr(pdf_converter.pdfplumber, 'open', broken_open)
+    monkeypatch.setattr(pdf_converter, 'layout_reason', lambda text: 'table')
+
+    extractors, reasons = set(), {}
+    pages = list(iter_pages_adaptive(PDF, extractors=extractors, reasons=reasons))
+
+    assert pages == list(iter_pages_pypdf2(PDF))
+    assert extractors == {'pypdf2'}
+    assert sorted(reasons) == [page_num for page_num, _ in pages]
+    assert capsys.readouterr().out.count("pdfplumber no pudo abrir") == 1
@@ -0,0 +1,93 @@
+"""
+Pruebas del filtro de calidad de pares pregunta-respuesta
+"""
+
+import math
+
+from src.data.quality_filter import QualityFilter, REASONS, repeated_lines
+
+GOOD = {
+    'question': "¿Qué es participantes de la unidad de compra o unidad equivalente?",
+    'answer': "La o las personas que integran la unidad de compra respectiva e intervienen en los procesos de compra."
+}
+
+
+def test_keeps_a_clean_pair():
+    assert QualityFilter().evaluate([GOOD]) == {'keep': [0], 'removed': []}
+
+
+def test_drops_the_sample_garbage_pair():
+    garbage = {'question': "¿Qué es del mercado\ndel reglamento)\nciclo de compra?",
+               'answer': "Diseño del proceso\n5. 1. Panificación"}
+    result = QualityFilter().evaluate([GOOD, garbage])
+    assert result['keep'] == [0]
+    assert result['removed'][0]['index'] == 1
+    assert result['removed'][0]['reason'] == REASONS['question_newlines']
+
+
+def test_drops_concepts_that_span_lines():
+    pair = {
+        'question': "¿Qué es de la constitución política de la república\ny por cuanto he tenido a bien aprobarlo "
+                    "y sancionarlo; por\ntanto promúlguese y llévese a efecto como ley de la\nrepública?",
+        'answer': "Santiago, 11 de julio de 2003.- JOSE MIGUEL INSULZA\nSALINAS, Vicepresidente de la República.- "
+                  "María Eugenia\nWagner Brizzi, Ministro de Hacienda (S).- Francisco\nHuenchumilla Jaramillo, "
+                  "Ministro Secretario General de la\nPresidencia."
+    }
+    assert QualityFilter().evaluate([pair])['keep'] == []
+
+
+def test_page_header_text_always_drops_the_pair():
+    slide = {
+        'question': "¿Qué es ciclo de compra?",
+        'answer': "Elaboración del documento,\npublicación, evaluación y adjudicación del\nproceso\nTratos Directos\n"
+                  "Proveedor único del bien y/o servicio.\n12 DICIEMBRE 2024\nSi no se hubieran recibido ofertas o "
+                  "las ofertas hubiesen sido declaradas inadmisibles."
+    }
+    footer = dict(GOOD, answer=GOOD['answer'] + " Biblioteca del Congreso Nacional de Chile - www.leychile.cl")
+    result = QualityFilter(threshold=0.1).evaluate([slide, footer])
+    assert result['keep'] == []
+    assert [removed['reason'] for removed in result['removed']] == [REASONS['header']] * 2
+
+
+def test_lines_repeated_in_a_document_are_headers():
+    document = {'content': "".join(f"Ciclo de compra: Gestión de Contratos\nDiapositiva {n}\n" for n in range(5))}
+    header_lines = repeated_lines([document])
+    assert header_lines == ["Ciclo de compra: Gestión de Contratos"]
+    pair = dict(GOOD, answer=GOOD['answer'] + "\n  ciclo de compra: gestión de contratos\nMás texto.")
+    assert QualityFilter(header_lines=header_lines).evaluate([GOOD, pair])['keep'] == [0]
+
+
+def test_header_matches_stay_with_their_pair_when_lowercasing_changes_lengths():
+    # 'İ'.lower() tiene dos caracteres: el texto en minúsculas es más largo
+    pairs = [
+        {'question': "İ" * 200, 'answer': GOOD['answer']},
+        {'question': "Biblioteca del Congreso Nacional", 'answer': GOOD['answer']},
+        GOOD
+    ]
+    assert QualityFilter().features(pairs)['header'].tolist() == [False, True, False]
+
+
+def test_scores_short_and_repetitive_answers_low():
+    pairs = [
+        GOOD,
+        dict(GOOD, answer="Ver artículo."),
+        dict(GOOD, answer="compra compra compra compra compra compra compra compra compra compra."),
+        dict(GOOD, answer="1.2.3 - 4.5.6 - 7.8.9 - 10.11.12 - 13.14.15 - 16.17.18 (a)")
+    ]
+    result = QualityFilter().evaluate(pairs)
+    assert result['keep'] == [0]
+    assert [removed['reason'] for removed in result['removed']] == [
+        REASONS['answer_length'], REASONS['duplicate_ratio'], REASONS['alpha_ratio']
+    ]
+
+
+def test_empty_batch():
+    assert QualityFilter().evaluate([]) == {'keep': [], 'removed': []}
+
+
+def test_zero_scores_are_not_negative_zero():
+    # Una pregunta con exactamente un salto de línea queda en el extremo de una rampa decreciente
+    pair = dict(GOOD, question=GOOD['question'].replace(" de la unidad", "\nde la unidad"))
+    [removed] = QualityFilter().evaluate([pair])['removed']
+    assert removed['score'] == 0.0 and math.copysign(1.0, removed['score']) == 1.0
+    assert removed['reason'] == REASONS['question_newlines']
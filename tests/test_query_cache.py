@@ -0,0 +1,41 @@
+"""
+Pruebas de la caché de resultados de búsqueda
+"""
+
+from src.core import query_cache
+from src.core.query_cache import QueryCache
+
+
+def test_normalize_merges_trivial_variations():
+    assert QueryCache.normalize("  ¿Qué es   la LICITACIÓN pública? ") == "qué es la licitación pública"
+    assert QueryCache.normalize("qué es la licitación pública.") == "qué es la licitación pública"
+
+
+def test_evicts_least_recently_used():
+    cache = QueryCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: now[0])
+    cache = QueryCache(ttl=10.0)
+    cache.put('a', 1)
+    now[0] = 109.0
+    assert cache.get('a') == 1
+    now[0] = 111.0
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 1, 1, 0)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = QueryCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
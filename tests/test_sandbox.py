@@ -0,0 +1,100 @@
+"""
+Pruebas de la ejecución aislada de la conversión de PDF
+"""
+
+import os
+import time
+
+import pytest
+
+from src.data.conversion_manifest import ConversionManifest
+from src.data.sandbox import SandboxError, process_rss_mb, run_sandboxed
+
+
+def pages(n):
+    for i in range(n):
+        yield f"página {i}"
+
+
+def fails_after_one_page():
+    yield "página 0"
+    raise ValueError("PDF dañado")
+
+
+def crashes():
+    yield "página 0"
+    os._exit(3)
+
+
+def hangs():
+    yield "página 0"
+    time.sleep(60)
+
+
+def allocates(mb):
+    data = b"x" * (mb * 2 ** 20)
+    yield len(data)
+    time.sleep(60)
+
+
+def events(jobs, **kwargs):
+    return list(run_sandboxed(jobs, **kwargs))
+
+
+def outcomes(results):
+    return {key: outcome for key, _, outcome in results if outcome is not None}
+
+
+def test_items_stream_in_order_then_done():
+    results = events([('a', pages, (3,)), ('b', pages, (2,))], workers=2)
+    assert [item for key, item, _ in results if key == 'a' and item] == ["página 0", "página 1", "página 2"]
+    assert outcomes(results) == {'a': True, 'b': True}
+
+
+def test_errors_and_crashes_only_fail_their_job():
+    results = events([('error', fails_after_one_page, ()), ('crash', crashes, ()), ('ok', pages, (1,))], workers=3)
+    found = outcomes(results)
+    assert found['ok'] is True
+    assert isinstance(found['error'], SandboxError) and "ValueError: PDF dañado" in str(found['error'])
+    assert isinstance(found['crash'], SandboxError) and "código 3" in str(found['crash'])
+
+
+def test_time_limit_kills_the_process():
+    start = time.monotonic()
+    found = outcomes(events([('slow', hangs, ()), ('ok', pages, (1,))], workers=2, timeout=1.0))
+    assert time.monotonic() - start < 10
+    assert found['ok'] is True
+    assert "tiempo límite de 1s" in str(found['slow'])
+
+
+@pytest.mark.skipif(process_rss_mb(os.getpid()) is None, reason="sin /proc no se mide la memoria")
+def test_memory_limit_kills_the_process():
+    found = outcomes(events([('big', allocates, (300,))], max_rss_mb=150, timeout=30))
+    assert "excede el límite de 150 MB" in str(found['big'])
+
+
+def test_cancelled_jobs_produce_no_more_events():
+    cancelled = set()
+    results = []
+    for key, item, outcome in run_sandboxed([('slow', hangs, ()), ('skipped', pages, (1,))],
+                                            workers=1, cancelled=cancelled):
+        results.append((key, item, outcome))
+        cancelled.update({'slow', 'skipped'})
+    assert results == [('slow', "página 0", None)]
+
+
+def test_failed_pdfs_stay_quarantined_until_they_change(tmp_path):
+    pdf = tmp_path / "roto.pdf"
+    pdf.write_bytes(b"%PDF-1.4 roto")
+    manifest = ConversionManifest(str(tmp_path))
+    manifest.quarantine(pdf, "tiempo límite de 120s excedido")
+    manifest.quarantine(pdf, "tiempo límite de 120s excedido")
+    manifest.save()
+
+    manifest = ConversionManifest(str(tmp_path))
+    assert manifest.is_quarantined(pdf)
+    assert manifest.quarantined["roto.pdf"]['attempts'] == 2
+    os.utime(pdf, ns=(0, 0))
+    assert manifest.is_quarantined(pdf)
+    pdf.write_bytes(b"%PDF-1.4 reparado")
+    assert not manifest.is_quarantined(pdf)
@@ -0,0 +1,123 @@
+"""
+Pruebas del control de admisión de generaciones
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.core.scheduler import (AsyncGenerationScheduler, GenerationScheduler, QueueFullError,
+                                QueueTimeoutError)
+
+
+def test_full_queue_is_rejected_with_429():
+    scheduler = GenerationScheduler(max_in_flight=1, max_queue=0)
+    slot = scheduler.acquire()
+    with pytest.raises(QueueFullError) as error:
+        scheduler.acquire()
+    assert error.value.status_code == 429
+    assert error.value.retry_after >= 1
+    slot.release()
+    scheduler.acquire().release()
+    assert (scheduler.admitted, scheduler.rejected, scheduler.in_flight) == (2, 1, 0)
+
+
+def test_wait_timeout_is_rejected_with_503():
+    scheduler = GenerationScheduler(max_in_flight=1, max_queue=4, wait_timeout=0.05)
+    with scheduler.acquire():
+        with pytest.raises(QueueTimeoutError) as error:
+            scheduler.acquire()
+    assert error.value.status_code == 503
+    assert (scheduler.timed_out, scheduler.waiting, scheduler.in_flight) == (1, 0, 0)
+
+
+def test_retry_after_grows_with_queue_depth_and_service_time():
+    scheduler = GenerationScheduler(max_in_flight=2)
+    scheduler.service_time = 4.0
+    assert scheduler.retry_after() == 2
+    scheduler.waiting = 9
+    assert scheduler.retry_after() == 20
+    scheduler.waiting = 1000
+    assert scheduler.retry_after() == 60
+
+
+def test_waiters_are_admitted_by_priority():
+    scheduler = GenerationScheduler(max_in_flight=1, max_queue=4)
+    first = scheduler.acquire()
+    order = []
+
+    def wait(priority):
+        with scheduler.acquire(priority):
+            order.append(priority)
+
+    threads = []
+    for priority in (5, 1, 3):
+        threads.append(threading.Thread(target=wait, args=(priority,)))
+        threads[-1].start()
+        while scheduler.waiting < len(threads):
+            time.sleep(0.001)
+    first.release()
+    for thread in threads:
+        thread.join()
+    assert order == [1, 3, 5]
+
+
+def test_async_scheduler_rejects_and_times_out():
+    async def scenario():
+        scheduler = AsyncGenerationScheduler(max_in_flight=1, max_queue=1, wait_timeout=0.05)
+        slot = await scheduler.acquire()
+        waiter = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.acquire()
+        with pytest.raises(QueueTimeoutError):
+            await waiter
+        slot.release()
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert (scheduler.rejected, scheduler.timed_out, scheduler.waiting, scheduler.in_flight) == (1, 1, 0, 0)
+
+
+def test_timed_out_entries_leave_the_queue_before_the_next_admission():
+    scheduler = GenerationScheduler(max_in_flight=1, max_queue=2, wait_timeout=0.01)
+    slot = scheduler.acquire()
+    for _ in range(10):
+        with pytest.raises(QueueTimeoutError):
+            scheduler.acquire()
+    assert (scheduler.timed_out, scheduler.waiting, scheduler._heap) == (10, 0, [])
+
+    scheduler.wait_timeout = 5.0
+    admitted = []
+    thread = threading.Thread(target=lambda: admitted.append(scheduler.acquire()))
+    thread.start()
+    while scheduler.waiting < 1:
+        time.sleep(0.001)
+    assert len(scheduler._heap) == 1
+    slot.release()
+    thread.join()
+    assert admitted and admitted[0].wait_ms > 0
+    assert (scheduler.in_flight, scheduler.waiting, scheduler._heap) == (1, 0, [])
+    admitted[0].release()
+
+
+def test_async_timed_out_entries_leave_the_queue():
+    async def scenario():
+        scheduler = AsyncGenerationScheduler(max_in_flight=1, max_queue=2, wait_timeout=0.01)
+        slot = await scheduler.acquire()
+        for _ in range(5):
+            with pytest.raises(QueueTimeoutError):
+                await scheduler.acquire()
+        assert scheduler._heap == []
+
+        scheduler.wait_timeout = 5.0
+        waiter = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        slot.release()
+        (await waiter).release()
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert (scheduler.timed_out, scheduler.admitted, scheduler.waiting, scheduler.in_flight) == (5, 2, 0, 0)
@@ -0,0 +1,191 @@
+"""
+Pruebas de los servidores: respuestas 429/503 con Retry-After y streaming SSE
+"""
+
+import json
+
+import pytest
+import requests
+from starlette.testclient import TestClient
+
+from src.api import async_server, server
+
+DOCUMENT = {'filename': "ley.txt", 'path': "ley.txt", 'content': "texto"}
+
+
+def no_probe(*args, **kwargs):
+    raise AssertionError("las consultas no deben sondear /api/tags")
+
+
+@pytest.fixture
+def flask_client(monkeypatch):
+    client = server.ollama_client
+    monkeypatch.setattr(client, 'documents', [DOCUMENT])
+    monkeypatch.setattr(client, 'test_connection', no_probe)
+    monkeypatch.setattr(client.circuit_breaker, 'opened_at', None)
+    monkeypatch.setattr(client.circuit_breaker, 'failures', 0)
+    return server.app.test_client()
+
+
+@pytest.fixture
+def async_client(monkeypatch):
+    monkeypatch.setattr(async_server.ollama_client, 'documents', [DOCUMENT])
+    monkeypatch.setattr(async_server.backend, 'test_connection', no_probe)
+    monkeypatch.setattr(async_server.backend.circuit_breaker, 'opened_at', None)
+    monkeypatch.setattr(async_server.backend.circuit_breaker, 'failures', 0)
+    return TestClient(async_server.app)
+
+
+def open_circuit(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.allow_request()
+        breaker.record_failure()
+
+
+@pytest.mark.parametrize('path', ['/query', '/query/stream'])
+def test_flask_open_circuit_is_503_with_retry_after(flask_client, path):
+    open_circuit(server.ollama_client.circuit_breaker)
+    response = flask_client.post(path, json={'question': "¿Qué es el trato directo?"})
+    assert response.status_code == 503
+    retry_after = int(response.headers['Retry-After'])
+    assert 1 <= retry_after <= server.ollama_client.circuit_breaker.reset_timeout
+    assert response.get_json()['retry_after'] == retry_after
+
+
+@pytest.mark.parametrize('path', ['/query', '/query/stream'])
+def test_async_open_circuit_is_503_with_retry_after(async_client, path):
+    open_circuit(async_server.backend.circuit_breaker)
+    response = async_client.post(path, json={'question': "¿Qué es el trato directo?"})
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.json()['retry_after'] == int(response.headers['Retry-After'])
+
+
+def saturate(monkeypatch, scheduler, max_queue=0, wait_timeout=30.0):
+    # Sin slots libres: con cola 0 se rechaza al instante (429), con cola la espera se agota (503)
+    monkeypatch.setattr(scheduler, 'max_in_flight', 0)
+    monkeypatch.setattr(scheduler, 'max_queue', max_queue)
+    monkeypatch.setattr(scheduler, 'wait_timeout', wait_timeout)
+    monkeypatch.setattr(scheduler, 'service_time', 3.0)
+
+
+@pytest.mark.parametrize('path', ['/query', '/query/stream'])
+def test_flask_full_queue_is_429_with_retry_after(flask_client, monkeypatch, path):
+    saturate(monkeypatch, server.ollama_client.scheduler)
+    response = flask_client.post(path, json={'question': "¿Qué es el trato directo?"})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == "3"
+    assert response.get_json()['retry_after'] == 3
+
+
+def test_flask_queue_timeout_is_503_with_retry_after(flask_client, monkeypatch):
+    saturate(monkeypatch, server.ollama_client.scheduler, max_queue=1, wait_timeout=0.05)
+    response = flask_client.post('/query', json={'question': "¿Qué es el trato directo?"})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == "3"
+
+
+@pytest.mark.parametrize('path', ['/query', '/query/stream'])
+def test_async_full_queue_is_429_with_retry_after(async_client, monkeypatch, path):
+    saturate(monkeypatch, async_server.scheduler)
+    response = async_client.post(path, json={'question': "¿Qué es el trato directo?"})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == "3"
+    assert response.json()['retry_after'] == 3
+
+
+def test_async_queue_timeout_is_503_with_retry_after(async_client, monkeypatch):
+    saturate(monkeypatch, async_server.scheduler, max_queue=1, wait_timeout=0.05)
+    response = async_client.post('/query/stream', json={'question': "¿Qué es el trato directo?"})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == "3"
+
+
+class StreamedBody:
+    """Cuerpo de respuesta que llega en los trozos indicados, cortando líneas NDJSON a la mitad"""
+
+    def __init__(self, pieces):
+        self.pieces = [piece.encode('utf-8') for piece in pieces]
+
+    def stream(self, chunk_size, decode_content=True):
+        yield from self.pieces
+
+    def close(self):
+        pass
+
+
+class StreamingSession:
+    def __init__(self, *pieces):
+        self.pieces = pieces
+
+    def request(self, method, url, **kwargs):
+        assert kwargs['stream'] and kwargs['json']['stream']
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = StreamedBody(self.pieces)
+        return response
+
+
+# Una línea partida entre dos lecturas, líneas vacías, un token después de done
+# que no debe emitirse y la última línea sin salto final
+NDJSON = [
+    '{"response": "El trato", "done": false}\n{"respo',
+    'nse": " directo", "done": false}\n\n',
+    '{"response": " procede.", "done": false}\n',
+    '{"response": "", "done": true, "total_duration": 1}',
+]
+PREPARED = {
+    'prompt': "p", 'chunks': [{'source': "ley.txt", 'article': "8º", 'similarity': 0.42}],
+    'timings': {'retrieve': 1.0}, 'prompt_chars': 1, 'prompt_tokens': 1, 'cache_hit': False
+}
+
+
+def sse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        name, data = block.split("\n", 1)
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_generate_stream_parses_ndjson_chunks(monkeypatch):
+    client = server.ollama_client
+    monkeypatch.setattr(client, 'session', StreamingSession(*NDJSON, '\n{"response": "extra"}\n'))
+    monkeypatch.setattr(client.circuit_breaker, 'opened_at', None)
+    assert list(client.generate_stream("p")) == ["El trato", " directo", " procede."]
+
+
+def test_generate_stream_reports_ollama_errors(monkeypatch):
+    client = server.ollama_client
+    monkeypatch.setattr(client, 'session', StreamingSession('{"response": "El"}\n{"error": "model not found"}\n'))
+    monkeypatch.setattr(client.circuit_breaker, 'opened_at', None)
+    assert list(client.generate_stream("p")) == ["El", "Error: model not found"]
+
+
+def test_flask_stream_sends_sources_then_tokens_then_done(flask_client, monkeypatch):
+    client = server.ollama_client
+    monkeypatch.setattr(client, 'session', StreamingSession(*NDJSON))
+    monkeypatch.setattr(client, 'prepare_query', lambda query, top_k: dict(PREPARED, timings={'retrieve': 1.0}))
+    response = flask_client.post('/query/stream', json={'question': "¿Qué es el trato directo?"})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = sse_events(response.get_data(as_text=True))
+    assert [name for name, _ in events] == ['sources', 'token', 'token', 'token', 'done']
+    assert events[0][1]['sources'] == [{'source': "ley.txt", 'article': "8º", 'similarity': 0.42}]
+    assert "".join(data['token'] for name, data in events if name == 'token') == "El trato directo procede."
+    assert set(events[-1][1]['timings']) >= {'retrieve', 'queue_wait', 'first_token', 'generate'}
+    assert server.ollama_client.scheduler.in_flight == 0
+
+
+def test_flask_stream_failure_is_an_error_event(flask_client, monkeypatch):
+    def broken(query, top_k):
+        raise RuntimeError("índice no disponible")
+
+    monkeypatch.setattr(server.ollama_client, 'prepare_query', broken)
+    response = flask_client.post('/query/stream', json={'question': "¿Qué es el trato directo?"})
+    assert response.status_code == 200
+    assert sse_events(response.get_data(as_text=True)) == [
+        ('error', {'type': 'error', 'error': "Error processing query: índice no disponible"})
+    ]
+    assert server.ollama_client.scheduler.in_flight == 0
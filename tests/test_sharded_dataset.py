@@ -0,0 +1,117 @@
+"""
+Pruebas del dataset en fragmentos JSONL comprimidos
+"""
+
+import gzip
+import json
+import random
+
+import pytest
+
+from src.data.sharded_dataset import ShardedDataset, ShardedDatasetWriter, open_dataset
+
+
+def examples(n):
+    return [{'instruction': f"¿Qué es el concepto {i}?", 'input': "", 'output': f"Definición número {i} — ñandú"}
+            for i in range(n)]
+
+
+def write(directory, records, **kwargs):
+    with ShardedDatasetWriter(str(directory), **kwargs) as writer:
+        for record in records:
+            writer.write(record)
+    return writer
+
+
+def shard_files(directory):
+    return [shard['file'] for shard in ShardedDataset(str(directory)).shards]
+
+
+def test_round_trip_across_shards_and_blocks(tmp_path):
+    records = examples(257)
+    write(tmp_path, records, records_per_shard=100, records_per_block=7)
+
+    dataset = ShardedDataset(str(tmp_path))
+    assert len(dataset) == 257
+    assert [shard['count'] for shard in dataset.shards] == [100, 100, 57]
+    assert list(dataset) == records
+    for i in random.Random(0).sample(range(257), 60) + [0, 99, 100, 256, -1]:
+        assert dataset[i] == records[i]
+    with pytest.raises(IndexError):
+        dataset[257]
+    assert dataset.verify() == []
+
+
+def test_shards_are_plain_jsonl_gz(tmp_path):
+    records = examples(20)
+    write(tmp_path, records, records_per_block=3)
+    [name] = shard_files(tmp_path)
+    with gzip.open(tmp_path / name, 'rt', encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == records
+
+
+def test_same_examples_give_the_same_bytes(tmp_path):
+    records = examples(50)
+    write(tmp_path / "a", records, records_per_shard=20)
+    write(tmp_path / "b", records, records_per_shard=20)
+    assert len(shard_files(tmp_path / "a")) == 3
+    for name in ["index.json"] + shard_files(tmp_path / "a"):
+        assert (tmp_path / "a" / name).read_bytes() == (tmp_path / "b" / name).read_bytes()
+
+
+def test_rewrite_drops_stale_shards(tmp_path):
+    write(tmp_path, examples(50), records_per_shard=10)
+    old = shard_files(tmp_path)
+    write(tmp_path, examples(15), records_per_shard=10)
+    new = shard_files(tmp_path)
+    assert len(new) == 2 and not set(new) & set(old)
+    assert sorted(path.name for path in tmp_path.glob("shard-*")) == sorted(new)
+    assert list(ShardedDataset(str(tmp_path))) == examples(15)
+
+
+def test_old_index_keeps_its_shards_until_the_new_index_is_published(tmp_path, monkeypatch):
+    write(tmp_path, examples(30), records_per_shard=10)
+
+    def interrupted(self, index):
+        # Fragmentos nuevos ya publicados, índice aún sin cambiar
+        assert len(list(tmp_path.glob("shard-*.jsonl.gz"))) == 6
+        assert list(ShardedDataset(str(tmp_path))) == examples(30)
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(ShardedDatasetWriter, '_publish_index', interrupted)
+    with pytest.raises(OSError):
+        write(tmp_path, examples(30)[::-1], records_per_shard=10)
+    assert ShardedDataset(str(tmp_path)).verify() == []
+    assert list(ShardedDataset(str(tmp_path))) == examples(30)
+
+
+def test_abort_keeps_the_previous_dataset(tmp_path):
+    write(tmp_path, examples(10))
+    with pytest.raises(RuntimeError):
+        with ShardedDatasetWriter(str(tmp_path)) as writer:
+            writer.write({'instruction': "nuevo"})
+            raise RuntimeError("fallo a mitad de escritura")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["index.json"] + shard_files(tmp_path)
+    assert list(ShardedDataset(str(tmp_path))) == examples(10)
+
+
+def test_verify_reports_damaged_shards(tmp_path):
+    write(tmp_path, examples(30), records_per_shard=10)
+    names = shard_files(tmp_path)
+    path = tmp_path / names[1]
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    (tmp_path / names[2]).unlink()
+    assert ShardedDataset(str(tmp_path)).verify() == names[1:]
+
+
+def test_open_dataset_finds_sharded_and_legacy_json(tmp_path):
+    write(tmp_path / "compras_publicas_dataset", examples(5))
+    assert isinstance(open_dataset(str(tmp_path / "compras_publicas_dataset.json")), ShardedDataset)
+
+    (tmp_path / "legacy.json").write_text(json.dumps(examples(3), ensure_ascii=False), encoding='utf-8')
+    assert open_dataset(str(tmp_path / "legacy.json")) == examples(3)
+    assert open_dataset(str(tmp_path / "legacy")) == examples(3)
+    with pytest.raises(FileNotFoundError):
+        open_dataset(str(tmp_path / "missing"))
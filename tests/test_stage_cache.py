@@ -0,0 +1,36 @@
+"""
+Pruebas de la caché por contenido de las etapas de preparación
+"""
+
+from src.data.stage_cache import StageCache, content_hash
+
+
+def test_content_hash_ignores_key_order():
+    assert content_hash({'a': 1, 'b': "ñ"}) == content_hash({'b': "ñ", 'a': 1})
+    assert content_hash([1, 2]) != content_hash([2, 1])
+
+
+def test_hits_misses_and_prune(tmp_path):
+    cache = StageCache(str(tmp_path))
+    old_key = StageCache.key('extract', 1, "hash-viejo")
+    cache.put('extract', old_key, [{'question': "¿Qué es?"}])
+
+    cache = StageCache(str(tmp_path))
+    assert cache.get('extract', old_key) == (True, [{'question': "¿Qué es?"}])
+    new_key = StageCache.key('extract', 1, "hash-nuevo")
+    assert cache.get('extract', new_key) == (False, None)
+    assert cache.stats() == {'extract': {'hits': 1, 'misses': 1}}
+
+    # Solo se conservan las entradas usadas en esta ejecución
+    cache = StageCache(str(tmp_path))
+    cache.put('extract', new_key, [])
+    assert cache.prune() == 1
+    assert [path.stem for path in tmp_path.glob("*/*.json")] == [new_key]
+
+
+def test_corrupt_entries_are_misses(tmp_path):
+    cache = StageCache(str(tmp_path))
+    key = StageCache.key('minhash', 2)
+    cache.put('minhash', key, [1, 2])
+    (tmp_path / 'minhash' / f"{key}.json").write_text("[1,", encoding='utf-8')
+    assert cache.get('minhash', key) == (False, None)
@@ -0,0 +1,74 @@
+"""
+Pruebas de la limpieza del texto convertido desde PDF
+"""
+
+import json
+
+from src.data.pdf_converter import clean_txt, scan_pages
+
+HEADER = "Biblioteca del Congreso Nacional de Chile - www.leychile.cl - documento generado el 12-Mar-2024"
+BODIES = [
+    ["Artículo 1º.- Los contratos que celebre la Administración del Estado, a título",
+     "oneroso, para el suministro de bienes muebles, se ajustarán a las normas de esta ley.",
+     "Artículo 2º.- Para los efectos de esta ley, se entenderá por licitación pública el"],
+    ["procedimiento administrativo de carácter concursal mediante el cual la contra-",
+     "tación se adjudica a la oferta más conveniente, en régimen político-administrativo.",
+     "Artículo 3º.- Quedan excluidos de la aplicación de la presente ley los convenios     LEY 20238",
+     "que celebren los organismos públicos entre sí y los contratos de     Art. único Nº 1 a)",
+     "trabajo, regulados por el Código del Trabajo.     D.O. 19.01.2008"],
+    ["Artículo 4º.- Podrán contratar con la Administración las personas naturales o",
+     "jurídicas, chilenas y extranjeras, que acrediten su situación financiera."],
+    ["Artículo 5º.- La Administración adjudicará los contratos mediante licitación pública,",
+     "licitación privada o contratación directa, según corresponda."],
+]
+PAGES = ["\n".join([HEADER, *body, f"página {n} de {len(BODIES)}"]) + "\n" for n, body in enumerate(BODIES, 1)]
+
+
+def test_scan_finds_lines_repeated_on_every_page():
+    scan = scan_pages(enumerate(PAGES))
+    assert scan['repeated'] == {
+        "biblioteca del congreso nacional de chile - www.leychile.cl - documento generado el #-mar-#",
+        "página # de #"
+    }
+
+
+def test_clean_txt_removes_headers_joins_words_and_sets_notes_aside(tmp_path):
+    raw_file = tmp_path / "ley.raw.txt"
+    raw_file.write_text("".join(PAGES), encoding='utf-8', newline='')
+    txt_file = tmp_path / "ley.txt"
+    annotations_file = tmp_path / "ley.annotations.json"
+
+    stats = clean_txt(raw_file, txt_file, annotations_file, [{'chars': len(page)} for page in PAGES], source="ley.pdf")
+    text = txt_file.read_text(encoding='utf-8')
+    paragraphs = text.splitlines()
+
+    assert "Biblioteca del Congreso" not in text and "página" not in text
+    assert stats['removed_lines'] == 2 * len(PAGES)
+    # Guion de corte unido; guion propio de la palabra y el ".-" del artículo se conservan
+    assert "la contratación se adjudica" in text
+    assert "político-administrativo" in text
+    assert [paragraph[:13] for paragraph in paragraphs] == [f"Artículo {n}º.-" for n in range(1, 6)]
+    # La página 2 sigue el párrafo del artículo 2º sin cortarlo
+    assert paragraphs[1].endswith("licitación pública el procedimiento administrativo de carácter concursal mediante "
+                                  "el cual la contratación se adjudica a la oferta más conveniente, en régimen "
+                                  "político-administrativo.")
+
+    assert paragraphs[2] == ("Artículo 3º.- Quedan excluidos de la aplicación de la presente ley los convenios que "
+                             "celebren los organismos públicos entre sí y los contratos de trabajo, regulados por "
+                             "el Código del Trabajo.")
+    annotations = json.loads(annotations_file.read_text(encoding='utf-8'))
+    assert annotations['annotations'] == [
+        {'page': 2, 'article': "3º", 'text': "LEY 20238 Art. único Nº 1 a) D.O. 19.01.2008"}
+    ]
+    assert annotations['source'] == "ley.pdf" and stats['annotations'] == 1
+    assert "20238" not in text and "D.O." not in text
+
+
+def test_note_text_without_a_gazette_date_stays_in_the_body(tmp_path):
+    # "Art. 5" pegado con un solo espacio y sin fecha D.O. después: es texto, no una nota
+    pages = ["Los plazos se cuentan según lo dispuesto en el Art. 5\nde la presente ley.\n"]
+    raw_file = tmp_path / "raw.txt"
+    raw_file.write_text(pages[0], encoding='utf-8', newline='')
+    clean_txt(raw_file, tmp_path / "out.txt", tmp_path / "out.json", [{'chars': len(pages[0])}])
+    assert "Art. 5" in (tmp_path / "out.txt").read_text(encoding='utf-8')
+    assert json.loads((tmp_path / "out.json").read_text(encoding='utf-8'))['annotations'] == []